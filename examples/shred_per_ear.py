@@ -111,21 +111,17 @@ def shred_per_ear(duration):
 
 	# spork one shred for each ear
 
+	ears = []
 	if (singleEar != "right"):
-		zook.spork(one_ear("left", leftScale, leftTempo, output,duration))
+		ears += [zook.spork(one_ear("left", leftScale, leftTempo, output,duration))]
 	if (singleEar != "left"):
-		zook.spork(one_ear("right",rightScale,rightTempo,output,duration))
-
-	# all shreds must have at least one yield;  that's what makes them
-	# python generators, and all shreds are generators
-	yield 0
+		ears += [zook.spork(one_ear("right",rightScale,rightTempo,output,duration))]
 
 	# wait 'til the child shreds are done then close the file
-	# $$$ this is problematic, we need some means for this shred to wait for
-	#     .. other shreds to finish
-	#
-	# yield duration
-	# output.close()
+
+	for shredId in ears:
+		yield zook.finished(shredId)
+	output.close()
 
 
 def one_ear(whichEar,scale,tempo,output,duration):
@@ -23,12 +23,12 @@ __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
 from sys    import stderr
-from math   import floor,ceil
+from math   import floor,ceil,sin,cos
 from array  import array
-from wave   import open as wave_open
-from struct import unpack as struct_unpack
-from ugen   import UGen,UGraph,PassThru,Mixer
+from ugen   import UGen,UGenError,UGraph,PassThru,Mixer
+from wavfile import read_wav,WavFileError
 from util   import clip_value,raise_to_mulitple
+from constant import quarterPi
 
 
 class Delay(UGen):
@@ -40,6 +40,9 @@ class Delay(UGen):
 	Note that as of this writing, classes that would facilitate feeding left
 	and right channels into separate delay elements are not yet implemented.
 	"""
+
+	__slots__ = ("_buffer","_buffer2","_bufferLen","_delay","_delayCeil",
+	             "_readIx","_writeIx")
 	# $$$ make another version that has floating point read/write index, and
 	# $$$ .. takes floor before reading and writing;  this is an approximation
 	# $$$ .. to a floating point delay
@@ -94,21 +97,273 @@ class Delay(UGen):
 		outSample = self._buffer[self._readIx]
 		self._buffer[self._writeIx] = sample
 		if (sample2 != None):
-			outSample2 = self._buffer2[self._readIx]
+			self._tick2 = self._buffer2[self._readIx]
 			self._buffer2[self._writeIx] = sample2
 
+		self._readIx  = (self._readIx+1)  % self._bufferLen
+		self._writeIx = (self._writeIx+1) % self._bufferLen
+		return outSample
+
+	def _tick_traced(self,sample,sample2=None):
+		(readIx,writeIx) = (self._readIx,self._writeIx)
+		outSample = self._tick_fast(sample,sample2)
 		if ("Delay" in UGen.debug):
 			print >>stderr, "Delay.tick(\"%s\") %s -> buffer[%d]  buffer[%d]  -> %s" \
-			              % (self.name,self._writeIx,sample,self._readIx,outSample)
+			              % (self.name,writeIx,sample,readIx,outSample)
 		if ("Delay" in UGen.debug) and (sample2 != None):
 			print >>stderr, "Delay.tick(\"%s\") %s -> buffer2[%d] buffer2[%d] -> %s" \
-			              % (self.name,self._writeIx,sample2,self._readIx,outSample2)
+			              % (self.name,writeIx,sample2,readIx,self._tick2)
+		return outSample
 
-		self._readIx  = (self._readIx+1)  % self._bufferLen
-		self._writeIx = (self._writeIx+1) % self._bufferLen
+UGen.trace_when(Delay,"tick",["Delay"])
+
+
+class MultiTapDelay(UGen):
+	"""A delay line with one write head and any number of read taps.
+
+	All of the taps read from a single shared buffer, so a tapped delay with
+	dozens of taps costs one buffer and one element in the pipeline, rather
+	than one Delay (each with its own buffer) per tap.
 
-		if (sample2 == None): return outSample
-		else:                 return (outSample,outSample2)
+	Taps are created with add_tap(), which returns a DelayTap object.  Each tap
+	has its own delay (in samples, fractional delays are interpolated), gain
+	and pan.  All of these are drivable controls of the tap, e.g.
+		lfo >> tap["delay"]
+
+	By default a tap's output is summed into the output of the MultiTapDelay.
+	A tap can also be connected downstream like any other ugen, e.g.
+		tap >> output["left"]
+	in which case the tap delivers the same (gained and panned) signal it
+	contributes to the mix.  Setting mix=False when the tap is created keeps
+	it out of the summed output.
+
+	The buffer is sized to hold maxDelay samples, and grows if a tap is set
+	to a longer delay.  A driven delay can't grow the buffer, and is clipped to
+	the buffer's length.
+
+	Pan is ignored when outChannels is 1.
+	"""
+
+	__slots__ = ("_buffer","_bufferLen","_writeIx","taps")
+
+	def __init__(self,maxDelay=None,outChannels=2,name=None,
+	             bias=0.0,gain=1.0):
+		super(MultiTapDelay,self).__init__(inChannels=1,outChannels=outChannels,name=name,
+		                                   bias=bias,gain=gain)
+		if ("constructors" in UGen.debug): print >>stderr, "MultiTapDelay.__init__(%s)" % name
+
+		if (maxDelay == None) or (maxDelay < 1): maxDelay = 1
+		bufferLen = raise_to_mulitple(int(ceil(maxDelay))+1,UGen.bufferChunks)
+		self._buffer    = array("d", [0.0]*bufferLen)
+		self._bufferLen = bufferLen
+		self._writeIx   = 0
+		self.taps       = []
+
+	#-- taps --
+
+	def add_tap(self,delay,gain=1.0,pan=0.0,mix=True,name=None):
+		if (name == None): name = "%s~tap%d" % (self.name,len(self.taps))
+		tap = DelayTap(self,delay=delay,gain=gain,pan=pan,mix=mix,name=name)
+		self.taps += [tap]
+		UGen.pipeline_change(self)
+		return tap
+
+	def remove_tap(self,tap):
+		if (tap not in self.taps):
+			msg = "%s is not a tap of %s" % (tap,self)
+			raise UGenError(msg)
+		self.taps.remove(tap)
+		UGen.pipeline_change(self)
+
+	def _fit(self,delay):
+		# make sure the buffer can hold the given delay;  the buffer is
+		# unrolled as it grows, so the samples already written keep their age
+		if (delay < self._bufferLen): return
+		bufferLen = raise_to_mulitple(int(ceil(delay))+1,UGen.bufferChunks)
+		oldBuffer = self._buffer
+		writeIx   = self._writeIx
+		self._buffer = array("d", [0.0]*(bufferLen-self._bufferLen))
+		self._buffer.extend(oldBuffer[writeIx:])
+		self._buffer.extend(oldBuffer[:writeIx])
+		self._bufferLen = bufferLen
+		self._writeIx   = 0
+
+	def dependencies(self):
+		# drivers of tap controls have to be updated before we are
+		dependencies = super(MultiTapDelay,self).dependencies()
+		for tap in self.taps:
+			dependencies += tap._driven.values()
+		return dependencies
+
+	#-- tick handling --
+
+	def tick(self,sample):
+		buffer    = self._buffer
+		bufferLen = self._bufferLen
+		writeIx   = self._writeIx
+		maxDelay  = bufferLen - 1
+
+		# read all the taps before we write, since a tap may read the slot
+		# we're about to write
+		outSample = outSample2 = 0.0
+		for tap in self.taps:
+			delay = tap.delay
+			if   (delay < 1):        delay = 1
+			elif (delay > maxDelay): delay = maxDelay
+			readPos = writeIx - delay
+			ixFloor = floor(readPos)
+			frac    = readPos - ixFloor
+			ix      = int(ixFloor) % bufferLen
+			tapped  = buffer[ix]
+			if (frac != 0.0):
+				tapped += frac * (buffer[(ix+1)%bufferLen] - tapped)
+
+			if (self.outChannels == 1):
+				tap._tapped = tapped
+				if (tap.mix): outSample += tap.gain * tapped
+			else:
+				# (a driven pan is followed here, since a tap that only
+				# feeds the mix is never percolated itself)
+				panDriver = tap._driven.get("pan")
+				if (panDriver != None) and (panDriver.last != tap._panLast):
+					tap._pan_sides(panDriver.last)
+				tap._tapped  = tapped * tap._panLeft
+				tap._tapped2 = tapped * tap._panRight
+				if (tap.mix):
+					tapGain = tap.gain
+					outSample  += tapGain * tap._tapped
+					outSample2 += tapGain * tap._tapped2
+
+		buffer[writeIx] = sample
+		self._writeIx   = (writeIx+1) % bufferLen
+
+		if (self.outChannels == 2): self._tick2 = outSample2
+		return outSample
+
+	def _tick_traced(self,sample):
+		writeIx   = self._writeIx
+		outSample = self._tick_fast(sample)
+		if ("Delay" in UGen.debug):
+			print >>stderr, "MultiTapDelay.tick(\"%s\") %s -> buffer[%d] -> %s" \
+			              % (self.name,sample,writeIx,outSample)
+		return outSample
+
+UGen.trace_when(MultiTapDelay,"tick",["Delay"])
+
+
+class DelayTap(UGen):
+	"""A read tap on a MultiTapDelay.
+
+	Taps are created by MultiTapDelay.add_tap(), not directly.  The tap's
+	value is read by the MultiTapDelay it belongs to;  when the tap is also
+	connected downstream it simply delivers that value (with its bias and
+	gain applied in the usual way).  The tap's gain also scales its
+	contribution to the delay line's mix, but its bias does not.
+	"""
+
+	__slots__ = ("delayLine","mix","_tapped","_tapped2","_delay","_delayLast",
+	             "_pan","_panLast","_panLeft","_panRight")
+
+	def __init__(self,delayLine,delay=None,gain=1.0,pan=0.0,mix=True,name=None):
+		super(DelayTap,self).__init__(inChannels=0,outChannels=delayLine.outChannels,name=name,
+		                              bias=0.0,gain=gain)
+		if ("constructors" in UGen.debug): print >>stderr, "DelayTap.__init__(%s)" % name
+		self.delayLine = delayLine
+		self.mix       = mix
+		self._tapped   = 0.0
+		self._tapped2  = 0.0
+
+		self._drivable += ["delay","pan"]
+		self._delay = self._delayLast = 1.0  # overwritten by self.delay = delay
+		self._pan   = self._panLast   = 0.0  # overwritten by self.pan   = pan
+		if (delay == None): delay = 1
+		self.delay = delay
+		self.pan   = pan
+
+	def dependencies(self):
+		# the delay line computes our value, so it must be updated before us
+		return [self.delayLine] + super(DelayTap,self).dependencies()
+
+	def _drive(self,controlName):
+		# our drivers are also dependencies of the delay line
+		driver = super(DelayTap,self)._drive(controlName)
+		UGen.pipeline_change(self.delayLine)
+		return driver
+
+	def _undrive(self,controlName):
+		super(DelayTap,self)._undrive(controlName)
+		UGen.pipeline_change(self.delayLine)
+
+	#-- drivable delay, no side effects (other than sizing the buffer) --
+
+	@property
+	def delay(self):
+		control = self._delay
+		if (isinstance(control,UGen)): control = control.last
+		self._delayLast = control
+		return control
+
+	@delay.setter
+	def delay(self,val):
+		self._delay_setter(val)
+
+	def _delay_setter(self,val):
+		if (isinstance(val,UGen)):
+			self._drive("delay")
+			self._delay += val
+		else:
+			# val is a scalar
+			if (isinstance(self._delay,UGen)):
+				del self._driven["delay"]
+				UGen.pipeline_change(self)
+				UGen.pipeline_change(self.delayLine)
+			if (val < 1): val = 1
+			self.delayLine._fit(val)
+			self._delay = self._delayLast = float(val)
+
+	#-- drivable pan, with side effects --
+
+	@property
+	def pan(self):
+		control = self._pan
+		if (isinstance(control,UGen)):
+			control = control.last
+			if (control != self._panLast): self._pan_sides(control)
+		return control
+
+	@pan.setter
+	def pan(self,val):
+		self._pan_setter(val)
+
+	def _pan_setter(self,val):
+		if (isinstance(val,UGen)):
+			self._drive("pan")
+			self._pan += val
+		else:
+			# val is a scalar
+			if (isinstance(self._pan,UGen)):
+				del self._driven["pan"]
+				UGen.pipeline_change(self)
+				UGen.pipeline_change(self.delayLine)
+			self._pan = clip_value(float(val),-1.0,1.0)
+			self._pan_sides(self._pan)
+
+	def _pan_sides(self,val):
+		# side effects;  nota bene: a driven pan's driver stays in self._pan,
+		# only _panLast (the value last seen) changes
+		self._panLast = val
+		p = quarterPi * (clip_value(float(val),-1.0,1.0)+1.0)
+		self._panLeft  = cos(p)
+		self._panRight = sin(p)
+		if ("pan drive" in UGen.debug):
+			print >>stderr, "  %s._pan_sides(%s) -> panLeft=%s panRight=%s" \
+		                  % (self,val,self._panLeft,self._panRight)
+
+	#-- tick handling --
+
+	def tick(self):
+		if (self.outChannels == 2): self._tick2 = self._tapped2
+		return self._tapped
 
 
 class Echo(UGraph):
@@ -117,6 +372,8 @@ class Echo(UGraph):
 	Note that the mix control is 0 for 100% dry, and 1 for 100% wet
 	"""
 
+	__slots__ = ("_delay","_mixer","_echo","_mix")
+
 	def __init__(self,name=None,delay=None,channels=1,gain=1.0,mix=0.5):
 		super(Echo,self).__init__(name=name)
 
@@ -159,6 +416,182 @@ class Echo(UGraph):
 			self._mixer.dry = mix          # (this is the echo feedback)
 
 
+class Freeverb(UGen):
+	"""Stereo reverberation, after Jezar's public domain Freeverb.
+
+	Each channel runs eight parallel low-pass-feedback comb filters followed
+	by four series all-pass filters, with the right channel's filters
+	slightly longer than the left's.  All 24 filters are computed inside this
+	one ugen, with their delay lines packed into a single shared buffer, so
+	the whole reverb costs one element in the pipeline.
+
+	The input can be mono or stereo (either way the reverb is fed the sum of
+	the channels), the output is always stereo.
+
+	roomSize (0..1) sets the feedback of the combs, and thus the length of the
+	tail.  damping (0..1) sets how quickly high frequencies die away.  width
+	(0..1) is the stereo width of the reverberated signal.  As with Echo, the
+	mix control is 0 for 100% dry, and 1 for 100% wet.
+	"""
+
+	__slots__ = ("_buffer","_starts","_ends","_positions","_combStore",
+	             "_roomSize","_damping","_width","_mix","_feedback","_damp1",
+	             "_damp2","_wet1","_wet2","_dry")
+
+	combTuning    = [1116,1188,1277,1356,1422,1491,1557,1617]
+	allPassTuning = [556,441,341,225]
+	stereoSpread  = 23
+	fixedGain     = 0.015
+	scaleDamping  = 0.4
+	scaleRoom     = 0.28
+	offsetRoom    = 0.7
+	allPassGain   = 0.5
+
+	def __init__(self,channels=1,name=None,
+	             bias=0.0,gain=1.0,
+	             roomSize=None,damping=None,width=None,mix=None):
+		super(Freeverb,self).__init__(inChannels=channels,outChannels=2,name=name,
+		                              bias=bias,gain=gain)
+		if ("constructors" in UGen.debug): print >>stderr, "Freeverb.__init__(%s)" % name
+
+		# lay out the delay lines for all the filters in one buffer;  the
+		# left channel's combs are first, then the right's, then the left's
+		# all-passes and then the right's;  the tunings are for 44.1KHz
+		rateScale = UGen.samplingRate / 44100.0
+		lengths  = [int(n*rateScale) for n in Freeverb.combTuning]
+		lengths += [int((n+Freeverb.stereoSpread)*rateScale) for n in Freeverb.combTuning]
+		lengths += [int(n*rateScale) for n in Freeverb.allPassTuning]
+		lengths += [int((n+Freeverb.stereoSpread)*rateScale) for n in Freeverb.allPassTuning]
+		lengths  = [max(1,n) for n in lengths]
+
+		self._starts = starts = []
+		self._ends   = ends   = []
+		bufferLen = 0
+		for n in lengths:
+			starts += [bufferLen]
+			bufferLen += n
+			ends   += [bufferLen]
+		self._buffer    = array("d", [0.0]*bufferLen)
+		self._positions = list(starts)
+		self._combStore = [0.0] * (2*len(Freeverb.combTuning))
+
+		if (roomSize == None): roomSize = 0.5
+		if (damping  == None): damping  = 0.5
+		if (width    == None): width    = 1.0
+		if (mix      == None): mix      = 0.3
+		self.set(roomSize,damping,width,mix)
+
+	def set(self,roomSize,damping,width,mix):
+		self._roomSize = roomSize = clip_value(float(roomSize),0.0,1.0)
+		self._damping  = damping  = clip_value(float(damping), 0.0,1.0)
+		self._width    = width    = clip_value(float(width),   0.0,1.0)
+		self._mix      = mix      = clip_value(float(mix),     0.0,1.0)
+		# side effects
+		self._feedback = roomSize*Freeverb.scaleRoom + Freeverb.offsetRoom
+		self._damp1    = damping*Freeverb.scaleDamping
+		self._damp2    = 1 - self._damp1
+		self._wet1     = mix * (width/2 + 0.5)
+		self._wet2     = mix * ((1-width)/2)
+		self._dry      = 1 - mix
+
+	def erase(self):
+		# silence the reverb tail
+		for ix in xrange(len(self._buffer)): self._buffer[ix] = 0.0
+		self._combStore = [0.0] * len(self._combStore)
+
+	#-- non-drivable roomSize, with side effects --
+
+	@property
+	def roomSize(self):
+		return self._roomSize
+
+	@roomSize.setter
+	def roomSize(self,roomSize):
+		self.set(roomSize,self.damping,self.width,self.mix)
+
+	#-- non-drivable damping, with side effects --
+
+	@property
+	def damping(self):
+		return self._damping
+
+	@damping.setter
+	def damping(self,damping):
+		self.set(self.roomSize,damping,self.width,self.mix)
+
+	#-- non-drivable width, with side effects --
+
+	@property
+	def width(self):
+		return self._width
+
+	@width.setter
+	def width(self,width):
+		self.set(self.roomSize,self.damping,width,self.mix)
+
+	#-- non-drivable mix, with side effects --
+
+	@property
+	def mix(self):
+		return self._mix
+
+	@mix.setter
+	def mix(self,mix):
+		self.set(self.roomSize,self.damping,self.width,mix)
+
+	#-- tick handling --
+
+	def tick(self,sample,sample2=None):
+		if (sample2 == None): sample2 = sample
+		inSample = (sample+sample2) * Freeverb.fixedGain
+
+		buffer    = self._buffer
+		positions = self._positions
+		starts    = self._starts
+		ends      = self._ends
+		combStore = self._combStore
+		feedback  = self._feedback
+		damp1     = self._damp1
+		damp2     = self._damp2
+		numCombs  = len(combStore)
+		halfCombs = numCombs / 2
+
+		# parallel combs, left channel's then right's
+		outL = outR = 0.0
+		for ix in xrange(numCombs):
+			pos      = positions[ix]
+			combOut  = buffer[pos]
+			filtered = combOut*damp2 + combStore[ix]*damp1
+			combStore[ix] = filtered
+			buffer[pos]   = inSample + filtered*feedback
+			pos += 1
+			if (pos == ends[ix]): pos = starts[ix]
+			positions[ix] = pos
+			if (ix < halfCombs): outL += combOut
+			else:                outR += combOut
+
+		# series all-passes, left channel's then right's
+		allPassGain = Freeverb.allPassGain
+		numFilters  = len(positions)
+		halfPasses  = (numFilters-numCombs) / 2
+		for ix in xrange(numCombs,numFilters):
+			pos    = positions[ix]
+			bufOut = buffer[pos]
+			if (ix < numCombs+halfPasses):
+				buffer[pos] = outL + bufOut*allPassGain
+				outL = bufOut - outL
+			else:
+				buffer[pos] = outR + bufOut*allPassGain
+				outR = bufOut - outR
+			pos += 1
+			if (pos == ends[ix]): pos = starts[ix]
+			positions[ix] = pos
+
+		dry = self._dry
+		self._tick2 = outR*self._wet1 + outL*self._wet2 + sample2*dry
+		return        outL*self._wet1 + outR*self._wet2 + sample *dry
+
+
 class Clip(UGen):
 	"""An audio clip, for load and playback.
 
@@ -184,7 +617,15 @@ class Clip(UGen):
 	that some of the waveform might be skipped.
 
 	Note that rate=0 is allowed.
+
+	A .wav file whose sampling rate differs from ours is resampled as it is
+	loaded, so it plays at the right pitch (e.g. during a draft render, see
+	Shreduler.set_draft).
 	"""
+
+	__slots__ = ("source","filename","wavFile","_buffer","_buffer2",
+	             "_bufferUsed","_active","interpolate","loop","position",
+	             "_rate","_rateLast","_skip","_skipLast","frozen")
 	# $$$ .skip does not work with .interpolation
 	# $$$ we'd like to allow any iterable as source
 
@@ -202,6 +643,7 @@ class Clip(UGen):
 
 		self.interpolate = interpolate
 		self.loop        = loop
+		self.frozen      = None   # (see freeze())
 
 		self._drivable = ["rate","skip"]
 		self._rate = self._rateLast = 0.0  # overwritten by self.rate = rate
@@ -241,64 +683,38 @@ class Clip(UGen):
 
 	def _load_from_file(self,source):
 		self.filename = source
-		self.wavFile  = wavFile = wave_open(self.filename, "rb")
-
-		channels     = wavFile.getnchannels()
-		sampleWidth  = wavFile.getsampwidth()
-		samplingRate = wavFile.getframerate()
-		numSamples   = wavFile.getnframes()
-		compName     = wavFile.getcompname()
+		self.wavFile  = None
+		try:
+			(channels,samplingRate,sampleFormat,samples) = read_wav(self.filename)
+		except (WavFileError,IOError), ex:
+			raise UGenError(str(ex))
 
 		if (channels not in [1,2]):
 			msg = "for \"%s\", channels=%d is not supported" \
 			    % (self.filename,channels)
 			raise UGenError(msg)
-		if (sampleWidth not in [1,2]):
-			msg = "for \"%s\", sampleWidth=%d is not supported" \
-			    % (self.filename,sampleWidth)
-			raise UGenError(msg)
-		if (samplingRate != UGen.samplingRate):
-			msg = "for \"%s\", samplingRate=%s does not match %s" \
-			   % (self.filename,samplingRate)
-			raise UGenError(msg)
-		if (compName != "not compressed"):
-			msg = "for \"%s\", compName=\"%s\" is not supported" \
-			    % (self.filename,compName)
-			raise UGenError(msg)
 
 		self.inChannels  = 0
 		self.outChannels = channels
-		sampleScale = (1<<(8*sampleWidth-1)) - 1
-		if (sampleWidth == 1): packFormat = "b"
-		else:                  packFormat = "h"
-		if (channels == 2):    packFormat = "2%s" % packFormat
+		numSamples = len(samples) // channels
 
 		self._allocate(numSamples)
 
 		if ("Clip" in UGen.debug):
 			print >>stderr, "Clip.load(%s)" % self
-			print >>stderr, "  channels    = %s" % channels
-			print >>stderr, "  numSamples  = %s" % numSamples
-			print >>stderr, "  sampleWidth = %s" % sampleWidth
-			print >>stderr, "  sampleScale = %s" % sampleScale
-			print >>stderr, "  packFormat  = %s" % packFormat
+			print >>stderr, "  channels     = %s" % channels
+			print >>stderr, "  numSamples   = %s" % numSamples
+			print >>stderr, "  sampleFormat = %s" % sampleFormat
 
+		# (the samples arrive interleaved, and are split with slices)
 		if (channels == 1):
-			for ix in xrange(numSamples):
-				sample = wavFile.readframes(1)
-				sample = struct_unpack(packFormat,sample)[0]
-				if (sample < -sampleScale): sample = -sampleScale
-				self._buffer[ix] = sample / float(sampleScale)
+			self._buffer [:numSamples] = samples
 		else: # (channels == 2):
-			for ix in xrange(numSamples):
-				sample = wavFile.readframes(1)
-				(sample,sample2) = struct_unpack(packFormat,sample)
-				if (sample  < -sampleScale): sample  = -sampleScale
-				if (sample2 < -sampleScale): sample2 = -sampleScale
-				self._buffer [ix] = sample  / float(sampleScale)
-				self._buffer2[ix] = sample2 / float(sampleScale)
+			self._buffer [:numSamples] = samples[0::2]
+			self._buffer2[:numSamples] = samples[1::2]
 
-		wavFile.close()
+		if (samplingRate != UGen.samplingRate):
+			self._resample(samplingRate)
 
 	def _load_from_list(self,listVariable):
 		numSamples = len(listVariable)
@@ -340,6 +756,52 @@ class Clip(UGen):
 				self._buffer [ix] = sample
 				self._buffer2[ix] = sample2
 
+	def _load_from_arrays(self,buffer,buffer2=None):
+		# nota bene: the arrays become the clip's buffers, they are not copied
+		self.filename    = "%d sample bounce" % len(buffer)
+		self.wavFile     = None
+		self.inChannels  = 0
+		self.outChannels = 1 if (buffer2 == None) else 2
+		self._buffer     = buffer
+		self._buffer2    = buffer2
+		self._bufferUsed = len(buffer)
+
+	def _resample(self,fromRate):
+		# convert the buffer from the file's sampling rate to ours;  when we
+		# are lowering the rate (e.g. for a draft render) each new sample is
+		# the average of the old samples it covers, otherwise we interpolate
+		# between old samples
+		step       = float(fromRate) / UGen.samplingRate
+		oldUsed    = self._bufferUsed
+		numSamples = int(ceil(oldUsed / step))
+
+		if ("Clip" in UGen.debug):
+			print >>stderr, "Clip.resample(%s)" % self
+			print >>stderr, "  samplingRate = %s -> %s" % (fromRate,UGen.samplingRate)
+			print >>stderr, "  numSamples   = %s -> %s" % (oldUsed,numSamples)
+
+		buffers = [self._buffer]
+		if (self.outChannels == 2): buffers += [self._buffer2]
+
+		resampled = []
+		for buffer in buffers:
+			newBuffer = array("d", [0.0]*numSamples)
+			for ix in xrange(numSamples):
+				position = ix * step
+				iz = int(floor(position))
+				if (step > 1):
+					window = buffer[iz:min(int(floor(position+step)),oldUsed)]
+					newBuffer[ix] = sum(window) / len(window)
+				else:
+					iy = min(iz+1,oldUsed-1)
+					newBuffer[ix] = buffer[iz] \
+					              + (position-iz) * (buffer[iy] - buffer[iz])
+			resampled += [newBuffer]
+
+		self._buffer = resampled[0]
+		if (self.outChannels == 2): self._buffer2 = resampled[1]
+		self._bufferUsed = numSamples
+
 	def _allocate(self,numSamples):
 		if (self._buffer == None):
 			self._buffer = array("d", [0.0]*numSamples)
@@ -371,7 +833,9 @@ class Clip(UGen):
 			self._rate += val
 		else:
 			# val is a scalar
-			if (isinstance(self._rate,UGen)): del self._driven["rate"]
+			if (isinstance(self._rate,UGen)):
+				del self._driven["rate"]
+				UGen.pipeline_change(self)
 			self._rate = self._rateLast = float(val)
 
 	#-- drivable skip, no side effects --
@@ -394,7 +858,9 @@ class Clip(UGen):
 			self._skip += val
 		else:
 			# val is a scalar
-			if (isinstance(self._skip,UGen)): del self._driven["skip"]
+			if (isinstance(self._skip,UGen)):
+				del self._driven["skip"]
+				UGen.pipeline_change(self)
 			self._skip = self._skipLast = float(val)
 
 	#-- tick handling --
@@ -438,8 +904,90 @@ class Clip(UGen):
 			if (self.outChannels == 2):
 				outSample2 = self._buffer2[ix]
 
-		if (self.outChannels == 1): return outSample
-		else:                       return (outSample,outSample2)
+		if (self.outChannels == 2): self._tick2 = outSample2
+		return outSample
+
+
+def freeze(node,duration,loop=False,name=None):
+	"""Replace a subgraph with a Clip of its output.
+
+	node (and everything upstream of it) is rendered for the given duration,
+	starting from now, into a Clip.  The clip then takes node's place, feeding
+	whatever node fed, and starts playing.  The subgraph drops out of the
+	pipeline, so from then on it costs nothing, while the clip costs one
+	buffer lookup per sample.
+
+	The render is done by a separate shreduler, so the live timeline doesn't
+	move.  Shreds don't run during the render, so the subgraph should be one
+	that plays by itself (e.g. a pad through a reverb), and it shouldn't
+	share ugens with the rest of the pipeline.  Note that the render leaves
+	the subgraph's ugens in the state they reach at the end of duration.
+
+	unfreeze(clip) puts node back in place of the clip.
+	"""
+	shreduler = UGen.shreduler
+	if (shreduler == None):
+		msg = "can't freeze %s without a shreduler" % node
+		raise UGenError(msg)
+
+	outlet = node
+	if (getattr(node,"outlet",None) != None):
+		outlet = node.outlet
+		if (type(outlet) in [list,tuple]):
+			msg = "can't freeze %s, it has more than one outlet" % node
+			raise UGenError(msg)
+
+	# find the ugens node feeds (drivers included, since a driven control is
+	# fed through a PassThru)
+
+	consumers = []
+	if (shreduler.sinks != []):
+		for other in shreduler.find_update_order():
+			for feed in other._feeds:
+				if (feed[0] == outlet):
+					consumers += [other]
+					break
+
+	(buffer,buffer2) = shreduler.bounce(outlet,int(ceil(duration)))
+
+	if (name == None): name = "%s~frozen" % node.name
+	clip = Clip(name=name,interpolate=False,loop=loop)
+	clip._load_from_arrays(buffer,buffer2)
+	clip.frozen = (node,outlet,consumers)
+	if ("constructors" in UGen.debug):
+		print >>stderr, "freeze(%s) -> %s, feeding [%s]" \
+		              % (node,clip,",".join([str(consumer) for consumer in consumers]))
+
+	_replace_feeds(consumers,outlet,clip)
+	if (outlet in shreduler.sinks):
+		shreduler.remove_sink(outlet)
+		shreduler.add_sink(clip)
+	clip.trigger()
+	return clip
+
+
+def unfreeze(clip):
+	"""Undo freeze(), putting the frozen subgraph back in place of the clip.
+
+	Returns the node that was frozen.
+	"""
+	if (clip.frozen == None):
+		msg = "can't unfreeze %s, it isn't frozen" % clip
+		raise UGenError(msg)
+	(node,outlet,consumers) = clip.frozen
+	clip.frozen = None
+	_replace_feeds(consumers,clip,outlet)
+	if (clip in UGen.shreduler.sinks):
+		UGen.shreduler.remove_sink(clip)
+		UGen.shreduler.add_sink(outlet)
+	return node
+
+
+def _replace_feeds(consumers,oldUpstream,newUpstream):
+	for consumer in consumers:
+		consumer._feeds = [(newUpstream,)+feed[1:] if (feed[0] == oldUpstream) else feed
+		                   for feed in consumer._feeds]
+		UGen.pipeline_change(consumer)
 
 
 class Capture(PassThru):
@@ -454,6 +1002,8 @@ class Capture(PassThru):
 	buffer can be erased with the erase() method.  For compatability with
 	similar objects, trigger() is provided as a synonym for on().
 	"""
+
+	__slots__ = ("sampleNum","_active","_buffer")
 	# $$$ use array instead of list; allocate buffer in chunks
 
 	def __init__(self,channels=1,on=True,name=None):
@@ -487,5 +1037,5 @@ class Capture(PassThru):
 			if (sample2 == None): self._buffer += [sample]
 			else:                 self._buffer += [(sample,sample2)]
 
-		if (sample2 == None): return sample
-		else:                 return (sample,sample2)
+		if (sample2 != None): self._tick2 = sample2
+		return sample
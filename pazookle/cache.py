@@ -0,0 +1,259 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+import os
+import os.path
+from sys         import stderr
+from types       import NoneType
+from array       import array
+from collections import deque
+from random      import Random,getstate as random_getstate,setstate as random_setstate
+from hashlib     import sha1
+from shutil      import copyfile,rmtree
+from tempfile    import mkdtemp
+from ugen        import UGen,attribute_names
+
+
+class RenderCacheError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+class RenderCache(object):
+	"""A cache of rendered .wav files, keyed by a fingerprint of the program.
+
+	render(program) calls program, a function that builds a graph and sporks
+	shreds, then runs the shreduler.  But first it makes a dry run:  the
+	program's shreds run on schedule, but no samples are generated and no
+	files are written.  After every shred activation we fingerprint the graph
+	(every ugen reachable from the sinks, with its class, its parameters and
+	state, its connections and, for noise ugens, its random number generator
+	state), along with the time.  So the fingerprint covers both the graph and
+	the schedule of changes the shreds make to it.  It also covers the
+	sampling rate, the pazookle source code, and any key the caller provides
+	(e.g. the command line).
+
+	If the cache holds a render with the same fingerprint, the .wav files are
+	copied from the cache and the real run is skipped.  Otherwise the program
+	runs for real (with python's random number generator restored to its
+	state before the dry run, so it makes the same choices) and its .wav
+	files are added to the cache.  When the cache grows beyond maxBytes, the
+	least recently used renders are evicted.
+
+	A program is eligible for caching only if its shreds don't depend on the
+	audio itself (e.g. by reading a ugen's output), since during the dry run
+	there isn't any.  Anything other than .wav files a program writes (or
+	prints) is not cached.  A program that uses unseeded noise gets a new
+	fingerprint every time, and so is never found in the cache.
+	"""
+
+	def __init__(self,directory,maxBytes=None):
+		self.directory = directory
+		self.maxBytes  = maxBytes
+		if (not os.path.isdir(directory)): os.makedirs(directory)
+
+	def render(self,program,key=None,shreduler=None):
+		# returns True if the render was found in the cache
+		if (shreduler == None): shreduler = UGen.shreduler
+		if (shreduler == None):
+			msg = "can't render without a shreduler"
+			raise RenderCacheError(msg)
+		if (shreduler.pending_shreds() != 0):
+			msg = "can't render while %d shreds are pending" % shreduler.pending_shreds()
+			raise RenderCacheError(msg)
+
+		# each render starts at time zero
+		sinks = list(shreduler.sinks)
+		if (shreduler.clock() != 0): shreduler.reset(sinks)
+
+		randomState = random_getstate()
+		recorder    = DryRun(shreduler,key)
+
+		shreduler.dryRun = recorder
+		try:
+			program()
+			shreduler.run()
+		finally:
+			shreduler.dryRun = None
+			shreduler.reset(sinks)
+		fingerprint = recorder.fingerprint()
+		outputs     = recorder.outputs
+
+		# a program that writes no .wav files has nothing to cache
+
+		entry = os.path.join(self.directory,fingerprint)
+		found = (outputs != []) and (os.path.isdir(entry))
+		if ("cache" in UGen.debug):
+			print >>stderr, "render fingerprint %s (%s)" \
+			              % (fingerprint,"hit" if found else "miss")
+		if (found):
+			for (ix,filename) in enumerate(outputs):
+				copyfile(os.path.join(entry,"%d.wav" % ix),filename)
+			os.utime(entry,None)
+			return True
+
+		random_setstate(randomState)
+		program()
+		shreduler.run()
+
+		if (outputs != []):
+			self.store(entry,outputs)
+			self.evict(keep=entry)
+		return False
+
+	def store(self,entry,outputs):
+		# copy to a temporary directory and then rename it, so that the entry
+		# appears complete or not at all
+		for filename in outputs:
+			if (not os.path.isfile(filename)): return
+		tempDir = mkdtemp(dir=self.directory,prefix=".tmp")
+		try:
+			for (ix,filename) in enumerate(outputs):
+				copyfile(filename,os.path.join(tempDir,"%d.wav" % ix))
+			manifest = open(os.path.join(tempDir,"manifest"),"wt")
+			for filename in outputs: print >>manifest, filename
+			manifest.close()
+			os.rename(tempDir,entry)
+		except OSError:
+			# (another render stored the same entry first)
+			rmtree(tempDir,ignore_errors=True)
+
+	def evict(self,keep=None):
+		if (self.maxBytes == None): return
+		entries = []
+		total   = 0
+		for name in os.listdir(self.directory):
+			entry = os.path.join(self.directory,name)
+			if (name.startswith(".")) or (not os.path.isdir(entry)): continue
+			size = sum([os.path.getsize(os.path.join(entry,f)) for f in os.listdir(entry)])
+			entries += [(os.path.getmtime(entry),entry,size)]
+			total   += size
+		entries.sort()
+		for (_,entry,size) in entries:
+			if (total <= self.maxBytes): break
+			if (entry == keep): continue
+			if ("cache" in UGen.debug):
+				print >>stderr, "evicting %s" % os.path.basename(entry)
+			rmtree(entry,ignore_errors=True)
+			total -= size
+
+	def clear(self):
+		for name in os.listdir(self.directory):
+			entry = os.path.join(self.directory,name)
+			if (os.path.isdir(entry)): rmtree(entry,ignore_errors=True)
+
+
+class DryRun(object):
+	"""Recorder for a dry run, collecting the fingerprint and output files."""
+
+	def __init__(self,shreduler,key=None):
+		self.outputs = []
+		self._digest = sha1()
+		self._digest.update(repr((key,shreduler.samplingRate,source_fingerprint())))
+
+	def add_output(self,filename):
+		self.outputs += [filename]
+		self._digest.update("output %r\n" % filename)
+
+	def activation(self,shreduler):
+		self._digest.update("at %r\n" % shreduler.now())
+		for line in describe_graph(shreduler.sinks):
+			self._digest.update(line)
+			self._digest.update("\n")
+
+	def fingerprint(self):
+		return self._digest.hexdigest()
+
+
+#-- graph description --
+#
+# A ugen is described by its class and the values of all its attributes;
+# ugens it refers to (feeds, drivers, the members of a UGraph, etc.) are
+# described by their position in the description, and are described in
+# turn.  Ids and names are left out, since they depend on how many ugens
+# were created before, and have no effect on the sound.
+
+ignoredAttributes = {"id":True, "name":True}
+
+
+def describe_graph(sinks):
+	index = {}
+	lines = []
+
+	def visit(node):
+		if (node in index): return index[node]
+		ix = index[node] = len(lines)
+		lines.append(None)
+		attributes = []
+		for name in attribute_names(node):
+			if (name in ignoredAttributes): continue
+			if (not hasattr(node,name)): continue
+			attributes += ["%s=%s" % (name,describe_value(getattr(node,name),visit))]
+		lines[ix] = "%s %s" % (node.__class__.__name__," ".join(attributes))
+		return ix
+
+	for sink in sinks: visit(sink)
+	return lines
+
+
+def describe_value(value,visit):
+	if (isinstance(value,UGen)):
+		return "@%d" % visit(value)
+	if (type(value) in (NoneType,bool,int,long,float,str,unicode)):
+		return repr(value)
+	if (type(value) in (list,tuple,deque)):
+		return "[%s]" % ",".join([describe_value(v,visit) for v in value])
+	if (type(value) == dict):
+		items = [(describe_value(k,visit),describe_value(v,visit)) for (k,v) in value.items()]
+		return "{%s}" % ",".join(["%s:%s" % item for item in sorted(items)])
+	if (isinstance(value,array)):
+		return "array:%s" % sha1(value.tostring()).hexdigest()
+	if (isinstance(value,Random)):
+		return "random:%s" % sha1(repr(value.getstate())).hexdigest()
+	if (hasattr(value,"func_code")):
+		code = value.func_code
+		return "code:%s" % sha1(repr((code.co_code,code.co_consts))).hexdigest()
+	if (hasattr(value,"__slots__")) and (not hasattr(value,"__dict__")):
+		# (helper objects such as a RateGroup's resamplers)
+		fields = [describe_value(getattr(value,name,None),visit) for name in attribute_names(value)]
+		return "%s(%s)" % (value.__class__.__name__,",".join(fields))
+	return value.__class__.__name__
+
+
+sourceFingerprint = None
+
+def source_fingerprint():
+	# a digest of pazookle's own .py files, so that a change to the package
+	# invalidates everything rendered before it
+	global sourceFingerprint
+	if (sourceFingerprint == None):
+		digest  = sha1()
+		package = os.path.dirname(os.path.realpath(__file__))
+		for name in sorted(os.listdir(package)):
+			if (not name.endswith(".py")): continue
+			f = open(os.path.join(package,name),"rb")
+			digest.update(f.read())
+			f.close()
+		sourceFingerprint = digest.hexdigest()
+	return sourceFingerprint
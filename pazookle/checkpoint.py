@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+import os
+import os.path
+from sys         import stderr
+from types       import NoneType
+from array       import array
+from collections import deque
+from random      import Random,getstate as random_getstate,setstate as random_setstate
+from cPickle     import dump as pickle_dump,load as pickle_load
+from ugen        import UGen,attribute_names
+from output      import WavOut,TextOut,RawOut
+from cache       import ignoredAttributes,source_fingerprint
+
+
+class CheckpointError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+class Checkpointer(object):
+	"""Save the state of a long render periodically, so it can be resumed.
+
+	render(program) calls program, a function that builds a graph and sporks
+	shreds, then runs the shreduler.  Every interval samples the state of the
+	render is saved to filename.  If the render is interrupted (a crash, a
+	power failure, ctrl-C), calling render(program) again picks up from the
+	most recent checkpoint rather than from the beginning.  Once the render
+	completes the checkpoint file is removed.
+
+	Shreds are python generators, which can't be saved.  So instead we replay
+	them:  on resume, the program runs again as a dry run (as in RenderCache),
+	its shreds making the same changes to the graph at the same times, but
+	without generating any samples, until it reaches the same number of shred
+	activations as at the checkpoint.  This rebuilds the graph and brings the
+	shreds to where they were.  Then the saved state of every ugen (matched by
+	id, since ids are assigned in the same order) is restored, along with
+	python's random number generator, and each ugen rebuilds its transient
+	attributes (e.g. an envelope's interpolator, see UGen._refresh) from the
+	restored state.  The render continues from the checkpoint's clock.  Any
+	.wav files being written are cut back to the samples written as of the
+	checkpoint and reopened.
+
+	As with RenderCache, a program is eligible only if its shreds don't depend
+	on the audio itself.  Output other than .wav files (e.g. TextOut) is not
+	restored.  A RawOut (or BinaryOut) streams its samples away, so they
+	can't be cut back to a checkpoint;  render raises CheckpointError if one
+	is open when the render starts or when a checkpoint is due.  The
+	checkpoint is ignored (and the render starts over) if the key, the
+	sampling rate, or the pazookle source code has changed.
+	"""
+
+	def __init__(self,filename,interval,shreduler=None):
+		if (interval <= 0):
+			msg = "interval=%s is not valid for a checkpointer" % interval
+			raise CheckpointError(msg)
+		self.filename  = filename
+		self.interval  = int(interval)
+		self.shreduler = shreduler
+		self.key       = None
+
+	def render(self,program,key=None):
+		# returns True if the render was resumed from a checkpoint
+		shreduler = self.shreduler
+		if (shreduler == None): shreduler = UGen.shreduler
+		if (shreduler == None):
+			msg = "can't render without a shreduler"
+			raise CheckpointError(msg)
+		if (shreduler.pending_shreds() != 0):
+			msg = "can't render while %d shreds are pending" % shreduler.pending_shreds()
+			raise CheckpointError(msg)
+
+		self.key = key
+		state = self.load()
+		if (state == None):
+			program()
+		else:
+			self.resume(shreduler,program,state)
+		self.check_outputs()
+
+		shreduler.checkpointer   = self
+		shreduler.nextCheckpoint = shreduler.clock() + self.interval
+		try:
+			shreduler.run()
+		finally:
+			shreduler.checkpointer   = None
+			shreduler.nextCheckpoint = None
+		if (os.path.exists(self.filename)): os.remove(self.filename)
+		return (state != None)
+
+	def signature(self,shreduler):
+		return (self.key,shreduler.samplingRate,source_fingerprint())
+
+	def check_outputs(self):
+		# a RawOut's samples have already gone downstream (to a pipe, say),
+		# and a resumed render would rebuild it during the replay, as a dry
+		# run, with no stream at all;  so rather than silently losing its
+		# output, we refuse
+		for node in UGen.instances.values():
+			if (isinstance(node,RawOut)) and (node.stream != None):
+				msg = "can't checkpoint a render that writes to %s (a raw stream can't be resumed)" \
+				    % node
+				raise CheckpointError(msg)
+
+	#-- saving --
+
+	def checkpoint(self,shreduler):
+		shreduler.nextCheckpoint += self.interval
+		self.check_outputs()
+		ugens   = {}
+		outputs = {}
+		for (ugenId,node) in UGen.instances.items():
+			# (flushing first, so that no samples are both in the file and
+			# in the output's saved state)
+			if (isinstance(node,WavOut)) and (node.wavFile != None) \
+			  and (node.wavFile.file != None):
+				node.flush()
+				outputs[ugenId] = node.wavFile.dataBytes
+			ugens[ugenId] = (node.__class__.__name__,capture_state(node))
+
+		state = {"signature":       self.signature(shreduler),
+		         "clock":           shreduler.clock(),
+		         "activations":     shreduler.activations,
+		         "pipelineChanges": shreduler.pipelineChanges,
+		         "random":          random_getstate(),
+		         "ugens":           ugens,
+		         "outputs":         outputs}
+
+		# write to a temporary file and then rename it, so that the checkpoint
+		# is replaced complete or not at all
+		tempName = self.filename + ".tmp"
+		f = open(tempName,"wb")
+		pickle_dump(state,f,2)
+		f.close()
+		os.rename(tempName,self.filename)
+		if ("checkpoint" in UGen.debug):
+			print >>stderr, "checkpoint at clock %d (%d activations)" \
+			              % (state["clock"],state["activations"])
+
+	#-- resuming --
+
+	def load(self):
+		if (not os.path.exists(self.filename)): return None
+		f = open(self.filename,"rb")
+		state = pickle_load(f)
+		f.close()
+		shreduler = self.shreduler if (self.shreduler != None) else UGen.shreduler
+		if (state["signature"] != self.signature(shreduler)):
+			if ("checkpoint" in UGen.debug):
+				print >>stderr, "ignoring stale checkpoint %s" % self.filename
+			return None
+		return state
+
+	def resume(self,shreduler,program,state):
+		# replay the shreds up to the checkpoint
+		shreduler.dryRun = Replay()
+		try:
+			program()
+			shreduler.run(activations=state["activations"])
+		finally:
+			shreduler.dryRun = None
+		if (shreduler.activations != state["activations"]):
+			msg = "replay reached %d activations, but checkpoint %s was taken after %d" \
+			    % (shreduler.activations,self.filename,state["activations"])
+			raise CheckpointError(msg)
+		shreduler.resume_at(state["clock"],state["pipelineChanges"])
+
+		# restore the ugens
+		for (ugenId,(className,saved)) in state["ugens"].items():
+			node = UGen.instances.get(ugenId)
+			if (node == None): continue
+			if (node.__class__.__name__ != className):
+				msg = "replay made %s where checkpoint %s has a %s" \
+				    % (node,self.filename,className)
+				raise CheckpointError(msg)
+			restore_state(node,saved)
+			# transient attributes (e.g. an envelope's interpolator) were
+			# built by the replay from state that has since been restored,
+			# so they are rebuilt;  but outputs would reopen their files,
+			# so they are left alone (wav files are reopened below)
+			if (not isinstance(node,(WavOut,TextOut,RawOut))): node._refresh()
+		random_setstate(state["random"])
+
+		for (ugenId,numBytes) in state["outputs"].items():
+			UGen.instances[ugenId].reopen(numBytes)
+
+		if ("checkpoint" in UGen.debug):
+			print >>stderr, "resumed at clock %d (%d activations)" \
+			              % (state["clock"],state["activations"])
+
+
+class Replay(object):
+	"""Recorder for the dry run that replays shreds up to a checkpoint."""
+
+	def add_output(self,filename):
+		pass
+
+	def activation(self,shreduler):
+		pass
+
+
+#-- ugen state --
+#
+# A ugen's state is the values of its attributes, except for references to
+# other ugens (the graph itself is rebuilt by the replay), functions, and
+# files.  Containers are kept only if everything in them can be kept.
+
+class SavedDeque(object):
+	def __init__(self,items,maxlen):
+		self.items  = items
+		self.maxlen = maxlen
+
+class SavedRandom(object):
+	def __init__(self,state):
+		self.state = state
+
+class SavedObject(object):
+	def __init__(self,fields):
+		self.fields = fields
+
+class Unsaved(object): pass
+unsaved = Unsaved()
+
+
+def capture_state(node):
+	saved = {}
+	for name in attribute_names(node):
+		if (name in ignoredAttributes): continue
+		if (not hasattr(node,name)): continue
+		value = capture_value(getattr(node,name))
+		if (value is not unsaved): saved[name] = value
+	return saved
+
+
+def capture_value(value):
+	if (type(value) in (NoneType,bool,int,long,float,str,unicode)):
+		return value
+	if (type(value) in (list,tuple)):
+		items = [capture_value(v) for v in value]
+		if (unsaved in items): return unsaved
+		return items if (type(value) == list) else tuple(items)
+	if (type(value) == dict):
+		items = [(capture_value(k),capture_value(v)) for (k,v) in value.items()]
+		for (k,v) in items:
+			if (k is unsaved) or (v is unsaved): return unsaved
+		return dict(items)
+	if (isinstance(value,array)):
+		return array(value.typecode,value)
+	if (isinstance(value,deque)):
+		items = capture_value(list(value))
+		if (items is unsaved): return unsaved
+		return SavedDeque(items,value.maxlen)
+	if (isinstance(value,Random)):
+		return SavedRandom(value.getstate())
+	if (isinstance(value,UGen)):
+		return unsaved
+	if (hasattr(value,"__slots__")) and (not hasattr(value,"__dict__")):
+		# (helper objects such as a RateGroup's resamplers)
+		return SavedObject(capture_state(value))
+	return unsaved
+
+
+def restore_state(node,saved):
+	for (name,value) in saved.items():
+		setattr(node,name,restore_value(getattr(node,name,None),value))
+
+
+def restore_value(current,value):
+	# helper objects and random number generators are restored in place
+	if (isinstance(value,SavedObject)):
+		restore_state(current,value.fields)
+		return current
+	if (isinstance(value,SavedRandom)):
+		current.setstate(value.state)
+		return current
+	if (isinstance(value,SavedDeque)):
+		return deque(value.items,value.maxlen)
+	if (type(value) in (list,tuple)):
+		if (type(current) not in (list,tuple)) or (len(current) != len(value)):
+			current = [None] * len(value)
+		items = [restore_value(c,v) for (c,v) in zip(current,value)]
+		return items if (type(value) == list) else tuple(items)
+	return value
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+
+from sys       import stderr
+from threading import RLock
+from weakref   import WeakValueDictionary
+from ugen      import UGen
+from shred     import Shreduler
+
+
+class ContextError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+contextLock = RLock()   # held while any context is active
+
+
+class Context(object):
+	"""An independent pazookle session.
+
+	The shreduler, the sampling rate, the ugen and shred id counters, the
+	registry of ugen instances, and the debug settings are all class
+	variables of UGen and Shreduler, so normally a process has just one of
+	each (zook, at the bottom of shred.py).  A context owns its own set of
+	them.  While it is active (with context: ...) those class variables are
+	the context's;  when it is left they are put back as they were.  So ugens
+	created under a context get their ids from it, read its sampling rate,
+	and connect into its shreduler, and its debug settings affect only it.
+
+		context = Context(samplingRate=22050)
+		with context:
+			zook = context.shreduler
+			... build a graph and spork shreds ...
+		context.run()
+
+	Any number of contexts can exist at once, e.g. one per request in a
+	server, or one after another in a worker process that renders many
+	programs without re-importing pazookle.  Since they share the class
+	variables, only one context can be active at a time;  entering a context
+	waits (in other threads) until the active one has been left.  So
+	sessions run concurrently by taking turns, e.g. with run(activations=N)
+	running a context for a while before letting go.
+
+	A context's ugens should only be touched while it is active.  The
+	console sinks belong to the default session, so a context should write
+	to outputs of its own.
+	"""
+
+	def __init__(self,samplingRate=44100,draft=None,name=None):
+		if (name == None): name = "context"
+		self.name        = name
+		self.shreduler   = Shreduler(samplingRate=samplingRate,draft=draft)
+		self.lastId      = 0
+		self.instances   = WeakValueDictionary()
+		self.debug       = {}
+		self.lastShredId = 0
+		self.shredDebug  = {}
+		self._saved      = []   # (stack of the sessions we've displaced)
+
+	def __str__(self):
+		return self.name
+
+	#-- activation --
+
+	def __enter__(self):
+		contextLock.acquire()
+		try:
+			self._saved.append(capture_session())
+			install_session((self.shreduler,self.shreduler.samplingRate,
+			                 self.lastId,self.instances,self.debug,
+			                 self.lastShredId,self.shredDebug))
+		except:
+			contextLock.release()
+			raise
+		if ("context" in UGen.debug): print >>stderr, "entering %s" % self
+		return self
+
+	def __exit__(self,excType,excValue,traceback):
+		if ("context" in UGen.debug): print >>stderr, "leaving %s" % self
+		try:
+			(_,_,self.lastId,self.instances,self.debug,
+			 self.lastShredId,self.shredDebug) = capture_session()
+			install_session(self._saved.pop())
+		finally:
+			contextLock.release()
+		return False
+
+	#-- running --
+
+	def spork(self,shredFunction,shredName=None):
+		with self:
+			return self.shreduler.spork(shredFunction,shredName)
+
+	def run(self,program=None,activations=None):
+		# program, if given, is called (inside the context) to build a graph
+		# and spork shreds;  activations=N stops before the N+1st shred
+		# activation, as for Shreduler.run
+		with self:
+			if (program != None): program()
+			self.shreduler.run(activations=activations)
+
+	def set_debug(self,debugNames):
+		with self:
+			UGen.set_debug(debugNames)
+			Shreduler.set_debug(debugNames)
+
+
+#-- session state --
+#
+# A session is the tuple (shreduler, sampling rate, last ugen id, ugen
+# instances, ugen debug, last shred id, shred debug).  Installing one also
+# installs the traced or fast method variants its debug settings call for.
+
+def capture_session():
+	if (UGen.rateGroup != None):
+		msg = "can't change contexts inside %s" % UGen.rateGroup
+		raise ContextError(msg)
+	return (UGen.shreduler,UGen.samplingRate,UGen.lastId,UGen.instances,UGen.debug,
+	        Shreduler.id,Shreduler.debug)
+
+
+def install_session(session):
+	(UGen.shreduler,samplingRate,UGen.lastId,UGen.instances,UGen.debug,
+	 Shreduler.id,Shreduler.debug) = session
+	UGen._set_sampling_rate(samplingRate)
+	UGen.choose_tracing()
+	Shreduler.choose_tracing()
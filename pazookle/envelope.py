@@ -22,6 +22,7 @@ __version__   = "0.01"
 __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
+from sys         import stderr
 from ugen        import UGen
 from interpolate import piecewise,linear_ramp,diminishing_exponential, \
                         sinusoidal_ess,cubic_ess
@@ -34,6 +35,8 @@ class Impulse(UGen):
 	(the target value or zero).  Otherwise, the ugen's value is output.
 	"""
 
+	__slots__ = ("_target",)
+
 	def __init__(self,channels=1,inChannels=None,name=None,
 	             bias=0.0,gain=1.0):
 		super(Impulse,self).__init__(inChannels=inChannels if (inChannels!=None) else channels,
@@ -55,8 +58,8 @@ class Impulse(UGen):
 		target = self._target
 		self._target = 0.0
 		if (sample  == None): sample = self._defaultInSample
-		if (sample2 == None): return (target*sample)
-		else:                 return (target*sample,target*sample2)
+		if (sample2 != None): self._tick2 = target*sample2
+		return target*sample
 
 
 class Step(UGen):
@@ -69,6 +72,8 @@ class Step(UGen):
 	output.
 	"""
 
+	__slots__ = ("_active","_current","_target")
+
 	def __init__(self,channels=1,inChannels=None,name=None,
 	             bias=0.0,gain=1.0):
 		super(Step,self).__init__(inChannels=inChannels if (inChannels!=None) else channels,
@@ -90,8 +95,8 @@ class Step(UGen):
 
 	def tick(self,sample=None,sample2=None):
 		if (sample  == None): sample = self._defaultInSample
-		if (sample2 == None): return (self._target*sample)
-		else:                 return (self._target*sample,self._target*sample2)
+		if (sample2 != None): self._tick2 = self._target*sample2
+		return self._target*sample
 
 
 class LinearRamp(Step):
@@ -100,6 +105,10 @@ class LinearRamp(Step):
 	This class also serves as a parent class for all ramp-to steps.
 	"""
 
+	__slots__ = ("_startTime","_endTime","_deltaTime","_startVal",
+	             "_interpolator")
+	_transient = ("_interpolator",)
+
 	def trigger(self,target,duration,makeInterpolator=True):
 		self._startTime = UGen.shreduler.now()
 		self._endTime   = UGen.shreduler.now() + duration
@@ -118,6 +127,11 @@ class LinearRamp(Step):
 			print >>stderr, "  target    = %s" % self._target
 			print >>stderr, "  active    = %s" % self._active
 
+	def _refresh(self):
+		# (the interpolator is rebuilt from the state of the current ramp)
+		if (not hasattr(self,"_startVal")): return
+		self._interpolator = lambda x: (self._target-self._startVal) * x
+
 	def tick(self,sample=None,sample2=None):
 		if (not self._active):
 			val = self._target
@@ -129,22 +143,34 @@ class LinearRamp(Step):
 			val = self._target
 
 		self._current = val
+		if (sample  == None): sample = self._defaultInSample
+		if (sample2 != None): self._tick2 = val*sample2
+		return val*sample
+
+	def _tick_traced(self,sample=None,sample2=None):
+		outSample = self._tick_fast(sample,sample2)
 		if ("envelopes" in UGen.debug):
-			print >>stderr, "%s %d %s" % (self,UGen.shreduler.clock(),val)
+			print >>stderr, "%s %d %s" % (self,UGen.shreduler.clock(),self._current)
+		return outSample
 
-		if (sample  == None): sample = self._defaultInSample
-		if (sample2 == None): return (val*sample)
-		else:                 return (val*sample,val*sample2)
+
+UGen.trace_when(LinearRamp,"tick",["envelopes"])
 
 
 class CubicRamp(LinearRamp):
 	"""Ramp to a given target value with a smooth "S" function."""
 
+	__slots__ = ()
+
 	def trigger(self,targetVal,duration,makeInterpolator=True):
 		super(CubicRamp,self).trigger(targetVal,duration,makeInterpolator=False)
 		if (makeInterpolator):
 			self._interpolator = cubic_ess(0.0,1.0,0.0,self._target-self._startVal)
 
+	def _refresh(self):
+		if (not hasattr(self,"_startVal")): return
+		self._interpolator = cubic_ess(0.0,1.0,0.0,self._target-self._startVal)
+
 
 class Envelope(LinearRamp):
 	"""Parent class for envelopes
@@ -153,6 +179,8 @@ class Envelope(LinearRamp):
 	by the envelope's value.  Otherwise, the envelope's value is output.
 	"""
 
+	__slots__ = ("_attack","_release")
+
 	def __init__(self,channels=1,inChannels=None,name=None,
 	             bias=0.0,gain=1.0,
 	             ar=None,attack=None,release=None):
@@ -206,6 +234,8 @@ class Envelope(LinearRamp):
 
 class ADSR(LinearRamp):
 	"""Attack-decay-sustain-release envelopes"""
+
+	__slots__ = ("_attack","_decay","_sustain","_release","_velocity")
 	# $$$ need to make each piece of the envelope be specifiable as "linear"
 	#     .. or "exponential up" or "exponential down", also true for Envelope
 
@@ -218,6 +248,7 @@ class ADSR(LinearRamp):
 
 		if (adsr != None): (attack,decay,sustain,release) = adsr
 		self.set(attack=attack,decay=decay,sustain=sustain,release=release)
+		self._velocity        = None   # (None once the key is off)
 		self._defaultInSample = 1.0
 		self._active          = False
 		self._target          = 0.0
@@ -237,20 +268,30 @@ class ADSR(LinearRamp):
 
 	def key_on(self,velocity=None,makeInterpolator=True):
 		if (velocity == None): velocity = 1.0
-		target1   = velocity
-		target2   = velocity * self._sustain
+		self._velocity = velocity
+		self.trigger(velocity*self._sustain,self._attack+self._decay,makeInterpolator=False)
+		self._refresh()
+
+	def key_off(self,makeInterpolator=True):
+		self._velocity = None
+		self.trigger(0.0,self._release,makeInterpolator=False)
+		self._refresh()
+
+	def _refresh(self):
+		# (the interpolator is rebuilt from the state of the current ramp)
+		if (not hasattr(self,"_startVal")): return
+		if (self._velocity == None):
+			self._interpolator = diminishing_exponential(0,1,0.0,self._target-self._startVal)
+			return
+		target1   = self._velocity
+		target2   = self._target
 		duration1 = self._attack
-		duration2 = self._attack + self._decay
+		duration2 = self._deltaTime
 		xSplit    = duration1 / duration2
-		self.trigger(target2,duration2,makeInterpolator=False)
 		attackFunc = linear_ramp(0,xSplit,self._startVal,target1)
 		decayFunc  = diminishing_exponential(xSplit,1,target1,target2)
 		self._interpolator = piecewise([xSplit],[attackFunc,decayFunc])
 
-	def key_off(self,makeInterpolator=True):
-		self.trigger(0.0,self._release,makeInterpolator=False)
-		self._interpolator = diminishing_exponential(0,1,0.0,self._target-self._startVal)
-
 	#-- non-drivable attack, with side effects --
 
 	@property
@@ -29,10 +29,17 @@ from ugen import UGen
 class LowPass(UGen):
 	"""Resonant low pass filter.  2nd order Butterworth.
 
-	This also serves as the parent class for other pass/reject filters
+	This also serves as the parent class for other pass/reject filters.
+
+	Frequencies above UGen.maxFilterFreq (just short of the nyquist rate) are
+	treated as if they were at that limit.  This matters mostly for draft
+	renders (see Shreduler.set_draft), where a filter set for the full
+	sampling rate may ask for a frequency the draft rate can't represent.
 
 	Adapted from ChucK's rlpf implementation, equivalent to ChucK's LPF.
 	"""
+
+	__slots__ = ("_freq","_Q","_b1","_b2","_a0","_y1","_y2")
 	# $$$ freq and Q should be drivable
 
 	def __init__(self,name=None,
@@ -54,7 +61,7 @@ class LowPass(UGen):
 		if (Q    == None): Q    = UGen.defaultFilterQ
 		self._freq = freq = float(freq)
 		self._Q    = Q    = float(min(Q,1000))
-		f = freq * UGen.radiansPerSample
+		f = min(freq,UGen.maxFilterFreq) * UGen.radiansPerSample
 		d = tan(f/(2*Q))
 		c = (1-d) / (1+d)
 		self._b1 = b1 = (1+c) * cos(f)
@@ -101,12 +108,14 @@ class HighPass(LowPass):
 	Adapted from ChucK's rhpf implementation, equivalent to ChucK's HPF.
 	"""
 
+	__slots__ = ()
+
 	def set(self,freq,Q):
 		if (freq == None): freq = UGen.defaultFilterFreq
 		if (Q    == None): Q    = UGen.defaultFilterQ
 		self._freq = freq = float(freq)
 		self._Q    = Q    = float(min(Q,1000))
-		f = freq * UGen.radiansPerSample
+		f = min(freq,UGen.maxFilterFreq) * UGen.radiansPerSample
 		d = tan(f/(2*Q))
 		c = (1-d) / (1+d)
 		self._b1 = b1 = (1+c) * cos(f)
@@ -133,12 +142,14 @@ class BandPass(LowPass):
 	Adapted from ChucK's bpf implementation, equivalent to ChucK's BPF.
 	"""
 
+	__slots__ = ()
+
 	def set(self,freq,Q):
 		if (freq == None): freq = UGen.defaultFilterFreq
 		if (Q    == None): Q    = UGen.defaultFilterQ
 		self._freq = freq = float(freq)
 		self._Q    = Q    = float(Q)
-		f = freq * UGen.radiansPerSample
+		f = min(freq,UGen.maxFilterFreq) * UGen.radiansPerSample
 		c = 1 / tan(f/(2*Q))
 		self._a0 = a0 = 1 / (1+c)
 		self._b1 = 2 * cos(f) * c * a0
@@ -162,12 +173,14 @@ class BandReject(LowPass):
 	Adapted from ChucK's brf implementation, equivalent to ChucK's BRF.
 	"""
 
+	__slots__ = ()
+
 	def set(self,freq,Q):
 		if (freq == None): freq = UGen.defaultFilterFreq
 		if (Q    == None): Q    = UGen.defaultFilterQ
 		self._freq = freq = float(freq)
 		self._Q    = Q    = float(Q)
-		f = freq * UGen.radiansPerSample
+		f = min(freq,UGen.maxFilterFreq) * UGen.radiansPerSample
 		c = tan(f/(2*Q))
 		self._a0 = a0 = 1 / (1+c)
 		self._b1 = -2 * cos(f) * a0
@@ -194,13 +207,15 @@ class ResonZ(LowPass):
 	    Music Journal, 18:4, pp 8-10.
 	"""
 
+	__slots__ = ()
+
 	def set(self,freq,Q):
 		"""see reference [1]"""
 		if (freq == None): freq = UGen.defaultFilterFreq
 		if (Q    == None): Q    = UGen.defaultFilterQ
 		self._freq = freq = float(freq)
 		self._Q    = Q    = float(Q)
-		f  = freq * UGen.radiansPerSample
+		f  = min(freq,UGen.maxFilterFreq) * UGen.radiansPerSample
 		r  = 1 - (f / (2*Q))
 		r2 = r * r
 		c  = (2*r*cos(f)) / (r2+1)
@@ -222,6 +237,8 @@ class ResonZ(LowPass):
 
 class OnePole(UGen):
 	"""One-pole digital filter."""
+
+	__slots__ = ("_pole","_b0","_a1","_y1")
 	# $$$ pole should be drivable
 	# $$$ this has not been tested
 
@@ -265,6 +282,8 @@ class OnePole(UGen):
 
 class OneZero(UGen):
 	"""One-zero digital filter."""
+
+	__slots__ = ("_zero","_b0","_b1","_w1")
 	# $$$ zero should be drivable
 	# $$$ this has not been tested
 
@@ -308,6 +327,10 @@ class OneZero(UGen):
 
 class BiQuad(UGen):
 	"""Two-pole, two-zero digital filter."""
+
+	__slots__ = ("normalize","_zeroFreq","_zeroRadius","_poleFreq",
+	             "_poleRadius","_b0","_b1","_b2","_a0","_a1","_a2","_w1",
+	             "_w2","_y1","_y2")
 	# $$$ poles and zeros should be drivable
 	# $$$ this has not been tested
 
@@ -375,6 +398,8 @@ class ZeroCross(UGen):
 	the direction of the crossing.
 	"""
 
+	__slots__ = ("_latest","_latest2")
+
 	def __init__(self,channels=1,name=None,
 		         bias=0.0,gain=1.0):
 		super(ZeroCross,self).__init__(inChannels=channels,outChannels=channels,name=name,
@@ -403,4 +428,5 @@ class ZeroCross(UGen):
 		self._latest = sample
 		if (sample2 == None): return outSample
 		self._latest2 = sample2
-		return (outSample,outSample2)
+		self._tick2   = outSample2
+		return outSample
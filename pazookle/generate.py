@@ -22,17 +22,21 @@ __version__   = "0.01"
 __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
-from sys      import stderr
-from math     import sin
-from random   import Random
-from ugen     import UGen
-from util     import clip_value
-from constant import twoPi
+from sys         import stderr
+from math        import sin,floor,ceil
+from array       import array
+from random      import Random
+from ugen        import UGen,UGenError
+from util        import clip_value,raise_to_mulitple
+from constant    import twoPi
+from interpolate import piecewise,linear_ramp,diminishing_exponential
 
 
 class Noise(UGen):
 	"""White noise unit generator."""
 
+	__slots__ = ("_prng","_latest","_latest2","cycleScale","_cyclePos")
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,seed=None,subsample=None):
 		super(Noise,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -61,14 +65,14 @@ class Noise(UGen):
 		if (self.cycleScale != None):
 			self._cyclePos += 1.0
 			if (self._cyclePos < self.cycleScale):
-				if (self.outChannels == 1): return self._latest
-				else:                       return (self._latest,self._latest2)
+				if (self.outChannels == 2): self._tick2 = self._latest2
+				return self._latest
 			self._cyclePos %= self.cycleScale
 
 		self._latest = 2*self._prng.random()-1
 		if (self.outChannels == 1): return self._latest
-		self._latest2 = 2*self._prng.random()-1
-		return (self._latest,self._latest2)
+		self._latest2 = self._tick2 = 2*self._prng.random()-1
+		return self._latest
 
 
 class Periodic(UGen):
@@ -88,6 +92,10 @@ class Periodic(UGen):
 	$$$ currently, doing it as a method does not work
 	"""
 
+	__slots__ = ("cycleScale","_cyclePos","wave_generator","_freq",
+	             "_freqLast","_phase","_phaseLast","period","step")
+	_transient = ("wave_generator",)
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None,phase=None):
 		super(Periodic,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -129,7 +137,9 @@ class Periodic(UGen):
 			self._freq += val
 		else:
 			# val is a scalar
-			if (isinstance(self._freq,UGen)): del self._driven["freq"]
+			if (isinstance(self._freq,UGen)):
+				del self._driven["freq"]
+				UGen.pipeline_change(self)
 			self._freq_update(val)
 
 	def _freq_update(self,val):
@@ -164,7 +174,9 @@ class Periodic(UGen):
 			self._phase += val
 		else:
 			# val is a scalar
-			if (isinstance(self._phase,UGen)): del self._driven["phase"]
+			if (isinstance(self._phase,UGen)):
+				del self._driven["phase"]
+				UGen.pipeline_change(self)
 			self._phase = self._phaseLast = float(val)
 
 	#-- tick handling --
@@ -172,15 +184,24 @@ class Periodic(UGen):
 	def tick(self):
 		self._cyclePos = (self._cyclePos + self.step)  % self.cycleScale
 		phasedPos      = (self._cyclePos + self.phase) % self.cycleScale
+		return self.wave_generator(phasedPos)
+
+	def _tick_traced(self):
+		outSample = self._tick_fast()
 		if ("ticks" in UGen.debug):
+			phasedPos = (self._cyclePos + self.phase) % self.cycleScale
 			print >>stderr, "Periodic.tick(\"%s\") cyclePos=%s phasedPos=%s" \
 			            % (self.name,self._cyclePos,phasedPos)
-		return self.wave_generator(phasedPos)
+		return outSample
+
+UGen.trace_when(Periodic,"tick",["ticks"])
 
 
 class SinOsc(Periodic):
 	"""Sinusoidal unit generator."""
 
+	__slots__ = ()
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None,phase=None):
 		super(SinOsc,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -190,10 +211,15 @@ class SinOsc(Periodic):
 		self.freq           = self._freq  # $$$ (this forces update needed when we changed cycleScale)
 		self.wave_generator = lambda x: sin(x)
 
+	def _refresh(self):
+		self.wave_generator = lambda x: sin(x)
+
 
 class SawOsc(Periodic):
 	"""Sawtooth wave unit generator."""
 
+	__slots__ = ()
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None,phase=None):
 		super(SawOsc,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -203,10 +229,15 @@ class SawOsc(Periodic):
 		self.freq           = self._freq  # $$$ (this forces update needed when we changed cycleScale)
 		self.wave_generator = lambda x: 2*x-1
 
+	def _refresh(self):
+		self.wave_generator = lambda x: 2*x-1
+
 
 class TriOsc(Periodic):
 	"""Triangle wave unit generator."""
 
+	__slots__ = ("_duty","_dutyLast")
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None,phase=None,duty=None):
 		super(TriOsc,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -242,9 +273,17 @@ class TriOsc(Periodic):
 			self._duty += val
 		else:
 			# val is a scalar
-			if (isinstance(self._duty,UGen)): del self._driven["duty"]
+			if (isinstance(self._duty,UGen)):
+				del self._driven["duty"]
+				UGen.pipeline_change(self)
 			self._duty_update(val)
 
+	def _refresh(self):
+		# (rebuild wave_generator, keeping any driver)
+		control = self._duty
+		self._duty_update(self._dutyLast)
+		self._duty = control
+
 	def _duty_update(self,val):
 		self._duty = self._dutyLast = val = clip_value(float(val),-1.0,1.0)
 		# side effects
@@ -267,6 +306,8 @@ class TriOsc(Periodic):
 class SqrOsc(Periodic):
 	"""Square wave unit generator."""
 
+	__slots__ = ("_duty","_dutyLast")
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None,phase=None,duty=None):
 		super(SqrOsc,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -302,9 +343,17 @@ class SqrOsc(Periodic):
 			self._duty += val
 		else:
 			# val is a scalar
-			if (isinstance(self._duty,UGen)): del self._driven["duty"]
+			if (isinstance(self._duty,UGen)):
+				del self._driven["duty"]
+				UGen.pipeline_change(self)
 			self._duty_update(val)
 
+	def _refresh(self):
+		# (rebuild wave_generator, keeping any driver)
+		control = self._duty
+		self._duty_update(self._dutyLast)
+		self._duty = control
+
 	def _duty_update(self,val):
 		self._duty = self._dutyLast = val = clip_value(float(val),-1.0,1.0)
 		# side effects
@@ -322,6 +371,8 @@ class SqrOsc(Periodic):
 class ImpulseTrain(UGen):
 	"""Generator for a periodic one-sample wide pulse."""
 
+	__slots__ = ("cycleScale","_cyclePos","_freq","_freqLast","period","step")
+
 	def __init__(self,inChannels=0,outChannels=1,name=None,
 	             bias=None,gain=None,freq=None):
 		super(ImpulseTrain,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
@@ -359,7 +410,9 @@ class ImpulseTrain(UGen):
 			self._freq += val
 		else:
 			# val is a scalar
-			if (isinstance(self._freq,UGen)): del self._driven["freq"]
+			if (isinstance(self._freq,UGen)):
+				del self._driven["freq"]
+				UGen.pipeline_change(self)
 			self._freq_update(val)
 
 	def _freq_update(self,val):
@@ -384,3 +437,220 @@ class ImpulseTrain(UGen):
 		self._cyclePos %= self.cycleScale      # reduce position modulo the period
 		return 1.0                             # output a single-sample pulse
 
+
+
+class PluckedString(UGen):
+	"""Plucked string unit generator, based on the Karplus-Strong scheme.
+
+	This is a self-contained version of the sound chain in
+	examples/plucked_string.py, in which enveloped noise is fed into a delay
+	whose output is fed back through a one-zero low pass filter.  Here the
+	whole loop is computed inside this one ugen, rather than by four ugens
+	percolating through the pipeline.
+
+	pluck(velocity) excites the string with a short burst of noise, shaped
+	the same way as in the example (a 2 msec attack and a 2 msec decay).
+
+	freq is the pitch of the string.  The loop is tuned with an all-pass
+	filter, so the loop length needn't be a whole number of samples.
+	brightness (0..1) sets the loop's low pass filter;  at 0 the filter
+	averages successive samples (the darkest sound), at 1 it passes the loop
+	unfiltered.  The default matches the default OneZero filter.  damping
+	(0..1) is the fraction of the signal lost on each trip around the loop;
+	the default is 0, as in the example, in which case the sound dies away
+	only by being filtered.
+
+	Since the string has no inputs, it renders its output in blocks, as many
+	samples as will be generated before a shred can run (and thus before any
+	control can change).  Without a shreduler it renders one sample at a
+	time.  Note that a control changed while a block is partly consumed takes
+	effect with the next block.
+	"""
+
+	__slots__ = ("_prng","_buffer","_bufferLen","_writeIx","_y1","_y2",
+	             "_allPass1","_block","_blockLen","_blockIx","_excitation",
+	             "_exciteIx","_velocity","_freq","_brightness","_damping",
+	             "_b0","_b1","_delayInt","_apCoef")
+
+	def __init__(self,name=None,
+	             bias=None,gain=None,freq=None,brightness=None,damping=None,
+	             seed=None):
+		super(PluckedString,self).__init__(inChannels=0,outChannels=1,name=name,
+		                                   bias=bias,gain=gain)
+		if ("constructors" in UGen.debug): print >>stderr, "PluckedString.__init__(%s)" % name
+
+		self._prng = Random()
+		if (seed != None): self._prng.seed(seed)
+
+		self._buffer    = None
+		self._bufferLen = 0
+		self._writeIx   = 0
+		self._y1        = 0.0      # previous two outputs
+		self._y2        = 0.0
+		self._allPass1  = 0.0      # previous input to all-pass filter
+
+		self._block     = array("d", [0.0]*UGen.renderChunks)
+		self._blockLen  = 0
+		self._blockIx   = 0
+
+		self._excitation = self._pluck_envelope(2*UGen.samplingRate/1000.0,
+		                                        2*UGen.samplingRate/1000.0)
+		self._exciteIx   = len(self._excitation)
+		self._velocity   = 0.0
+
+		# the default brightness makes our filter the same as OneZero's
+		# default filter, (1+brightness)/2 = 1/(1+|zero|)
+		if (freq       == None): freq       = UGen.defaultFreq
+		if (brightness == None): brightness = (1+UGen.defaultFilterZero) / (1-UGen.defaultFilterZero)
+		if (damping    == None): damping    = 0.0
+		self.set(freq,brightness,damping)
+
+	def set(self,freq,brightness,damping):
+		self._freq       = freq       = float(freq)
+		self._brightness = brightness = clip_value(float(brightness),0.0,1.0)
+		self._damping    = damping    = clip_value(float(damping),   0.0,1.0)
+		loopGain = 1.0 - damping
+		self._b0 = loopGain * (1+brightness) / 2
+		self._b1 = loopGain * (1-brightness) / 2
+
+		if (freq <= 0):
+			self._delayInt = None  # (string is mute)
+			return
+
+		# the loop consists of the delay, one sample between the delay's
+		# output and the filter's input, and the filter's own (low frequency)
+		# phase delay;  the delay gets what's left, as a whole number of
+		# samples plus a fraction for the all-pass filter
+		loopDelay = UGen.samplingRate / freq
+		delay     = loopDelay - 1 - (1-brightness)/2
+		if (delay < 1): delay = 1
+		delayInt  = int(floor(delay))
+		frac      = delay - delayInt
+		self._delayInt = delayInt
+		self._apCoef   = (1-frac) / (1+frac)
+		self._fit(delayInt)
+
+	def _fit(self,delay):
+		# make sure the buffer can hold the given delay;  the buffer is
+		# unrolled as it grows, so the samples already written keep their age
+		if (delay < self._bufferLen): return
+		bufferLen = raise_to_mulitple(delay+1,UGen.bufferChunks)
+		oldBuffer = self._buffer
+		self._buffer = array("d", [0.0]*(bufferLen-self._bufferLen))
+		if (oldBuffer != None):
+			self._buffer.extend(oldBuffer[self._writeIx:])
+			self._buffer.extend(oldBuffer[:self._writeIx])
+		self._bufferLen = bufferLen
+		self._writeIx   = 0
+
+	def _pluck_envelope(self,attack,decay):
+		# nota bene: this is the same shape an ADSR envelope has with zero
+		#            sustain
+		duration  = attack + decay
+		xSplit    = attack / duration
+		attackFunc = linear_ramp(0,xSplit,0.0,1.0)
+		decayFunc  = diminishing_exponential(xSplit,1,1.0,0.0)
+		envelope   = piecewise([xSplit],[attackFunc,decayFunc])
+		numSamples = int(ceil(duration))
+		return array("d", [envelope(float(ix)/duration) for ix in xrange(1,numSamples)])
+
+	def pluck(self,velocity=None):
+		if (velocity == None): velocity = 1.0
+		self._velocity = float(velocity)
+		self._exciteIx = 0
+
+	#-- non-drivable freq, with side effects --
+
+	@property
+	def freq(self):
+		return self._freq
+
+	@freq.setter
+	def freq(self,freq):
+		self.set(freq,self.brightness,self.damping)
+
+	#-- non-drivable brightness, with side effects --
+
+	@property
+	def brightness(self):
+		return self._brightness
+
+	@brightness.setter
+	def brightness(self,brightness):
+		self.set(self.freq,brightness,self.damping)
+
+	#-- non-drivable damping, with side effects --
+
+	@property
+	def damping(self):
+		return self._damping
+
+	@damping.setter
+	def damping(self,damping):
+		self.set(self.freq,self.brightness,damping)
+
+	#-- tick handling --
+
+	def tick(self):
+		if (self._blockIx >= self._blockLen):
+			numSamples = min(UGen.quiet_samples(),len(self._block))
+			self._render(numSamples)
+		outSample = self._block[self._blockIx]
+		self._blockIx += 1
+		return outSample
+
+	def _render(self,numSamples):
+		block = self._block
+		if (self._delayInt == None):
+			for ix in xrange(numSamples): block[ix] = 0.0
+			self._blockLen = numSamples
+			self._blockIx  = 0
+			return
+
+		# copy state into locals for the duration of the loop
+		buffer     = self._buffer
+		bufferLen  = self._bufferLen
+		writeIx    = self._writeIx
+		readIx     = (writeIx - self._delayInt) % bufferLen
+		b0         = self._b0
+		b1         = self._b1
+		c          = self._apCoef
+		y1         = self._y1
+		y2         = self._y2
+		allPass1   = self._allPass1
+		excitation = self._excitation
+		exciteIx   = self._exciteIx
+		exciteLen  = len(excitation)
+		velocity   = self._velocity
+		random     = self._prng.random
+
+		for ix in xrange(numSamples):
+			# the loop's filter sees the string's previous outputs, and
+			# feeds the delay (along with any excitation)
+			loopIn = b0*y1 + b1*y2
+			if (exciteIx < exciteLen):
+				loopIn   += velocity * excitation[exciteIx] * (2*random()-1)
+				exciteIx += 1
+
+			# read before write, since readIx and writeIx may be the same
+			delayed = buffer[readIx]
+			buffer[writeIx] = loopIn
+			readIx  += 1
+			writeIx += 1
+			if (readIx  == bufferLen): readIx  = 0
+			if (writeIx == bufferLen): writeIx = 0
+
+			# fractional part of the delay
+			y0       = c*delayed + allPass1 - c*y1
+			allPass1 = delayed
+			y2       = y1
+			y1       = y0
+			block[ix] = y0
+
+		self._writeIx  = writeIx
+		self._y1       = y1
+		self._y2       = y2
+		self._allPass1 = allPass1
+		self._exciteIx = exciteIx
+		self._blockLen = numSamples
+		self._blockIx  = 0
@@ -22,7 +22,15 @@ __version__   = "0.01"
 __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
-from math import exp
+from math   import exp,log,floor
+from array  import array
+from struct import unpack as struct_unpack
+from ugen   import UGen
+
+
+class MidiError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
 
 
 semitone   = 1.0594630943592952646  # 12th root of 2
@@ -30,6 +38,17 @@ lnSemitone = 0.0577622650466621091  # log base e of 12th root of 2
 lnOctave   = 0.6931471805599453094  # log base e of 2
 
 
+#-- pitch --
+#
+# Generative shreds convert notes to frequencies in tight loops, so the
+# frequencies of the 128 midi notes are computed once, into noteFreqs.  Other
+# notes (fractional or out of range) are computed directly.  midi_to_freqs
+# converts a whole sequence of notes at once.
+
+noteToFreqK = 2.1011784386926213178  # (ln 440 - 69ln s), see midi_to_freq
+noteFreqs   = [exp(midiNote*lnSemitone + noteToFreqK) for midiNote in xrange(128)]
+
+
 def midi_to_freq(midiNote):
 	"""Convert a midi note number to the corresponding frequency.
 
@@ -41,9 +60,120 @@ def midi_to_freq(midiNote):
 	# f = 440 * s^(m-69)
 	# => ln f = ln 440 + (m-69)ln s
 	# => ln f = m*ln s + (ln 440 - 69ln s)
-	k = 2.1011784386926213178  # (ln 440 - 69ln s)
-	f = exp(midiNote*lnSemitone + k)
-	return f
+	# the table holds exactly what the formula gives, for integer notes
+	if (type(midiNote) == int) and (0 <= midiNote < 128):
+		return noteFreqs[midiNote]
+	return exp(midiNote*lnSemitone + noteToFreqK)
+
+
+def midi_to_freqs(midiNotes):
+	"""Convert a sequence of midi note numbers to frequencies.
+
+	The result is an array of doubles, or, if midiNotes is a numpy array, a
+	numpy array (numpy is only needed in that case).
+	"""
+	if (hasattr(midiNotes,"dtype")):
+		import numpy
+		return numpy.exp(numpy.asarray(midiNotes,dtype=float)*lnSemitone + noteToFreqK)
+	table = noteFreqs
+	return array("d",[table[midiNote] if (type(midiNote) == int) and (0 <= midiNote < 128)
+	                  else exp(midiNote*lnSemitone + noteToFreqK)
+	                  for midiNote in midiNotes])
+
+
+#-- tunings --
+
+equalCents       = [100.0*degree for degree in xrange(12)]
+justCents        = [1200*log(r)/lnOctave for r in (1.0,16/15.0,9/8.0,6/5.0,5/4.0,4/3.0,
+                                                  45/32.0,3/2.0,8/5.0,5/3.0,9/5.0,15/8.0)]
+pythagoreanCents = [1200*log(r)/lnOctave for r in (1.0,256/243.0,9/8.0,32/27.0,81/64.0,4/3.0,
+                                                  729/512.0,3/2.0,128/81.0,27/16.0,16/9.0,243/128.0)]
+meantoneCents    = [0.0,76.05,193.16,310.26,386.31,503.42,
+                    579.47,696.58,772.63,889.74,1006.84,1082.89]   # (quarter comma)
+
+
+class Tuning(object):
+	"""A tuning table, mapping midi notes to frequencies.
+
+	cents gives the pitch of each degree of the scale, in cents above degree
+	zero (so cents[0] is 0);  the scale repeats every period cents, one
+	octave by default.  tonic is a midi note that falls on degree zero
+	(middle C by default), and refNote sounds at refFreq.  For example,
+	Tuning(justCents,tonic=62) is just intonation in D, with A at 440.
+
+	The frequencies of the 128 midi notes are computed when the tuning is
+	created, so freq() and freqs() are as quick as midi_to_freq() and
+	midi_to_freqs().  A fractional note is placed between its neighbors (at
+	the same fraction of the interval between them);  a note outside 0..127
+	is computed from the scale.
+	"""
+
+	def __init__(self,cents,tonic=60,refNote=69,refFreq=440.0,period=1200.0):
+		if (cents == []) or (cents[0] != 0):
+			msg = "a tuning's cents must start with 0 (not %s)" % (cents[:1])
+			raise ValueError(msg)
+		self.cents   = list(cents)
+		self.tonic   = tonic
+		self.refNote = refNote
+		self.refFreq = float(refFreq)
+		self.period  = float(period)
+		self._refCents = self.note_cents(refNote)
+		self.noteFreqs = [self.compute_freq(midiNote) for midiNote in xrange(129)]
+		self._lnSteps  = [log(self.noteFreqs[midiNote+1]/self.noteFreqs[midiNote])
+		                  for midiNote in xrange(128)]
+		del self.noteFreqs[128]
+
+	def note_cents(self,midiNote):
+		(octave,degree) = divmod(midiNote-self.tonic,len(self.cents))
+		return octave*self.period + self.cents[degree]
+
+	def compute_freq(self,midiNote):
+		midiWhole = int(floor(midiNote))
+		cents     = self.note_cents(midiWhole)
+		if (midiNote != midiWhole):
+			cents += (midiNote-midiWhole) * (self.note_cents(midiWhole+1)-cents)
+		return self.refFreq * exp((cents-self._refCents) * lnOctave / 1200)
+
+	def freq(self,midiNote):
+		if (type(midiNote) == int):
+			if (0 <= midiNote < 128): return self.noteFreqs[midiNote]
+		elif (0 <= midiNote < 127):
+			midiWhole = int(midiNote)
+			return self.noteFreqs[midiWhole] \
+			     * exp((midiNote-midiWhole) * self._lnSteps[midiWhole])
+		return self.compute_freq(midiNote)
+
+	def freqs(self,midiNotes):
+		"""Convert a sequence of midi notes to an array of frequencies."""
+		if (hasattr(midiNotes,"dtype")):
+			# interpolating the logs of the table places a fractional note
+			# just as freq() does;  only notes outside 0..127 are computed
+			# one at a time
+			import numpy
+			notes  = numpy.asarray(midiNotes,dtype=float)
+			freqs  = numpy.exp(numpy.interp(notes,numpy.arange(128),numpy.log(self.noteFreqs)))
+			beyond = numpy.flatnonzero((notes < 0) | (notes > 127))
+			for ix in beyond.tolist():
+				freqs.flat[ix] = self.compute_freq(notes.flat[ix])
+			return freqs
+		table = self.noteFreqs
+		return array("d",[table[midiNote] if (type(midiNote) == int) and (0 <= midiNote < 128)
+		                  else self.freq(midiNote)
+		                  for midiNote in midiNotes])
+
+
+#-- scales --
+#
+# Scales are memoized, keyed by (mode,root,minNote,maxNote);  each call gets
+# its own copy of the list.
+
+modeNames = {"i":"ionian", "ii":"dorian", "iii":"phrygian", "iv":"lydian",
+             "v":"mixolydian", "vi":"aeolian", "vii":"locrian"}
+modeMagic = {"ionian":5, "dorian":3, "phrygian":1, "lydian":6,
+             "mixolydian":4, "aeolian":2, "locrian":0}
+pentatonicMagic = {"i":3, "ii":1, "iii":4, "iv":2, "v":0}
+
+scaleCache = {}
 
 
 def build_scale(mode,root,numNotes=None):
@@ -66,6 +196,12 @@ def build_scale(mode,root,numNotes=None):
 	if (numNotes == None):
 		(mode,root,numNotes) = ("ionian",mode,root)
 
+	if (type(numNotes) == int): (minNote,maxNote) = (0,numNotes-1)
+	else:                       (minNote,maxNote) = numNotes
+
+	key = ("heptatonic",mode,root,minNote,maxNote)
+	if (key in scaleCache): return list(scaleCache[key])
+
 	if (root < 0):
 		msg = "\"%s\" is not an allowed root for build_scale" % root
 		raise ValueError(msg)
@@ -73,33 +209,18 @@ def build_scale(mode,root,numNotes=None):
 	rootWhole = int(root)
 	rootFrac  = root - rootWhole
 
-	if (type(numNotes) == int): (minNote,maxNote) = (0,numNotes-1)
-	else:                       (minNote,maxNote) = numNotes
-
 	lowMode = mode.lower()
-	if   (lowMode == "i"):   lowMode = "ionian"
-	elif (lowMode == "ii"):  lowMode = "dorian"
-	elif (lowMode == "iii"): lowMode = "phrygian"
-	elif (lowMode == "iv"):  lowMode = "lydian"
-	elif (lowMode == "v"):   lowMode = "mixolydian"
-	elif (lowMode == "vi"):  lowMode = "aeolian"
-	elif (lowMode == "vii"): lowMode = "locrian"
-
-	if   (lowMode == "ionian"):     magic = 7*rootWhole+5
-	elif (lowMode == "dorian"):     magic = 7*rootWhole+3
-	elif (lowMode == "phrygian"):   magic = 7*rootWhole+1
-	elif (lowMode == "lydian"):     magic = 7*rootWhole+6
-	elif (lowMode == "mixolydian"): magic = 7*rootWhole+4
-	elif (lowMode == "aeolian"):    magic = 7*rootWhole+2
-	elif (lowMode == "locrian"):    magic = 7*rootWhole
-	else:
+	lowMode = modeNames.get(lowMode,lowMode)
+	if (lowMode not in modeMagic):
 		msg = "\"%s\" is not recognized mode for build_scale" % mode
 		raise ValueError(msg)
+	magic = 7*rootWhole + modeMagic[lowMode]
 
 	scale = [None] * (maxNote+1)
 	for degree in xrange(minNote,maxNote+1):
 		scale[degree] = (12*degree+magic)/7 + rootFrac
 
+	scaleCache[key] = tuple(scale)
 	return scale
 
 
@@ -122,6 +243,12 @@ def build_pentatonic_scale(mode,root,numNotes=None):
 	if (numNotes == None):
 		(mode,root,numNotes) = ("i",mode,root)
 
+	if (type(numNotes) == int): (minNote,maxNote) = (0,numNotes-1)
+	else:                       (minNote,maxNote) = numNotes
+
+	key = ("pentatonic",mode,root,minNote,maxNote)
+	if (key in scaleCache): return list(scaleCache[key])
+
 	if (root < 0):
 		msg = "\"%s\" is not an allowed root for midi_pentatonic" % root
 		raise ValueError(msg)
@@ -129,21 +256,232 @@ def build_pentatonic_scale(mode,root,numNotes=None):
 	rootWhole = int(root)
 	rootFrac  = root - rootWhole
 
-	if (type(numNotes) == int): (minNote,maxNote) = (0,numNotes-1)
-	else:                       (minNote,maxNote) = numNotes
-
 	lowMode = mode.lower()
-	if   (lowMode == "i"):   magic = 5*rootWhole+3
-	elif (lowMode == "ii"):  magic = 5*rootWhole+1
-	elif (lowMode == "iii"): magic = 5*rootWhole+4
-	elif (lowMode == "iv"):  magic = 5*rootWhole+2
-	elif (lowMode == "v"):   magic = 5*rootWhole+0
-	else:
+	if (lowMode not in pentatonicMagic):
 		msg = "\"%s\" is not recognized mode for midi_pentatonic" % mode
 		raise ValueError(msg)
+	magic = 5*rootWhole + pentatonicMagic[lowMode]
 
 	scale = [None] * (maxNote+1)
 	for degree in xrange(minNote,maxNote+1):
 		scale[degree] = (12*degree+magic)/5 + rootFrac
 
+	scaleCache[key] = tuple(scale)
 	return scale
+
+
+#-- standard midi files --
+
+defaultTempo = 500000   # microseconds per quarter note (120 bpm)
+
+
+class MidiFile(object):
+	"""A standard midi file (type 0 or 1), read into one sorted event list.
+
+	source is a filename or a file object.  The events of all the tracks are
+	merged into self.events, sorted by time, with events at the same time
+	kept in the order they appear in the file (and in track order).  Each
+	event is a tuple (time,kind,channel,data1,data2), where time is in
+	seconds, taking the file's tempo changes into account, and kind is one of
+
+		"note on"      data1=note,       data2=velocity (1..127)
+		"note off"     data1=note,       data2=velocity
+		"key pressure" data1=note,       data2=pressure
+		"control"      data1=controller, data2=value
+		"program"      data1=program,    data2=None
+		"pressure"     data1=pressure,   data2=None
+		"pitch bend"   data1=bend,       data2=None   (bend is -8192..8191)
+
+	A note on with velocity zero is reported as a note off.  Meta events
+	other than tempo changes, and system exclusive messages, are skipped.
+	"""
+
+	def __init__(self,source):
+		if (type(source) == str):
+			f = open(source,"rb")
+			data = f.read()
+			f.close()
+		else:
+			data = source.read()
+
+		if (data[:4] != "MThd"):
+			msg = "not a standard midi file (no MThd header)"
+			raise MidiError(msg)
+		(headerLen,self.format,numTracks,self.division) = struct_unpack(">LHHH",data[4:14])
+		if (self.format not in [0,1]):
+			msg = "midi file format %d is not supported (only 0 and 1)" % self.format
+			raise MidiError(msg)
+
+		# read the tracks;  each track's events are already in tick order, so
+		# a stable sort by tick merges them
+
+		events = []
+		tempos = []
+		ix = 8 + headerLen
+		self.numTracks = 0
+		while (ix + 8 <= len(data)):
+			chunkType = data[ix:ix+4]
+			(chunkLen,) = struct_unpack(">L",data[ix+4:ix+8])
+			ix += 8
+			if (chunkType == "MTrk"):
+				read_track(data,ix,ix+chunkLen,events,tempos)
+				self.numTracks += 1
+			ix += chunkLen
+		if (self.numTracks != numTracks):
+			msg = "midi file has %d tracks, but its header says %d" % (self.numTracks,numTracks)
+			raise MidiError(msg)
+
+		events.sort(key=lambda event: event[0])
+		tempos.sort(key=lambda tempo: tempo[0])
+		self.events   = ticks_to_seconds(events,tempos,self.division)
+		self.duration = self.events[-1][0] if (self.events != []) else 0.0
+
+
+def read_track(data,ix,end,events,tempos):
+	# appends (tick,kind,channel,data1,data2) to events and (tick,tempo)
+	# to tempos
+	tick   = 0
+	status = None     # (running status)
+	while (ix < end):
+		(delta,ix) = read_vlq(data,ix)
+		tick += delta
+		b = ord(data[ix])
+		if (b >= 0x80):
+			ix += 1
+			if (b < 0xF0): status = b
+		elif (status == None):
+			msg = "midi track has data byte %02X without a status byte" % b
+			raise MidiError(msg)
+		else:
+			b = status
+
+		if (b == 0xFF):
+			# meta event;  we only care about tempo and end of track
+			metaType = ord(data[ix])
+			(length,ix) = read_vlq(data,ix+1)
+			if (metaType == 0x51):
+				(hi,mid,lo) = [ord(c) for c in data[ix:ix+3]]
+				tempos.append((tick,(hi<<16) | (mid<<8) | lo))
+			ix += length
+			status = None
+			if (metaType == 0x2F): break
+			continue
+		if (b in (0xF0,0xF7)):
+			# system exclusive
+			(length,ix) = read_vlq(data,ix)
+			ix += length
+			status = None
+			continue
+		if (b >= 0xF0):
+			msg = "midi track has unexpected status byte %02X" % b
+			raise MidiError(msg)
+
+		kind    = b & 0xF0
+		channel = b & 0x0F
+		data1   = ord(data[ix])
+		if (kind in (0xC0,0xD0)):
+			ix += 1
+			if (kind == 0xC0): events.append((tick,"program", channel,data1,None))
+			else:              events.append((tick,"pressure",channel,data1,None))
+			continue
+		data2 = ord(data[ix+1])
+		ix += 2
+		if   (kind == 0x90):
+			if (data2 == 0): events.append((tick,"note off",    channel,data1,data2))
+			else:            events.append((tick,"note on",     channel,data1,data2))
+		elif (kind == 0x80): events.append((tick,"note off",    channel,data1,data2))
+		elif (kind == 0xB0): events.append((tick,"control",     channel,data1,data2))
+		elif (kind == 0xA0): events.append((tick,"key pressure",channel,data1,data2))
+		else: # (kind == 0xE0)
+			events.append((tick,"pitch bend",channel,((data2<<7) | data1) - 8192,None))
+
+
+def read_vlq(data,ix):
+	# read a variable length quantity;  returns (value,ix after it)
+	value = 0
+	while (True):
+		b = ord(data[ix])
+		ix += 1
+		value = (value << 7) | (b & 0x7F)
+		if (b < 0x80): return (value,ix)
+
+
+def ticks_to_seconds(events,tempos,division):
+	# converts the tick time in each (tick,...) event to seconds
+	if (division & 0x8000):
+		# smpte time;  the high byte is minus the frames per second (with 29
+		# meaning 29.97), the low byte is ticks per frame
+		fps = 256 - (division >> 8)
+		if (fps == 29): fps = 29.97
+		secondsPerTick = 1.0 / (fps * (division & 0xFF))
+		return [(event[0]*secondsPerTick,) + event[1:] for event in events]
+
+	secondsPerTick = defaultTempo / (1000000.0 * division)
+	baseTick    = 0      # tick of the latest tempo change
+	baseSeconds = 0.0    # .. and its time in seconds
+	tempoIx     = 0
+	converted   = []
+	for event in events:
+		tick = event[0]
+		while (tempoIx < len(tempos)) and (tempos[tempoIx][0] <= tick):
+			(tempoTick,tempo) = tempos[tempoIx]
+			baseSeconds   += (tempoTick-baseTick) * secondsPerTick
+			baseTick       = tempoTick
+			secondsPerTick = tempo / (1000000.0 * division)
+			tempoIx       += 1
+		converted.append((baseSeconds + (tick-baseTick)*secondsPerTick,) + event[1:])
+	return converted
+
+
+class MidiPlayer(object):
+	"""Play a midi file's events, from a single shred.
+
+	midiFile is a MidiFile (or a filename).  instruments maps a midi channel
+	(0..15) to an instrument, any object with note_on(note,velocity) and
+	note_off(note) methods, such as a VoicePool;  the entry for channel None,
+	if any, is used for channels not listed.  Velocities are scaled to 0..1.
+	Every other event (and any note on a channel without an instrument) is
+	passed to handler(kind,channel,data1,data2), if given.
+
+	play() is the shred that plays the file, e.g. zook.spork(player.play()).
+	It sleeps until the time of the next event, dispatches all the events at
+	that time, and sleeps again, so a score of any size costs one shred.
+	Times are relative to when the shred starts, and can be stretched with
+	speed (2.0 plays twice as fast).
+	"""
+
+	def __init__(self,midiFile,instruments=None,handler=None,speed=1.0):
+		if (type(midiFile) == str): midiFile = MidiFile(midiFile)
+		if (instruments == None): instruments = {}
+		self.midiFile    = midiFile
+		self.instruments = instruments
+		self.handler     = handler
+		self.speed       = float(speed)
+
+	def play(self):
+		shreduler   = UGen.shreduler
+		startTime   = shreduler.now()
+		scale       = shreduler.sec / self.speed
+		instruments = self.instruments
+		default     = instruments.get(None)
+		handler     = self.handler
+		events      = self.midiFile.events
+
+		ix = 0
+		while (ix < len(events)):
+			when = startTime + events[ix][0]*scale
+			if (when > shreduler.now()): yield ("absolute",when)
+			eventTime = events[ix][0]
+			while (ix < len(events)) and (events[ix][0] == eventTime):
+				(_,kind,channel,data1,data2) = events[ix]
+				ix += 1
+				instrument = instruments.get(channel,default)
+				if (instrument != None):
+					if (kind == "note on"):
+						instrument.note_on(data1,data2/127.0)
+						continue
+					if (kind == "note off"):
+						instrument.note_off(data1)
+						continue
+				if (handler != None):
+					handler(kind,channel,data1,data2)
@@ -22,11 +22,15 @@ __version__   = "0.01"
 __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
-from sys    import stdout,stderr
-from wave   import open as wave_open
-from struct import pack as struct_pack
-from ugen   import UGen,PassThru
-from util   import clip_value
+import os
+from sys       import stdout,stderr
+from time      import time
+from struct    import pack as struct_pack
+from ugen      import UGen,UGenError,PassThru
+from wavfile   import WavWriter,WavFileError,sampleFormats,sample_format,encode_pcm
+
+wavHeaderLookahead = 1024     # (the sample data starts within this many bytes)
+wavCopyChunk       = 1 << 16
 
 
 class TextOut(PassThru):
@@ -40,81 +44,555 @@ class TextOut(PassThru):
 	case we copen the file for write.  Note that we never close the file.  If
 	no file or filename is provided we write to stdout.
 
+	Samples are collected and formatted in batches, chunkFrames lines at a
+	time, or fewer when a shred is about to run (so that the table stays in
+	order with anything the shred prints).  If threaded is true, the text is
+	written by an AsyncWriter.  The shreduler flushes its outputs at the end
+	of a run;  a TextOut used outside of a run should be flushed (or closed).
+
 	Unlike WavOut, the output samples are NOT clipped.
+
+	A TextOut is not made a sink when it is created.  With lazySink=True it
+	becomes one (of the current shreduler) when something is first connected
+	to it;  this is how the console sinks in shred.py work, so that they cost
+	nothing in programs that don't use them.  Otherwise the caller makes it a
+	sink.
 	"""
 
-	def __init__(self,filename=None,channels=1,name=None):
+	__slots__ = ("sampleNum","file","threaded","chunkFrames","lazySink",
+	             "_buffer","_chunkSamples","_writer")
+	_transient = ("_writer",)
+
+	def __init__(self,filename=None,channels=1,threaded=False,chunkFrames=4096,
+	             lazySink=False,name=None):
 		super(TextOut,self).__init__(channels=channels,name=name)
 		if ("constructors" in UGen.debug): print >>stderr, "TextOut.__init__(%s)" % name
 		self.ignoreInputlessSink = True
-		self.sampleNum = 0
+		self.sampleNum     = 0
+		self.threaded      = threaded
+		self.chunkFrames   = chunkFrames
+		self.lazySink      = lazySink
+		self._buffer       = []
+		self._chunkSamples = chunkFrames * self.outChannels
 		if   (filename == None):      self.file = stdout
 		elif (type(filename) == str): self.file = open(filename,"w")
 		else:                         self.file = filename
+		self._open()
+
+	def _open(self):
+		if (self.threaded): self._writer = AsyncWriter(self,self.file.write)
+		else:               self._writer = None
+
+	def _refresh(self):
+		self._open()
+
+	def add_feed(self,upstream,fromChannel=None,intoChannel=None):
+		super(TextOut,self).add_feed(upstream,fromChannel=fromChannel,intoChannel=intoChannel)
+		if (self.lazySink): UGen.add_sink(self)
+
+	def flush(self):
+		self.write_pending()
+		if (self._writer != None): self._writer.flush()
+		self.file.flush()
 
 	def close(self):
+		self.write_pending()
+		if (self._writer != None):
+			self._writer.close()
+			self._writer = None
 		if (self.file != stdout):
 			self.file.close()
 
 	def tick(self,sample,sample2=None):
-		self.sampleNum += 1
+		buffer = self._buffer
+		if (buffer == []):
+			shreduler = UGen.shreduler
+			if (shreduler != None): shreduler.pendingOutputs.append(self)
 		if (sample2 == None):
-			print >>self.file, "%s\t%s" % (self.sampleNum,sample)
-			return sample
+			buffer.append(sample)
+		else:
+			buffer.append(sample)
+			buffer.append(sample2)
+			self._tick2 = sample2
+		if (len(buffer) >= self._chunkSamples): self.write_pending()
+		return sample
+
+	def write_pending(self):
+		samples = self._buffer
+		if (samples == []): return
+		self._buffer = []
+		text = self.format_lines(samples)
+		if (self._writer != None): self._writer.put(text)
+		else:                      self.file.write(text)
+
+	def format_lines(self,samples):
+		# format a batch of lines with a single % operation;  the sample
+		# numbers are interleaved with the samples to fill it
+		channels = self.outChannels
+		numLines = len(samples) // channels
+		first    = self.sampleNum + 1
+		self.sampleNum += numLines
+		values = [None] * (len(samples)+numLines)
+		values[0::channels+1] = xrange(first,first+numLines)
+		if (channels == 1):
+			values[1::2] = samples
+			return ("%s\t%s\n" * numLines) % tuple(values)
 		else:
-			print >>self.file, "%s\t%s\t%s" % (self.sampleNum,sample,sample)
-			return (sample,sample2)
+			values[1::3] = samples[0::2]
+			values[2::3] = samples[1::2]
+			return ("%s\t%s\t%s\n" * numLines) % tuple(values)
 
 
 class WavOut(PassThru):
 	"""Write the input value(s) to a .wav file.
 
-	The output samples are clipped to the maximum value supported by the file.
+	sampleWidth is the number of bytes per sample, 1 to 4;  alternatively
+	sampleFormat can be any of the formats in wavfile.sampleFormats, e.g.
+	"int24" or "float32".  Integer output samples are clipped to the maximum
+	value supported by the file;  float samples are not clipped.
+
+	Samples are collected and written chunkFrames at a time.  If threaded is
+	true, an AsyncWriter encodes and writes them.  The shreduler flushes its
+	outputs when its run ends;  a .wav file written outside of a run should
+	be closed (or flushed).
 	"""
-	# $$$ add support for 24 bits
+
+	__slots__ = ("filename","wavFile","sampleWidth","sampleFormat",
+	             "threaded","chunkFrames","_buffer","_chunkSamples","_writer")
+	_transient = ("wavFile","_writer")
 	# $$$ setup shreduler list of unclosed wavOut objects, so it can close them upon exit 
 
-	def __init__(self,filename=None,sampleWidth=2,channels=1,name=None):
+	def __init__(self,filename=None,sampleWidth=2,channels=1,threaded=False,
+	             chunkFrames=4096,sampleFormat=None,name=None):
 		super(WavOut,self).__init__(channels=channels,name=name)
 		if ("constructors" in UGen.debug): print >>stderr, "WavOut.__init__(%s)" % name
 		if (filename == None):
 			msg = "can't write to an unnamed wav file (for %s)" % self
 			raise UGenError(msg)
-		if (sampleWidth not in [1,2]):
-			msg = "sampleWidth=%s is not supported (for %s)" % (sampleWidth,self)
+		if (sampleFormat == None):
+			try:
+				sampleFormat = sample_format(sampleWidth)
+			except WavFileError:
+				msg = "sampleWidth=%s is not supported (for %s)" % (sampleWidth,self)
+				raise UGenError(msg)
+		if (sampleFormat not in sampleFormats):
+			msg = "sampleFormat=%s is not supported (for %s)" % (sampleFormat,self)
 			raise UGenError(msg)
 
 		self.ignoreInputlessSink = True
 
-		self.sampleWidth = sampleWidth
-		self.sampleScale = (1<<(8*sampleWidth-1)) - 1
+		self.sampleFormat = sampleFormat
+		self.sampleWidth  = sampleFormats[sampleFormat][1]
 		if ("resolution" in UGen.debug):
-			print >>stderr, "%s sampleWidth=%s sampleScale=%s" \
-			              % (self,self.sampleWidth,self.sampleScale)
-		if (sampleWidth == 1): self.packFormat = "b"
-		else:                  self.packFormat = "h"
-		self.wavFile = wavFile = wave_open(filename, "wb")
-
-		wavFile.setparams((self.outChannels,self.sampleWidth,UGen.samplingRate,1,
-		                   "NONE","not compressed"))
+			print >>stderr, "%s sampleFormat=%s" % (self,self.sampleFormat)
+		self.threaded      = threaded
+		self.chunkFrames   = chunkFrames
+		self._buffer       = []
+		self._chunkSamples = chunkFrames * self.outChannels
+		self.filename      = filename
+		self._open()
 
 		UGen.add_sink(self)
 
+	def _open(self):
+		# during a dry run (see RenderCache) no file is written
+		shreduler = UGen.shreduler
+		self._writer = None
+		if (shreduler != None) and (shreduler.dryRun != None):
+			shreduler.dryRun.add_output(self.filename)
+			self.wavFile = None
+		else:
+			self.wavFile = WavWriter(self.filename,self.outChannels,UGen.samplingRate,
+			                         self.sampleFormat)
+			if (self.threaded): self._writer = AsyncWriter(self,self._write_samples)
+
+	def _refresh(self):
+		# (a loaded graph starts the file afresh)
+		self._open()
+
+	def flush(self):
+		# make sure everything so far is in the file
+		if (self.wavFile == None): return
+		self._send()
+		if (self._writer != None): self._writer.flush()
+		self.wavFile.flush()
+
 	def close(self):
 		UGen.remove_sink(self)
+		if (self.wavFile == None): return
+		self._send()
+		if (self._writer != None):
+			self._writer.close()
+			self._writer = None
 		self.wavFile.close()
 
+	def reopen(self,numBytes):
+		# continue a file left by an earlier run (see Checkpointer), keeping
+		# its first numBytes bytes of sample data;  the earlier run may not
+		# have closed the file, so we don't trust the sizes in its header
+		partialName = self.filename + ".partial"
+		os.rename(self.filename,partialName)
+		partial = open(partialName,"rb")
+		header  = partial.read(wavHeaderLookahead)
+		dataIx  = header.find("data")
+		if (dataIx < 0):
+			partial.close()
+			msg = "can't find the samples in %s (for %s)" % (self.filename,self)
+			raise UGenError(msg)
+		partial.seek(dataIx+8)
+
+		self.wavFile = wavFile = WavWriter(self.filename,self.outChannels,UGen.samplingRate,
+		                                   self.sampleFormat)
+		while (numBytes > 0):
+			data = partial.read(min(numBytes,wavCopyChunk))
+			if (data == ""):
+				msg = "%s is shorter than expected (for %s)" % (self.filename,self)
+				raise UGenError(msg)
+			wavFile.write_data(data)
+			numBytes -= len(data)
+		partial.close()
+		os.remove(partialName)
+		if (self.threaded) and (self._writer == None):
+			self._writer = AsyncWriter(self,self._write_samples)
+
 	def tick(self,sample,sample2=None):
+		buffer = self._buffer
 		if (sample2 == None):
-			s1 = int(self.sampleScale*sample)
-			s1 = clip_value(s1,-self.sampleScale,self.sampleScale)
-			self.wavFile.writeframes(struct_pack(self.packFormat,s1))
-			return sample
+			buffer.append(sample)
 		else:
-			s1 = int(self.sampleScale*sample)
-			s1 = clip_value(s1,-self.sampleScale,self.sampleScale)
-			s2 = int(self.sampleScale*sample2)
-			s2 = clip_value(s2,-self.sampleScale,self.sampleScale)
-			self.wavFile.writeframes(struct_pack(self.packFormat,s1))
-			self.wavFile.writeframes(struct_pack(self.packFormat,s2))
-			return (sample,sample2)
+			buffer.append(sample)
+			buffer.append(sample2)
+			self._tick2 = sample2
+		if (len(buffer) >= self._chunkSamples): self._send()
+		return sample
+
+	def _send(self):
+		samples = self._buffer
+		if (samples == []): return
+		self._buffer = []
+		if (self._writer != None): self._writer.put(samples)
+		else:                      self._write_samples(samples)
+
+	def _write_samples(self,samples):
+		# (when threaded, this runs in the writer thread)
+		self.wavFile.write_samples(samples)
+
+
+#-- raw pcm --
+
+class RawOut(PassThru):
+	"""Write the input value(s) as raw pcm to a stream, such as a pipe.
+
+	This is for feeding pazookle's output straight into another program (an
+	encoder or a player), through stdout or a named pipe, neither of which
+	WavOut can write (it has to seek back to fix its header).  There is no
+	header;  the receiver has to be told the format, channels and sampling
+	rate.  For the same reason a render writing to a RawOut can't be
+	checkpointed (see Checkpointer).
+
+	stream can be a file object, a filename (e.g. of a named pipe), or a
+	file descriptor number;  by default we write to stdout.  sampleFormat is
+	one of the formats in wavfile.sampleFormats, e.g. "int16", "int24" or
+	"float32".  Samples are interleaved, little-endian, encoded as in a .wav
+	file (so 8-bit samples are unsigned).  Integer samples are clipped as in
+	WavOut;  float samples are not clipped.
+
+	Samples are collected and written chunkFrames at a time.  If threaded is
+	true, chunks are encoded and written by an AsyncWriter, up to queueChunks
+	of them ahead, so that writing overlaps rendering.  Call close() (or
+	flush()) at the end, so the last partial chunk is written.
+
+	stats() reports how the downstream kept up:
+	  chunks        chunks written
+	  bytes         bytes written
+	  blocked       times rendering had to wait for the downstream (a write
+	                that took longer than blockThreshold, or, when threaded,
+	                a full queue);  this is back-pressure
+	  blockedTime   total seconds spent waiting
+	  underruns     times the writer thread found no chunk ready, i.e. the
+	                downstream was waiting for us (threaded only)
+	"""
+
+	__slots__ = ("stream","sampleFormat","chunkFrames","threaded","queueChunks",
+	             "blockThreshold","sampleWidth",
+	             "chunks","bytes","blocked","blockedTime",
+	             "_buffer","_chunkSamples","_ownStream","_writer")
+	_transient = ("stream","_writer")
+
+	def __init__(self,stream=None,sampleFormat="int16",channels=1,chunkFrames=4096,
+	             threaded=False,queueChunks=8,name=None):
+		super(RawOut,self).__init__(channels=channels,name=name)
+		if ("constructors" in UGen.debug): print >>stderr, "RawOut.__init__(%s)" % name
+		if (sampleFormat not in sampleFormats):
+			msg = "sampleFormat=%s is not supported (for %s)" % (sampleFormat,self)
+			raise UGenError(msg)
+		if (chunkFrames < 1) or (queueChunks < 1):
+			msg = "chunkFrames=%s queueChunks=%s is not valid (for %s)" \
+			    % (chunkFrames,queueChunks,self)
+			raise UGenError(msg)
+
+		self.ignoreInputlessSink = True
+
+		self.sampleFormat   = sampleFormat
+		self.sampleWidth    = sampleFormats[sampleFormat][1]
+		self.chunkFrames    = chunkFrames
+		self.threaded       = threaded
+		self.queueChunks    = queueChunks
+		self.blockThreshold = 0.001
+		self.chunks         = 0
+		self.bytes          = 0
+		self.blocked        = 0
+		self.blockedTime    = 0.0
+		self._buffer        = []
+		self._chunkSamples  = chunkFrames * self.outChannels
+		self.stream         = stream
+		self._open()
+
+		UGen.add_sink(self)
+
+	def _open(self):
+		# during a dry run (see RenderCache) nothing is written
+		stream = self.stream
+		self._ownStream = False
+		self._writer    = None
+		shreduler = UGen.shreduler
+		if (shreduler != None) and (shreduler.dryRun != None):
+			self.stream = None
+			return
+		if (stream == None):
+			stream = stdout
+		elif (type(stream) == str):
+			stream = open(stream,"wb")
+			self._ownStream = True
+		elif (type(stream) in (int,long)):
+			stream = os.fdopen(stream,"wb")
+			self._ownStream = True
+		self.stream = stream
+		if (self.threaded):
+			self._writer = AsyncWriter(self,self._write_samples,self.queueChunks)
+
+	def _refresh(self):
+		# (a loaded graph writes to stdout unless told otherwise)
+		self.stream = None
+		self._open()
+
+	def stats(self):
+		(blocked,blockedTime,underruns) = (self.blocked,self.blockedTime,0)
+		writer = self._writer
+		if (writer != None):
+			blocked     += writer.blocked
+			blockedTime += writer.blockedTime
+			underruns   += writer.underruns
+		return {"chunks":      self.chunks,
+		        "bytes":       self.bytes,
+		        "blocked":     blocked,
+		        "blockedTime": blockedTime,
+		        "underruns":   underruns}
+
+	def tick(self,sample,sample2=None):
+		buffer = self._buffer
+		if (sample2 == None):
+			buffer.append(sample)
+		else:
+			buffer.append(sample)
+			buffer.append(sample2)
+			self._tick2 = sample2
+		if (len(buffer) >= self._chunkSamples): self._send()
+		return sample
+
+	def flush(self):
+		# write whatever has been collected, without waiting for a full chunk
+		self._send()
+		if (self._writer != None): self._writer.flush()
+		if (self.stream != None):  self.stream.flush()
+
+	def close(self):
+		UGen.remove_sink(self)
+		self._send()
+		if (self._writer != None):
+			# (keep the writer, for its stats)
+			self._writer.close()
+		if (self.stream == None): return
+		if (self._ownStream): self.stream.close()
+		else:                 self.stream.flush()
+		self.stream = None
+
+	def _send(self):
+		samples = self._buffer
+		self._buffer = []
+		if (self.stream == None) or (samples == []): return
+
+		if (self._writer != None):
+			self._writer.put(samples)
+			return
+
+		data = self.encode(samples)
+		startTime = time()
+		self._write(data)
+		elapsed = time() - startTime
+		if (elapsed > self.blockThreshold):
+			self.blocked     += 1
+			self.blockedTime += elapsed
+
+	def encode(self,samples):
+		return encode_pcm(samples,self.sampleFormat)
+
+	def _write(self,data):
+		self.stream.write(data)
+		self.chunks += 1
+		self.bytes  += len(data)
+
+	def _write_samples(self,samples):
+		# (runs in the writer thread)
+		self._write(self.encode(samples))
+
+
+class BinaryOut(RawOut):
+	"""Write the input value(s) as binary floats, for analysis tools.
+
+	This is the binary companion to TextOut.  Samples are written as
+	little-endian doubles (or, with sampleFormat="float32", singles), with
+	stereo interleaved, and without the sample numbers.  If npy is true (by
+	default, if the filename ends with .npy) the file is in numpy's .npy
+	format, an array of shape (n,) or (n,channels), which numpy.load() reads
+	directly;  otherwise it is raw, as numpy.fromfile() reads it.
+
+	A .npy file's header records its length, so it has to be seekable (the
+	header is brought up to date after every chunk);  a raw stream can be a
+	pipe.  Everything else is as for RawOut.
+	"""
+
+	__slots__ = ("npy",)
+
+	def __init__(self,stream=None,channels=1,sampleFormat="float64",npy=None,
+	             chunkFrames=4096,threaded=False,name=None):
+		if (sampleFormat not in npyTypes):
+			msg = "sampleFormat=%s is not supported (for BinaryOut %s)" % (sampleFormat,name)
+			raise UGenError(msg)
+		if (npy == None): npy = (type(stream) == str) and (stream.endswith(".npy"))
+		self.npy = npy
+		super(BinaryOut,self).__init__(stream,sampleFormat=sampleFormat,channels=channels,
+		                               chunkFrames=chunkFrames,threaded=threaded,name=name)
+
+	def _open(self):
+		super(BinaryOut,self)._open()
+		if (self.stream == None) or (not self.npy): return
+		try:
+			self.stream.seek(0,1)
+		except (IOError,AttributeError):
+			msg = "can't write a .npy file to an unseekable stream (for %s)" % self
+			raise UGenError(msg)
+		self.stream.write(self.npy_header())
+
+	def npy_header(self):
+		numFrames = self.bytes // (self.sampleWidth*self.outChannels)
+		if (self.outChannels == 1): shape = (numFrames,)
+		else:                       shape = (numFrames,self.outChannels)
+		header = "{'descr': '%s', 'fortran_order': False, 'shape': %r, }" \
+		       % (npyTypes[self.sampleFormat],shape)
+		# (the header is padded to a fixed size, so it can be rewritten in
+		# place as the shape grows)
+		header = header.ljust(npyHeaderBytes-11) + "\n"
+		return npyMagic + struct_pack("<H",len(header)) + header
+
+	def _write(self,data):
+		# (when threaded, this runs in the writer thread)
+		super(BinaryOut,self)._write(data)
+		if (self.npy):
+			stream = self.stream
+			stream.seek(0)
+			stream.write(self.npy_header())
+			stream.seek(0,2)
+
+
+npyMagic       = "\x93NUMPY\x01\x00"
+npyHeaderBytes = 128
+npyTypes       = {"float32":"<f4", "float64":"<f8"}
+
+
+#-- asynchronous writing --
+
+class AsyncWriter(object):
+	"""A background thread that does a sink's writing.
+
+	The sink hands finished chunks to put(), and the thread passes each one,
+	in order, to write(chunk).  At most maxChunks chunks wait in the queue;
+	when it is full, put() waits for the thread to catch up, which is counted
+	in blocked and blockedTime.  underruns counts the times the thread found
+	the queue empty, waiting on the render.  Python releases the GIL during
+	the thread's file system calls, so a slow disk (e.g. network-mounted
+	scratch space) no longer stalls the render loop.
+
+	flush() waits until every chunk put so far has been written, and close()
+	does the same and then stops the thread.  If write() raises an exception,
+	later chunks are discarded, and the exception is reported (as a
+	UGenError) by the next put(), flush() or close();  since a sink calls
+	put() from its tick(), the error stops the shreduler's run.
+	"""
+
+	def __init__(self,owner,write,maxChunks=8):
+		# (threading is imported here rather than at the top, so that programs
+		# that never write from a thread don't pay for importing it)
+		from threading import Thread
+		from Queue     import Queue
+		self.owner       = owner
+		self.write       = write
+		self.chunks      = 0
+		self.blocked     = 0
+		self.blockedTime = 0.0
+		self.underruns   = 0
+		self.failed      = False
+		self.error       = None
+		self._queue      = Queue(maxChunks)
+		self._thread     = Thread(target=self._run,name="%s writer" % owner)
+		self._thread.daemon = True
+		self._thread.start()
+
+	def put(self,chunk):
+		if (self.error != None): self.raise_error()
+		queue = self._queue
+		if (queue.full()):
+			startTime = time()
+			queue.put(chunk)
+			self.blocked     += 1
+			self.blockedTime += time() - startTime
+		else:
+			queue.put(chunk)
+
+	def flush(self):
+		self._queue.join()
+		if (self.error != None): self.raise_error()
+
+	def close(self):
+		if (self._thread != None):
+			self._queue.put(None)
+			self._thread.join()
+			self._thread = None
+		if (self.error != None): self.raise_error()
+
+	def raise_error(self):
+		# (the error is reported once)
+		ex = self.error
+		self.error = None
+		msg = "%s failed writing its output (%s)" % (self.owner,ex)
+		raise UGenError(msg)
+
+	def _run(self):
+		from Queue import Empty
+		queue = self._queue
+		while (True):
+			try:
+				chunk = queue.get_nowait()
+			except Empty:
+				chunk = queue.get()
+				if (chunk != None) and (self.chunks > 0): self.underruns += 1
+			try:
+				if (chunk == None): break
+				if (not self.failed):
+					self.write(chunk)
+					self.chunks += 1
+			except Exception, ex:
+				self.failed = True
+				self.error  = ex
+			finally:
+				queue.task_done()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+from sys         import stderr
+from math        import sin,cos,pi
+from collections import deque
+from itertools   import imap
+from operator    import mul
+from ugen        import UGen,UGenError,PassThru
+from constant    import twoPi
+
+
+class RateGroup(UGen):
+	"""A subgraph that runs at its own sampling rate.
+
+	A rate group runs an inner graph of ugens at a multiple of the sampling
+	rate (up=N), or at a fraction of it (down=N).  A slow group suits control
+	networks such as LFOs, which then cost a fraction of what they would at
+	the full rate.  A fast group lets a nonlinear section (e.g. a waveshaper)
+	be oversampled without oversampling the whole render.
+
+	From outside, the group is a single ugen.  Its feeds are resampled to the
+	inner rate and appear as the output of group.input;  whatever the inner
+	graph feeds into group.output is resampled back to become the group's
+	output.  Only the group itself is in the shreduler's update order;  it
+	keeps an update order for its inner graph, built the same way, and
+	revised whenever connections change.
+
+	Ugens work out rate-dependent settings (oscillator periods, filter
+	coefficients, delay lengths) from UGen.samplingRate.  So ugens in the
+	inner graph should be created, and any such setting changed, within a
+	"with group:" block, which sets UGen.samplingRate to the group's rate.
+	group.sec and group.msec give time units at the group's rate (for e.g.
+	delay lengths).  Envelopes measure time by the shreduler's clock, so
+	their durations are given in zook.sec units as usual.
+
+	Resampling uses windowed-sinc filters, in polyphase form;  taps is the
+	number of filter taps per phase.  The filters delay the signal by about
+	taps/2 samples at the lower of the two rates.
+
+	Inner ugens should not be connected directly to ugens outside the group;
+	all traffic should pass through group.input and group.output.
+	"""
+
+	__slots__ = ("factor","up","samplingRate","sec","msec","input","output",
+	             "_count","_order","_orderChanges","_inResamplers",
+	             "_outResamplers","_savedRate")
+	defaultTaps = 8
+
+	def __init__(self,up=None,down=None,inChannels=1,outChannels=None,name=None,
+	             bias=0.0,gain=1.0,taps=None):
+		super(RateGroup,self).__init__(inChannels=inChannels,outChannels=outChannels,name=name,
+		                               bias=bias,gain=gain)
+		if ("constructors" in UGen.debug): print >>stderr, "RateGroup.__init__(%s)" % name
+
+		if ((up == None) == (down == None)):
+			msg = "%s needs either up or down (but not both)" % self
+			raise UGenError(msg)
+		factor = up if (up != None) else down
+		if (factor != int(factor)) or (factor < 1):
+			msg = "factor=%s is not valid for %s, it must be a positive integer" \
+			    % (factor,self)
+			raise UGenError(msg)
+		if (taps == None): taps = RateGroup.defaultTaps
+
+		self.factor = factor = int(factor)
+		self.up     = (up != None)
+		if (self.up): self.samplingRate = UGen.samplingRate * factor
+		else:         self.samplingRate = UGen.samplingRate / float(factor)
+		self.sec  = float(self.samplingRate)
+		self.msec = self.samplingRate / 1000.0
+
+		self._inResamplers  = []
+		self._outResamplers = []
+		if (self.up):
+			for _ in xrange(self.inChannels):  self._inResamplers  += [Upsampler  (factor,taps)]
+			for _ in xrange(self.outChannels): self._outResamplers += [Downsampler(factor,taps)]
+		else:
+			for _ in xrange(self.inChannels):  self._inResamplers  += [Downsampler(factor,taps)]
+			for _ in xrange(self.outChannels): self._outResamplers += [Upsampler  (factor,taps)]
+
+		self._savedRate = None
+		with self:
+			if (self.inChannels == 0): self.input = None
+			else:                      self.input = RateInput(channels=self.inChannels,
+			                                                  name="%s.input" % self.name)
+			self.output = PassThru(channels=self.outChannels,name="%s.output" % self.name)
+
+		self._count        = 0
+		self._order        = []
+		self._orderChanges = None
+
+	#-- inner sampling rate --
+
+	def __enter__(self):
+		self._enter_rate()
+		return self
+
+	def __exit__(self,excType,excValue,traceback):
+		self._leave_rate()
+		return False
+
+	def _enter_rate(self):
+		self._savedRate = (UGen.samplingRate,UGen.radiansPerSample,
+		                   UGen.maxFilterFreq,UGen.rateGroup)
+		UGen.samplingRate     = self.samplingRate
+		UGen.radiansPerSample = twoPi / self.samplingRate
+		UGen.maxFilterFreq    = 0.450 * self.samplingRate
+		UGen.rateGroup        = self
+
+	def _leave_rate(self):
+		(UGen.samplingRate,UGen.radiansPerSample,
+		 UGen.maxFilterFreq,UGen.rateGroup) = self._savedRate
+
+	#-- inner pipeline --
+
+	def inner_order(self):
+		shreduler = UGen.shreduler
+		if (self._orderChanges != shreduler.pipelineChanges):
+			self._order        = shreduler.find_update_order([self.output])
+			self._orderChanges = shreduler.pipelineChanges
+			if ("pipeline" in UGen.debug):
+				print >>stderr, "%s update order: [%s]" \
+				              % (self,",".join([str(node) for node in self._order]))
+		return self._order
+
+	def _refresh(self):
+		# (a loaded group rebuilds its inner order on its first tick)
+		self._orderChanges = None
+
+	#-- tick handling --
+
+	def tick(self,sample=None,sample2=None):
+		# nota bene: inner ugens see the group's rate only while they tick
+		#            .. (in particular while driven controls update)
+		inResamplers  = self._inResamplers
+		outResamplers = self._outResamplers
+		if (self.inChannels >= 1): inResamplers[0].push(sample)
+		if (self.inChannels == 2): inResamplers[1].push(sample2)
+
+		if (self.up):
+			# run the inner graph factor times for each of our samples
+			order  = self.inner_order()
+			input  = self.input
+			output = self.output
+			self._enter_rate()
+			for _ in xrange(self.factor):
+				if (input != None):
+					input.value = inResamplers[0].next()
+					if (self.inChannels == 2): input.value2 = inResamplers[1].next()
+				for node in order: node.percolate()
+				outResamplers[0].push(output.last)
+				if (self.outChannels == 2): outResamplers[1].push(output.last2)
+			self._leave_rate()
+			if (self.outChannels == 2): self._tick2 = outResamplers[1].value()
+			return outResamplers[0].value()
+
+		# run the inner graph once for every factor of our samples
+		if (self._count == 0):
+			order  = self.inner_order()
+			input  = self.input
+			output = self.output
+			if (input != None):
+				input.value = inResamplers[0].value()
+				if (self.inChannels == 2): input.value2 = inResamplers[1].value()
+			self._enter_rate()
+			for node in order: node.percolate()
+			self._leave_rate()
+			outResamplers[0].push(output.last)
+			if (self.outChannels == 2): outResamplers[1].push(output.last2)
+		self._count += 1
+		if (self._count == self.factor): self._count = 0
+		if (self.outChannels == 2): self._tick2 = outResamplers[1].next()
+		return outResamplers[0].next()
+
+
+class RateInput(UGen):
+	"""The source of a RateGroup's inner graph.
+
+	The group sets value (and value2, for stereo) to its resampled input
+	before each inner tick.
+	"""
+
+	__slots__ = ("value","value2")
+
+	def __init__(self,channels=1,name=None):
+		super(RateInput,self).__init__(inChannels=0,outChannels=channels,name=name,
+		                               bias=0.0,gain=1.0)
+		if ("constructors" in UGen.debug): print >>stderr, "RateInput.__init__(%s)" % name
+		self.value = self.value2 = 0.0
+
+	def tick(self):
+		self._tick2 = self.value2
+		return self.value
+
+
+#-- resampling filters --
+#
+# Both resamplers use the same lowpass kernel, a windowed sinc whose length
+# is factor*taps and whose cutoff is a little below the nyquist rate of the
+# lower rate.  The upsampler is in polyphase form, each output sample using
+# only the taps that line up with input samples (every factor'th tap).  The
+# downsampler computes only the output samples it keeps.
+
+class Upsampler(object):
+	"""Raise a signal's rate by an integer factor.
+
+	push() takes one sample at the low rate;  each of the following factor
+	calls to next() returns one sample at the high rate.
+	"""
+
+	__slots__ = ("factor","_phases","_history","_phase")
+
+	def __init__(self,factor,taps):
+		kernel = lowpass_kernel(factor,taps)
+		self.factor   = factor
+		self._phases  = [[factor*kernel[tap*factor+phase] for tap in xrange(taps)]
+		                 for phase in xrange(factor)]
+		self._history = deque([0.0]*taps,taps)   # (newest sample first)
+		self._phase   = 0
+
+	def push(self,sample):
+		self._history.appendleft(sample)
+		self._phase = 0
+
+	def next(self):
+		phase = self._phases[self._phase]
+		if (self._phase < self.factor-1): self._phase += 1
+		return sum(imap(mul,phase,self._history))
+
+
+class Downsampler(object):
+	"""Lower a signal's rate by an integer factor.
+
+	push() takes one sample at the high rate;  value() returns the low rate
+	sample as of the most recent push.
+	"""
+
+	__slots__ = ("factor","_kernel","_history")
+
+	def __init__(self,factor,taps):
+		self.factor   = factor
+		self._kernel  = lowpass_kernel(factor,taps)
+		self._history = deque([0.0]*len(self._kernel),len(self._kernel))
+
+	def push(self,sample):
+		self._history.appendleft(sample)
+
+	def value(self):
+		return sum(imap(mul,self._kernel,self._history))
+
+
+def lowpass_kernel(factor,taps,cutoff=0.9):
+	# windowed (Blackman) sinc, normalized for unity gain at DC;  cutoff is
+	# relative to the nyquist rate of the lower rate
+	length = factor * taps
+	if (length == 1): return [1.0]
+	center = (length-1) / 2.0
+	fc     = cutoff / factor
+	kernel = []
+	for ix in xrange(length):
+		x = (ix - center) * fc
+		if (x == 0): sinc = 1.0
+		else:        sinc = sin(pi*x) / (pi*x)
+		w = ix / float(length-1)
+		window = 0.42 - 0.5*cos(twoPi*w) + 0.08*cos(2*twoPi*w)
+		kernel += [sinc * window]
+	total = sum(kernel)
+	return [k/total for k in kernel]
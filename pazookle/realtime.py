@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+
+import os
+import socket
+from sys         import stderr
+from time        import time
+from select      import select
+from collections import deque
+from types       import GeneratorType
+from ugen        import UGen
+
+
+class RealtimeError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+class RealtimeDriver(object):
+	"""Run a shreduler against the wall clock, for live control and streaming.
+
+	Rather than rendering as fast as possible, the driver renders in blocks
+	of blockFrames samples, keeping the render about lookAhead seconds ahead
+	of the wall clock.  The output (e.g. a RawOut writing to stdout, piped to
+	a player) is flushed after every block.  Sample time and shreds work just
+	as usual;  shreds still yield sample-time durations.
+
+	External events come in as messages.  post(handler,*args), which may be
+	called from any thread, queues a message;  listen(address,handler)
+	receives datagrams on a local udp socket, and passes each one to
+	handler(data).  Handlers are called between blocks, in the driver's
+	thread, so they may change the graph freely.  A handler that is a
+	generator function starts a new shred, at the current sample time;  a
+	handler can also fire an Event that shreds are waiting for.  So shreds
+	can react to control messages without polling for them.  Since the
+	blocks already rendered can't change, a message takes effect lookAhead
+	(or so) after it arrives;  stats() reports that latency, along with
+	underruns (blocks that weren't ready by the time they were due to play).
+
+	run(duration) loops until duration seconds of audio have been rendered
+	(forever, if duration is None) or until stop() is called.  Or, to embed
+	the driver in another event loop, call poll() whenever any of fds() is
+	readable or the time poll() last returned has passed.
+	"""
+
+	def __init__(self,shreduler=None,lookAhead=0.1,blockFrames=256):
+		if (shreduler == None): shreduler = UGen.shreduler
+		if (shreduler == None):
+			msg = "can't run in real time without a shreduler"
+			raise RealtimeError(msg)
+		if (lookAhead <= 0) or (blockFrames < 1):
+			msg = "lookAhead=%s, blockFrames=%s is not valid for a realtime driver" \
+			    % (lookAhead,blockFrames)
+			raise RealtimeError(msg)
+		self.shreduler   = shreduler
+		self.lookAhead   = lookAhead
+		self.blockFrames = int(blockFrames)
+		self.blocks      = 0
+		self.underruns   = 0
+		self.messages    = 0
+		self.latency     = 0.0    # (total, over all messages)
+		self.maxLatency  = 0.0
+		self.minLead     = None   # (least time a block was ready before it played)
+		self._mailbox    = deque()
+		self._sockets    = {}     # maps file descriptor to (socket,handler)
+		self._stopping   = False
+		self._startTime  = None   # (the wall time at which sample 0 plays)
+		self._filled     = False  # (true once the look-ahead has been reached)
+		self._endClock   = None
+		(self._wakeRead,self._wakeWrite) = os.pipe()
+
+	#-- messages --
+
+	def post(self,handler,*args):
+		# (safe to call from any thread;  deque.append is atomic, and the
+		# byte in the pipe wakes the driver)
+		self._mailbox.append((time(),handler,args))
+		os.write(self._wakeWrite,"m")
+
+	def listen(self,address,handler,maxBytes=4096):
+		# address is (host,port), as for socket.bind;  port 0 picks a free
+		# port, which the returned socket's getsockname() reports
+		sock = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+		sock.bind(address)
+		sock.setblocking(False)
+		self._sockets[sock.fileno()] = (sock,handler,maxBytes)
+		return sock
+
+	def stop(self):
+		self._stopping = True
+		os.write(self._wakeWrite,"s")
+
+	def fds(self):
+		return [self._wakeRead] + self._sockets.keys()
+
+	def deliver(self):
+		shreduler = self.shreduler
+		playAt = self._startTime + shreduler.clock() / float(shreduler.samplingRate)
+		while (len(self._mailbox) > 0):
+			(postTime,handler,args) = self._mailbox.popleft()
+			latency = max(0.0,playAt - postTime)
+			self.messages += 1
+			self.latency  += latency
+			self.maxLatency = max(self.maxLatency,latency)
+			if ("realtime" in UGen.debug):
+				print >>stderr, "message for %s at clock %d (latency %.3f)" \
+				              % (getattr(handler,"__name__",handler),shreduler.clock(),latency)
+			result = handler(*args)
+			if (isinstance(result,GeneratorType)):
+				shreduler.spork(result)
+
+	def receive(self,readable):
+		for fd in readable:
+			if (fd == self._wakeRead):
+				os.read(self._wakeRead,4096)
+				continue
+			(sock,handler,maxBytes) = self._sockets[fd]
+			while (True):
+				try:
+					data = sock.recv(maxBytes)
+				except socket.error:
+					break
+				self._mailbox.append((time(),handler,(data,)))
+
+	#-- running --
+
+	def start(self,duration=None):
+		shreduler = self.shreduler
+		rate = float(shreduler.samplingRate)
+		self._startTime = time() - shreduler.clock() / rate
+		self._stopping  = False
+		self._filled    = False
+		if (duration == None): self._endClock = None
+		else:                  self._endClock = shreduler.clock() + int(round(duration*rate))
+
+	def poll(self,readable=()):
+		# deliver messages and render whatever blocks are due;  returns the
+		# number of seconds until poll() should be called again, or None when
+		# the run is over
+		if (self._startTime == None): self.start()
+		self.receive(readable)
+		shreduler = self.shreduler
+		rate      = float(shreduler.samplingRate)
+		while (True):
+			if (self._stopping): return None
+			clock = shreduler.clock()
+			if (self._endClock != None) and (clock >= self._endClock): return None
+			lead = (self._startTime + clock/rate) - time()
+			if (lead > self.lookAhead):
+				self._filled = True
+				return lead - self.lookAhead
+			self.render_block(lead)
+
+	def render_block(self,lead):
+		shreduler = self.shreduler
+		# (while the look-ahead is first filling, blocks are rendered as fast
+		# as possible, and don't count as underruns)
+		if (self._filled):
+			if (lead < 0): self.underruns += 1
+			if (self.minLead == None) or (lead < self.minLead): self.minLead = lead
+		self.deliver()
+		target = shreduler.clock() + self.blockFrames
+		if (self._endClock != None): target = min(target,self._endClock)
+		shreduler.run_until(target)
+		shreduler.flush_outputs()
+		self.blocks += 1
+		if ("realtime" in UGen.debug):
+			print >>stderr, "block %d to clock %d (lead %.3f)" % (self.blocks,target,lead)
+
+	def run(self,duration=None):
+		self.start(duration)
+		readable = []
+		while (True):
+			timeout = self.poll(readable)
+			if (timeout == None): break
+			(readable,_,_) = select(self.fds(),[],[],timeout)
+		self._startTime = None
+
+	def close(self):
+		for (sock,_,_) in self._sockets.values(): sock.close()
+		self._sockets = {}
+		if (self._wakeRead != None):
+			os.close(self._wakeRead)
+			os.close(self._wakeWrite)
+			self._wakeRead = self._wakeWrite = None
+
+	def stats(self):
+		meanLatency = 0.0
+		if (self.messages > 0): meanLatency = self.latency / self.messages
+		return {"blocks":      self.blocks,
+		        "underruns":   self.underruns,
+		        "messages":    self.messages,
+		        "meanLatency": meanLatency,
+		        "maxLatency":  self.maxLatency,
+		        "minLead":     self.minLead}
@@ -0,0 +1,303 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+import sys
+from sys         import stderr
+from types       import NoneType
+from array       import array
+from collections import deque
+from random      import Random
+from base64      import b64encode,b64decode
+from json        import dumps as json_dumps,loads as json_loads
+from marshal     import dumps as marshal_dumps,loads as marshal_loads
+from ugen        import UGen,attribute_names,transient_names
+
+
+class SerializeError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+#-- saved graphs --
+#
+# Save and load graphs of ugens.
+#
+# dumps(roots) describes every ugen reachable from roots (by default, the
+# shreduler's sinks) as a JSON string, and loads(s) builds a copy of that graph.
+# Each ugen is saved with its class and the values of all its attributes, so the
+# graph's connections (feeds with their channel routing, driven controls, a
+# UGraph's inlet and outlet) are saved as they are, rather than as the
+# sequence of >> operations that made them.  Loading creates each ugen without
+# calling its constructor, sets its attributes directly, and tells the
+# shreduler about the new graph just once, so a patch of thousands of ugens
+# loads without thousands of pipeline changes.  The same string can be loaded
+# any number of times, e.g. once by each of several worker processes.
+#
+# Attribute values are saved as JSON, with values that JSON lacks (tuples,
+# dicts with non-string keys, arrays, deques, random number generators, helper
+# objects, references to other ugens) tagged as single-key objects.  With
+# binary=True the same structure is saved with marshal instead, which is
+# less portable but quicker to load.  Arrays of zeros (e.g. silent delay
+# lines) are saved as just their length.  Values
+# that can't be saved, such as lambdas and open files, must be named in the
+# class's _transient list and rebuilt by its _refresh() method, which is
+# called after the graph is loaded.  A subclass that sets transient attributes
+# of its own must override _refresh().
+#
+# Only the graph is saved, not any shreds.  A loaded WavOut starts its file
+# afresh.  Ugens get new ids when loaded (but keep their names), and the graph
+# has to be loaded at the sampling rate at which it was saved.
+
+formatName    = "pazookle graph"
+formatVersion = 1
+binaryMagic   = "PZKG"
+
+streams    = {"stdout":sys.stdout, "stderr":sys.stderr}
+plainTypes = (NoneType,bool,int,long,float,str)
+unsetValue = {"unset":None}   # (an attribute that has never been set)
+
+
+#-- saving --
+
+def dumps(roots=None,binary=False):
+	if (roots == None):
+		if (UGen.shreduler == None):
+			msg = "can't find the graph to save without a shreduler"
+			raise SerializeError(msg)
+		roots = UGen.shreduler.sinks
+	elif (isinstance(roots,UGen)):
+		roots = [roots]
+
+	sinks = []
+	if (UGen.shreduler != None): sinks = UGen.shreduler.sinks
+	index   = {}
+	nodes   = []
+	classes = {}    # maps class to (index,attribute names)
+
+	def visit(node):
+		if (node in index): return index[node]
+		ix = index[node] = len(nodes)
+		nodes.append(node)
+		return ix
+
+	# each class is recorded once, with the names of the attributes we save;
+	# each ugen is then recorded as its class index and a list of values in
+	# the same order
+
+	classRecords = []
+	records      = []
+	for node in roots: visit(node)
+	ix = 0
+	while (ix < len(nodes)):
+		# (nodes grows as encode() finds references to other ugens)
+		node = nodes[ix]
+		cls  = node.__class__
+		if (cls not in classes):
+			transient = transient_names(cls)
+			names = [name for name in attribute_names(node)
+			              if (name != "id") and (name not in transient)]
+			classes[cls] = (len(classRecords),names)
+			classRecords += [[cls.__module__,cls.__name__,names]]
+		(classIx,names) = classes[cls]
+		values = []
+		for name in names:
+			try:
+				values += [encode(getattr(node,name,unsetValue),visit)]
+			except SerializeError, ex:
+				msg = "can't save %s.%s (%s)" % (node,name,ex)
+				raise SerializeError(msg)
+		records += [[classIx,(node in sinks),values]]
+		ix += 1
+
+	graph = {"format":       formatName,
+	         "version":      formatVersion,
+	         "samplingRate": UGen.samplingRate,
+	         "roots":        [index[node] for node in roots],
+	         "classes":      classRecords,
+	         "nodes":        records}
+	if (binary): return binaryMagic + marshal_dumps(graph,2)
+	else:        return json_dumps(graph,separators=(",",":"))
+
+
+def dump(roots,f,binary=False):
+	f.write(dumps(roots,binary))
+
+
+def encode(value,visit):
+	if (type(value) in (NoneType,bool,int,long,float,str,unicode)):
+		return value
+	if (value is unsetValue):
+		return value
+	if (type(value) == list):
+		return [encode(v,visit) for v in value]
+	if (type(value) == tuple):
+		return {"tuple":[encode(v,visit) for v in value]}
+	if (type(value) == dict):
+		return {"dict":[[encode(k,visit),encode(v,visit)] for (k,v) in value.items()]}
+	if (isinstance(value,UGen)):
+		return {"ugen":visit(value)}
+	if (isinstance(value,array)):
+		# (delay lines are often silent, so all-zero arrays are saved by length)
+		if (value.count(0) == len(value)): return {"zeros":[value.typecode,len(value)]}
+		return {"array":[value.typecode,sys.byteorder,b64encode(value.tostring())]}
+	if (isinstance(value,deque)):
+		return {"deque":[[encode(v,visit) for v in value],value.maxlen]}
+	if (isinstance(value,Random)):
+		return {"random":encode(value.getstate(),visit)}
+	for (name,stream) in streams.items():
+		if (value is stream): return {"stream":name}
+	if (hasattr(value,"func_code")):
+		module = sys.modules.get(value.__module__)
+		if (getattr(module,value.__name__,None) is value):
+			return {"function":[value.__module__,value.__name__]}
+		raise SerializeError("%s is not a module-level function" % value.__name__)
+	if (hasattr(value,"__slots__")) and (not hasattr(value,"__dict__")):
+		# (helper objects such as a RateGroup's resamplers)
+		cls = value.__class__
+		fields = {}
+		for name in attribute_names(value):
+			if (hasattr(value,name)): fields[name] = encode(getattr(value,name),visit)
+		return {"object":[cls.__module__,cls.__name__,fields]}
+	raise SerializeError("%s values can't be saved" % value.__class__.__name__)
+
+
+#-- loading --
+
+def loads(s):
+	if (s.startswith(binaryMagic)): graph = marshal_loads(s[len(binaryMagic):])
+	else:                           graph = json_loads(s)
+	if (graph.get("format") != formatName) or (graph.get("version") != formatVersion):
+		msg = "not a saved graph (or not a version we can load)"
+		raise SerializeError(msg)
+	if (graph["samplingRate"] != UGen.samplingRate):
+		msg = "graph was saved at sampling rate %s, but we're running at %s" \
+		    % (graph["samplingRate"],UGen.samplingRate)
+		raise SerializeError(msg)
+
+	# create all the ugens first, so that references between them can be
+	# resolved as their attributes are set
+
+	classes = []
+	for (module,className,names) in graph["classes"]:
+		classes += [(find_class(module,className),map(str,names))]
+
+	records = graph["nodes"]
+	nodes   = []
+	for (classIx,_,_) in records:
+		cls  = classes[classIx][0]
+		node = cls.__new__(cls)
+		UGen.lastId += 1
+		node.id = UGen.lastId
+		UGen.instances[node.id] = node
+		nodes += [node]
+
+	for (node,(classIx,_,values)) in zip(nodes,records):
+		for (name,value) in zip(classes[classIx][1],values):
+			if (type(value) in plainTypes): setattr(node,name,value)
+			elif (value == unsetValue):     pass
+			else:                           setattr(node,name,decode(value,nodes))
+
+	for node in nodes:
+		node._refresh()
+		for name in transient_names(node.__class__):
+			if (not hasattr(node,name)):
+				msg = "%s didn't restore %s after loading" % (node,name)
+				raise SerializeError(msg)
+		if ("constructors" in UGen.debug): print >>stderr, "loaded %s" % node
+
+	UGen.pipeline_change()
+	for (node,(_,isSink,_)) in zip(nodes,records):
+		if (isSink): UGen.add_sink(node)
+	return [nodes[ix] for ix in graph["roots"]]
+
+
+def load(f):
+	return loads(f.read())
+
+
+def find_class(module,className):
+	try:
+		__import__(module)
+		return getattr(sys.modules[module],className)
+	except (ImportError,AttributeError):
+		msg = "can't find class %s.%s" % (module,className)
+		raise SerializeError(msg)
+
+
+def decode(value,nodes):
+	if (type(value) == unicode):
+		try:               return str(value)
+		except ValueError: return value
+	if (type(value) == list):
+		# (a freshly loaded list of plain values can be used as it is)
+		for v in value:
+			if (type(v) not in plainTypes): return [decode(v,nodes) for v in value]
+		return value
+	if (type(value) != dict):
+		return value
+
+	(tag,content) = value.items()[0]
+	if (tag == "ugen"):
+		return nodes[content]
+	if (tag == "tuple"):
+		return tuple([decode(v,nodes) for v in content])
+	if (tag == "dict"):
+		return dict([(decode(k,nodes),decode(v,nodes)) for (k,v) in content])
+	if (tag == "array"):
+		(typecode,byteorder,data) = content
+		a = array(str(typecode))
+		a.fromstring(b64decode(data))
+		if (byteorder != sys.byteorder): a.byteswap()
+		return a
+	if (tag == "zeros"):
+		(typecode,length) = content
+		return array(str(typecode),[0]) * length
+	if (tag == "deque"):
+		(items,maxlen) = content
+		return deque([decode(v,nodes) for v in items],maxlen)
+	if (tag == "random"):
+		prng = Random()
+		prng.setstate(decode(content,nodes))
+		return prng
+	if (tag == "stream"):
+		return streams[content]
+	if (tag == "function"):
+		(module,name) = content
+		return getattr(find_module(module),name)
+	if (tag == "object"):
+		(module,className,fields) = content
+		cls = find_class(module,className)
+		obj = cls.__new__(cls)
+		for (name,v) in fields.items(): setattr(obj,str(name),decode(v,nodes))
+		return obj
+	raise SerializeError("unknown tag \"%s\" in saved graph" % tag)
+
+
+def find_module(module):
+	try:
+		__import__(module)
+		return sys.modules[module]
+	except ImportError:
+		msg = "can't find module %s" % module
+		raise SerializeError(msg)
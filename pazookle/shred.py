@@ -23,10 +23,16 @@ __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
 import os.path
-from sys    import stderr
-from types  import GeneratorType
-from ugen   import UGen
-from output import TextOut
+from sys         import stderr
+from math        import floor
+from array       import array
+from bisect      import bisect_left
+from collections import deque
+from heapq       import heappush,heappop
+from types       import GeneratorType
+from ugen        import UGen
+from output      import TextOut
+from util        import install_variant
 
 
 class ShredulerError(Exception):
@@ -46,13 +52,17 @@ class Shreduler(object):
 	                      .. ideally is such that floor(now) == clock;  when
 	                      .. floor(now) > clock we generate one sample and
 	                      .. increment clock
+
+	A shred yields a duration, an absolute time as ("absolute",time), or
+	events to wait for.  The latter is an Event, or a list or tuple of Events
+	with at most one time (a duration or ("absolute",time)) as a timeout.
+	The shred waits until the first of them fires, and the yield expression
+	gives the Event that fired (None if the timeout expired first), e.g.
+		fired = yield [done,cancel,2*zook.sec]
+	A waiting shred isn't in the queue, so it costs nothing until one of its
+	events fires.  finished(shredId) is an Event that fires when a shred
+	completes, so a shred can wait for the shreds it has sporked.
 	"""
-	# $$$ modify shred protocol so that a shred can return a list or tuple
-	#     .. containing no more than one time;  the other entries will all be
-	#     .. event or message objects;  the idea is that the shred will wait
-	#     .. for the earliest event yielded (or the time if it expires first);
-	#     .. the probem though is that we have no way to communicate to the
-	#     .. shred *which* event has triggered
 
 	id = 0
 	debug = {}
@@ -61,6 +71,7 @@ class Shreduler(object):
 	def set_debug(debugNames):
 		if (type(debugNames) not in (list,tuple)): debugNames = [debugNames]
 		for debugName in debugNames: Shreduler.debug[debugName] = True
+		Shreduler.choose_tracing()
 
 	@staticmethod
 	def unset_debug(debugNames):
@@ -68,20 +79,78 @@ class Shreduler(object):
 		for debugName in debugNames:
 			try: del Shreduler.debug[debugName]
 			except KeyError: pass
+		Shreduler.choose_tracing()
+
+	@staticmethod
+	def choose_tracing():
+		# the per-sample pipeline loop has a debug-free variant and a traced
+		# one;  we install the latter only when it has something to report
+		traced = ("pipeline" in Shreduler.debug) or ("progress" in Shreduler.debug)
+		install_variant(Shreduler,"run_sample_pipe",traced)
 
 	#-- construction --
 
-	def __init__(self,sinks=None,samplingRate=44100):
+	def __init__(self,sinks=None,samplingRate=44100,draft=None):
 		if (sinks == None): self.sinks = []
 		else:               self.sinks = sinks
+		self.fullRate     = samplingRate
+		self.draft        = 1
 		self.samplingRate = samplingRate
 		self.set_times()
-		self._shreds = []
-		self._lastYield      = {}    # maps shred id to (time,duration) of last yield
+		self._shreds    = []     # heap of pending shreds, see insert_shred()
+		self._shredSeq  = 0
+		self._live      = {}     # maps shred id to the seq of its valid entry
+		self._finished  = {}     # maps shred id to its finished() event
+		self._lastYield      = {}    # maps shred id to (time,duration) of last yield,
+		                             # .. or (time,event) for a fired event
 		self._updateOrder    = None
 		self._pipelineChange = False
-		self._clock = 0
-		self._now   = 0.0
+		self._touched        = []    # ugens changed since the order was made
+		self._touchedIds     = {}
+		self.pipelineChanges = 0     # counts changes, for ugens that keep
+		                             # .. their own update orders (RateGroup)
+		self._clock   = 0
+		self._now     = 0.0
+		self._horizon = None    # last sample before the next shred can run
+		self.dryRun   = None    # during a dry run, the recorder (see RenderCache)
+		self.activations    = 0     # number of shred activations so far
+		self.checkpointer   = None  # (see Checkpointer)
+		self.nextCheckpoint = None  # clock at which to take a checkpoint
+		self.pendingOutputs = []    # outputs holding text, see TextOut
+		if (draft != None): self.set_draft(draft)
+
+	#-- sampling rate --
+
+	def set_sampling_rate(self,samplingRate):
+		self.fullRate = samplingRate
+		self.draft    = 1
+		self._set_sampling_rate(samplingRate)
+
+	def set_draft(self,draft):
+		# render at a fraction of the full sampling rate, for fast previews;
+		# e.g. draft=4 renders at a quarter of the full rate, and draft=1
+		# restores the full rate
+		try:
+			draft = float(draft)
+			if (draft < 1): raise ValueError
+		except ValueError:
+			msg = "draft=%s is not valid, it must be a number at least 1" % draft
+			raise ShredulerError(msg)
+		self.draft = draft
+		self._set_sampling_rate(int(round(self.fullRate / draft)))
+
+	def _set_sampling_rate(self,samplingRate):
+		# ugens read the sampling rate when they are constructed, and shreds
+		# read the time units (self.sec, etc.) as they run, so the rate can
+		# only change before any samples have been generated;  the graph
+		# should also be built after the change
+		if (self._clock != 0):
+			msg = "sampling rate can't change after %d samples have been generated" \
+			    % self._clock
+			raise ShredulerError(msg)
+		self.samplingRate = samplingRate
+		self.set_times()
+		if (UGen.shreduler == self): UGen.set_sampling_rate(samplingRate)
 
 	def set_times(self):
 		self.msec = self.samplingRate / 1000.0
@@ -97,11 +166,22 @@ class Shreduler(object):
 	def now(self):
 		return self._now
 
+	def pending_shreds(self):
+		# (shreds that are queued or waiting for events)
+		return len(self._live)
+
+	def quiet_samples(self):
+		# number of samples, counting the one now being generated, that will
+		# be generated before any shred runs;  ugens can render this many
+		# samples in advance without missing any change a shred makes
+		if (self._horizon == None): return 1
+		return max(1,self._horizon - self._clock + 1)
+
 	#-- shred scheduling --
 
 	def spork(self,shredFunction,shredName=None):
 		# $$$ keep a dict that maps id to (name,function), to be used for
-		#     .. operations like kill_shred() and yield ("shred finished",shredId)
+		#     .. operations like kill_shred()
 		if (not isinstance(shredFunction,GeneratorType)):
 			if (shredName == None): shredName = "(unnamed)"
 			msg = "shred \"%s\" is invalid, it's not a python generator" % shredName
@@ -114,24 +194,75 @@ class Shreduler(object):
 		self.insert_shred(None,shredId,shredFunction,shredName)
 		return shredId
 
-	def run(self):
+	def run(self,activations=None):
+		# activations=N stops before the N+1st shred activation
 		while (self._shreds != []):
+			if (self.activations == activations): break
 			self.run_earliest_shred()
+		self.flush_outputs()
+
+	def run_until(self,clock):
+		# generate samples up to (and including) sample number clock, running
+		# any shreds that come due along the way;  unlike run(), this keeps
+		# generating samples when no shreds are waiting (see RealtimeDriver)
+		while (self._shreds != []):
+			(rank,when) = self._shreds[0][:2]
+			if (rank != 0) and (when > clock): break
+			self.run_earliest_shred()
+		self._horizon = clock
+		while (self._clock < clock):
+			self.run_sample_pipe()
+		self._horizon = None
+		if (self.pendingOutputs != []): self.write_pending_outputs()
+
+	def flush_outputs(self):
+		# outputs (e.g. WavOut) collect samples into chunks;  make sure the
+		# last of them are written when a run ends
+		self.pendingOutputs = []
+		for sink in self.sinks:
+			flush = getattr(sink,"flush",None)
+			if (flush != None): flush()
+
+	def write_pending_outputs(self):
+		# text outputs (e.g. the console) hold their lines until a shred is
+		# about to run, so that they stay in order with anything the shred
+		# prints
+		pending = self.pendingOutputs
+		self.pendingOutputs = []
+		for output in pending: output.write_pending()
 
 	def run_earliest_shred(self):
-		(when,shredId,shredFunction,shredName) = self._shreds.pop(0)
-		if (when != None):
+		(_,when,seq,shredId,shredFunction,shredName,wakeValue) = heappop(self._shreds)
+		if (self._live.get(shredId) != seq):
+			# a timeout whose shred has since been woken by an event (it
+			# doesn't count as an activation, nor does it advance time)
+			return
+		if (when == None):
+			pass
+		elif (self.dryRun != None):
+			# a dry run advances time without generating any samples
+			self._clock = max(self._clock,int(floor(when)))
+		else:
+			self._horizon = int(floor(when))
 			while (self._clock+1 <= when):
 				self.run_sample_pipe()
+				if (self._clock == self.nextCheckpoint):
+					self.checkpointer.checkpoint(self)
+			self._horizon = None
+			if (self.pendingOutputs != []): self.write_pending_outputs()
+		self.activations += 1
 
 		if ("shreds" in Shreduler.debug):
 			print >>stderr, "running %s" % shredName
 		try:
 			if (when == None): self._now = self._clock
 			else:              self._now = when
-			when = shredFunction.next()
+			if (wakeValue != None):
+				# (the event that woke the shred, and the value it fired with)
+				(wakeValue,wakeValue.value) = wakeValue
+			when = shredFunction.send(wakeValue)
 			if ("shreds" in Shreduler.debug):
-				if (type(when) == tuple):
+				if (type(when) in (tuple,list)):
 					print >>stderr, "%s yielded (%s)" % (shredName,",".join([str(x) for x in when]))
 				else:
 					print >>stderr, "%s yielded %s" % (shredName,when)
@@ -139,15 +270,24 @@ class Shreduler(object):
 			if ("shreds" in Shreduler.debug):
 				print >>stderr, "%s has completed" % shredName
 			del self._lastYield[shredId]
+			del self._live[shredId]
+			finished = self._finished.get(shredId)
+			if (finished != None): finished.broadcast()
+			if (self.dryRun != None): self.dryRun.activation(self)
 			return
 
-		if (type(when) != tuple):
+		if (isinstance(when,Event)):
+			self.wait_shred(shredId,shredFunction,shredName,[when])
+			if (self.dryRun != None): self.dryRun.activation(self)
+			return
+		elif (type(when) not in (tuple,list)):
 			if (when != None): when += self._now
-		elif (when[0] == "absolute") and (len(when) == 2):
+		elif (type(when) == tuple) and (len(when) == 2) and (when[0] == "absolute"):
 			(_,when) = when
 		else:
-			msg = "incomprehensible yield from shred \"%s\": (%s)" % (shredName,",".join([str(x) for x in when]))
-			raise ShredulerError(msg)
+			self.wait_shred(shredId,shredFunction,shredName,when)
+			if (self.dryRun != None): self.dryRun.activation(self)
+			return
 
 		if (when == None) or (when < self._now):
 			msg = "shred \"%s\" yielded %s <= %s" % (shredName,when,self._now)
@@ -163,49 +303,198 @@ class Shreduler(object):
 		else:                  duration = when - lastWhen
 		self._lastYield[shredId] = (when,duration)
 		self.insert_shred(when,shredId,shredFunction,shredName)
-
-	def insert_shred(self,when,shredId,shredFunction,shredName):
-		# $$$ replace this with a priority queue implementation
-		# insert new shred before any that are waiting for a later time
-		insertIx = len(self._shreds)
-		if (when == None):
-			for (ix,(oldWhen,_,_,_)) in enumerate(self._shreds):
-				if (oldWhen == None): continue
-				insertIx = ix
+		if (self.dryRun != None): self.dryRun.activation(self)
+
+	def wait_shred(self,shredId,shredFunction,shredName,waitFor):
+		# waitFor is a list or tuple of events and (optionally) one timeout;
+		# the shred is registered with each event, along with a token (the
+		# seq that is valid for it in self._live);  whichever of the events
+		# or the timeout comes first replaces the token, so the others find
+		# it stale and are ignored
+		events  = []
+		timeout = None
+		for item in waitFor:
+			if (isinstance(item,Event)):
+				events += [item]
+				continue
+			if (timeout != None):
+				timeout = "more than one time"
 				break
-		else:
-			for (ix,(oldWhen,_,_,_)) in enumerate(self._shreds):
-				if (oldWhen <= when): continue
-				insertIx = ix
+			if (type(item) == tuple) and (len(item) == 2) and (item[0] == "absolute"):
+				timeout = item[1]
+			elif (type(item) in (int,long,float)):
+				timeout = self._now + item
+			else:
+				timeout = "%s" % (item,)
 				break
-		self._shreds.insert(insertIx,(when,shredId,shredFunction,shredName))
+		if (events == []) or (type(timeout) == str):
+			msg = "incomprehensible yield from shred \"%s\": (%s)" % (shredName,",".join([str(x) for x in waitFor]))
+			raise ShredulerError(msg)
+		if (timeout != None) and (timeout < self._now):
+			msg = "shred \"%s\" yielded timeout %s <= %s" % (shredName,timeout,self._now)
+			raise ShredulerError(msg)
+
+		for event in events:
+			if (event.latched) and (event.fired):
+				# the shred is woken right away;  as with yielding a zero
+				# duration twice in a row, waiting again for the same fired
+				# event at the same time would never let time advance
+				# (though a join of several finished shreds, each a
+				# different event, is fine)
+				wakeTime = self.wake_time()
+				if (self._lastYield[shredId] == (wakeTime,event)):
+					msg = "shred \"%s\" waited for fired event %s twice in a row without advancing time (now=%s)" \
+					    % (shredName,event,wakeTime)
+					raise ShredulerError(msg)
+				self._lastYield[shredId] = (wakeTime,event)
+				self.insert_shred(wakeTime,shredId,shredFunction,shredName,
+				                  (event,event.value))
+				return
+		self._lastYield[shredId] = (None,None)
+		if (timeout != None):
+			self.insert_shred(timeout,shredId,shredFunction,shredName)
+		else:
+			self._shredSeq += 1
+			self._live[shredId] = self._shredSeq
+		token = self._live[shredId]
+		for event in events:
+			event.add_waiter((self,shredId,token,shredFunction,shredName))
+		if ("shreds" in Shreduler.debug):
+			print >>stderr, "%s is waiting for %s" % (shredName,",".join([str(x) for x in waitFor]))
+
+	def wake_shred(self,waiter,event,value):
+		# returns False if the waiter is stale (its shred has already been
+		# woken, or has timed out)
+		(_,shredId,token,shredFunction,shredName) = waiter
+		if (self._live.get(shredId) != token): return False
+		if ("shreds" in Shreduler.debug):
+			print >>stderr, "%s woken by %s" % (shredName,event)
+		self.insert_shred(self.wake_time(),shredId,shredFunction,shredName,(event,value))
+		return True
+
+	def wake_time(self):
+		# (between runs, e.g. when a RealtimeDriver delivers a message, the
+		# clock may be past the time of the last activation)
+		return max(self._now,self._clock)
+
+	def finished(self,shredId):
+		# an event that fires when the shred completes;  since it is latched,
+		# waiting for a shred that has already completed doesn't wait at all;
+		# each shred has only one such event, even after it has completed, so
+		# that waiting for it again can be recognized (see wait_shred)
+		event = self._finished.get(shredId)
+		if (event == None):
+			event = self._finished[shredId] = Event(latched=True,name="finished.%s" % shredId)
+			if (shredId not in self._live): event.fired = True
+		return event
+
+	def resume_at(self,clock,pipelineChanges):
+		# pick up where a checkpoint left off, after replaying the shreds up
+		# to it (see Checkpointer);  the update orders (ours and those of any
+		# rate groups) are rebuilt from scratch
+		self._clock          = clock
+		self.pipelineChanges = pipelineChanges + 1
+		self._updateOrder    = None
+		self._pipelineChange = False
+		self._touched        = []
+		self._touchedIds     = {}
+
+	def reset(self,sinks=None):
+		# forget all shreds and return to time zero;  ugens are left as they
+		# are, but only those connected to the new sinks will be run
+		if (sinks == None): self.sinks = []
+		else:               self.sinks = list(sinks)
+		self._shreds         = []
+		self._live           = {}
+		self._finished       = {}
+		self._lastYield      = {}
+		self._updateOrder    = None
+		self._pipelineChange = False
+		self._touched        = []
+		self._touchedIds     = {}
+		self.pipelineChanges += 1
+		self._clock   = 0
+		self._now     = 0.0
+		self._horizon = None
+		self.activations    = 0
+		self.pendingOutputs = []
+
+	def insert_shred(self,when,shredId,shredFunction,shredName,wakeValue=None):
+		# the queue is a heap, ordered by time;  shreds that have just been
+		# sporked (when=None) come ahead of all others, and shreds waiting
+		# for the same time run in the order they were inserted;  wakeValue
+		# is the event that woke the shred and the value it fired with;  an
+		# entry is valid only while its seq is the shred's entry in
+		# self._live, so a timeout is cancelled simply by replacing that
+		self._shredSeq += 1
+		if (when == None): rank = 0
+		else:              rank = 1
+		self._live[shredId] = self._shredSeq
+		heappush(self._shreds,(rank,when,self._shredSeq,shredId,shredFunction,shredName,wakeValue))
 
 	#-- pipline construction --
 
 	def add_sink(self,sink):
 		if (sink not in self.sinks):
 			self.sinks += [sink]
-			self.pipeline_change()
+			self.pipeline_change(sink)
 
 	def remove_sink(self,sink):
 		if (sink in self.sinks):
 			self.sinks.remove(sink)
-			self.pipeline_change()
+			self.pipeline_change(sink)
 
-	def pipeline_change(self):
+	def pipeline_change(self,node=None):
+		# node is the ugen whose dependencies have changed (or which has
+		# become or stopped being a sink);  node=None means we don't know
+		# what changed, and the update order will be rebuilt from scratch
 		self._pipelineChange = True
+		self.pipelineChanges += 1
+		if (self._touched == None): return
+		if (node == None):
+			self._touched    = None
+			self._touchedIds = None
+		elif (node.id not in self._touchedIds):
+			self._touchedIds[node.id] = True
+			self._touched += [node]
+
+	def bounce(self,node,numSamples):
+		# render node (and everything upstream of it) for numSamples samples,
+		# as though starting now, without advancing our own clock;  a second
+		# shreduler, with node as its only sink, generates the samples;
+		# returns the output as a pair of arrays (the second is None for a
+		# mono node)
+		bouncer = Shreduler(sinks=[node],samplingRate=self.samplingRate)
+		bouncer._clock = self._clock
+		bouncer._now   = self._now
+		buffer  = array("d", [0.0]*numSamples)
+		buffer2 = None
+		if (node.outChannels == 2): buffer2 = array("d", [0.0]*numSamples)
 
-	def find_update_order(self):
+		if ("pipeline" in Shreduler.debug):
+			print >>stderr, "bouncing %s for %d samples" % (node,numSamples)
+		UGen.set_shreduler(bouncer)
+		try:
+			for ix in xrange(numSamples):
+				bouncer.run_sample_pipe()
+				buffer[ix] = node.last
+				if (buffer2 != None): buffer2[ix] = node.last2
+		finally:
+			UGen.set_shreduler(self)
+		return (buffer,buffer2)
+
+	def find_update_order(self,sinks=None):
 		# the algorithm here is based on the depth-first search topological
 		# sorting algorithm at en.wikipedia.org/wiki/Topological_sorting
 		# the main modification is that when we encounter a cycle, we simply
-		# ignore that link rather than abort the process
-		assert (self.sinks != []), \
-		       "internal error: find_update_order caled with no sinks" \
-		     % numFuncs
+		# ignore that link rather than abort the process;  sinks=None means
+		# our own sinks (a RateGroup passes the sink of its inner graph)
+		if (sinks == None): sinks = self.sinks
+		assert (sinks != []), \
+		       "internal error: find_update_order caled with no sinks"
 		self._order = []
 		self._markedNodes = {}
-		for node in self.sinks:
+		for node in sinks:
 			if (node.id in self._markedNodes): continue
 			if (node.ignoreInputlessSink):
 				# if a sink has no input, and it's not generative, ignore it
@@ -223,9 +512,270 @@ class Shreduler(object):
 			self.visit(predecessor)
 		self._order += [node]
 
+	#-- incremental pipeline maintenance --
+	#
+	# Rather than rebuilding the update order after every change, we keep it
+	# up to date as connections come and go.  Along with the order itself
+	# (self._updateOrder) we keep a parallel list of integer keys, increasing
+	# but with gaps between them so that new nodes can be slipped in without
+	# renumbering, and the graph as last seen (each node's dependencies, and
+	# the reverse, its consumers).  Only nodes in the order are tracked.
+	#
+	# When a node's dependencies change, we compare them to those we recorded.
+	# A new dependency that isn't yet in the order brings its whole upstream
+	# subgraph with it, placed (in the same depth-first order as a rebuild)
+	# just before the node.  A new dependency that is already in the order
+	# but falls after the node violates the order;  we repair that by moving
+	# only the nodes between the two (the Pearce-Kelly algorithm).  If the new
+	# connection closes a cycle, we leave the order alone and the connection
+	# becomes a feedback connection, delayed by one tick, just as a rebuild
+	# would treat the link that closes a cycle.  Connections that were already
+	# feedback stay that way;  if a repair would change that we rebuild
+	# instead.  A lost dependency may leave a node with no path to a sink;
+	# such nodes (and everything upstream that is left stranded with them)
+	# are dropped from the order.
+
+	orderKeyGap     = 1024
+	rebuildFraction = 0.25   # rebuild if more than this fraction of nodes
+	                         # .. have changed (and more than a handful)
+
+	def rebuild_update_order(self):
+		order = self.find_update_order()
+		self._updateOrder = order
+		self._orderKeys   = range(0,len(order)*self.orderKeyGap,self.orderKeyGap)
+		self._orderKey    = {}
+		self._orderDeps   = {}
+		self._consumers   = {}
+		for (ix,node) in enumerate(order):
+			self._orderKey [node] = self._orderKeys[ix]
+			self._orderDeps[node] = self.node_dependencies(node)
+			self._consumers[node] = {}
+		for node in order:
+			for dep in self._orderDeps[node]:
+				self._consumers[dep][node] = True
+
+	def revise_update_order(self):
+		# returns False if the order has to be rebuilt from scratch
+		touched = self._touched
+		if (len(touched) > 8) \
+		   and (len(touched) > self.rebuildFraction * len(self._updateOrder)):
+			return False
+
+		self._strandChecks = []
+		for node in touched:
+			if (node in self._orderKey):
+				if (not self.revise_node(node)): return False
+				self._strandChecks += [node]
+			elif (self.is_anchor(node)):
+				if (not self.insert_subgraph(node,None)): return False
+
+		while (self._strandChecks != []):
+			node = self._strandChecks.pop()
+			if (node in self._orderKey): self.prune_if_stranded(node)
+		del self._strandChecks
+		return True
+
+	def node_dependencies(self,node):
+		# node's dependencies, without duplicates and without node itself
+		# (a ugen fed by itself gets its own previous value, no matter where
+		# it is in the order)
+		seen = {node:True}
+		dependencies = []
+		for dep in node.dependencies():
+			if (dep in seen): continue
+			seen[dep] = True
+			dependencies += [dep]
+		return dependencies
+
+	def is_anchor(self,node):
+		# true if node is a sink that is to be included in the pipeline
+		if (node not in self.sinks): return False
+		if (node.ignoreInputlessSink) and (node.dependencies() == []): return False
+		return True
+
+	def revise_node(self,node):
+		# nota bene: new dependencies are recorded one at a time, as they are
+		#            .. added to the order, so that the graph we've recorded
+		#            .. only ever refers to nodes that are in the order
+		newDeps = self.node_dependencies(node)
+		oldDeps = self._orderDeps[node]
+		newSet  = dict.fromkeys(newDeps,True)
+		oldSet  = dict.fromkeys(oldDeps,True)
+		self._orderDeps[node] = [dep for dep in oldDeps if (dep in newSet)]
+
+		for dep in oldDeps:
+			if (dep in newSet): continue
+			del self._consumers[dep][node]
+			self._strandChecks += [dep]
+		for dep in newDeps:
+			if (dep in oldSet): continue
+			if (dep not in self._orderKey):
+				if (not self.insert_subgraph(dep,node)): return False
+			self._orderDeps[node] += [dep]
+			if (not self.add_edge(dep,node)): return False
+		return True
+
+	def insert_subgraph(self,root,beforeNode):
+		# add root, and everything upstream of it that isn't already in the
+		# order, immediately before beforeNode (None means at the end)
+		newNodes = []
+		self.visit_new(root,{},newNodes)
+
+		numNew = len(newNodes)
+		gap    = self.orderKeyGap
+		keys   = self._orderKeys
+		if (beforeNode == None): insertIx = len(keys)
+		else:                    insertIx = bisect_left(keys,self._orderKey[beforeNode])
+		if (0 < insertIx < len(keys)) \
+		   and (keys[insertIx] - keys[insertIx-1] <= numNew):
+			self.renumber_keys()
+			keys = self._orderKeys
+
+		if (insertIx == len(keys)):
+			if (keys == []): loKey = -gap
+			else:            loKey = keys[-1]
+			hiKey = loKey + (numNew+1)*gap
+		elif (insertIx == 0):
+			hiKey = keys[0]
+			loKey = hiKey - (numNew+1)*gap
+		else:
+			(loKey,hiKey) = (keys[insertIx-1],keys[insertIx])
+		step = (hiKey - loKey) // (numNew+1)
+		newKeys = [loKey + step*(ix+1) for ix in xrange(numNew)]
+
+		keys[insertIx:insertIx] = newKeys
+		self._updateOrder[insertIx:insertIx] = newNodes
+		for (ix,node) in enumerate(newNodes):
+			self._orderKey [node] = newKeys[ix]
+			self._orderDeps[node] = self.node_dependencies(node)
+			self._consumers[node] = {}
+		for node in newNodes:
+			for dep in self._orderDeps[node]:
+				if (not self.add_edge(dep,node)): return False
+		return True
+
+	def visit_new(self,node,markedNodes,newNodes):
+		if (node in markedNodes): return
+		markedNodes[node] = True
+		for predecessor in node.dependencies():
+			if (predecessor in self._orderKey): continue
+			self.visit_new(predecessor,markedNodes,newNodes)
+		newNodes += [node]
+
+	def renumber_keys(self):
+		gap = self.orderKeyGap
+		self._orderKeys = keys = range(0,len(self._updateOrder)*gap,gap)
+		for (ix,node) in enumerate(self._updateOrder):
+			self._orderKey[node] = keys[ix]
+
+	def add_edge(self,upstream,downstream):
+		# record that downstream depends on upstream, and repair the order if
+		# needed;  returns False if the order has to be rebuilt from scratch
+		self._consumers[upstream][downstream] = True
+		if (self._orderKey[upstream] < self._orderKey[downstream]): return True
+		return self.reorder(upstream,downstream)
+
+	def reorder(self,upstream,downstream):
+		# upstream currently follows downstream in the order;  find the nodes
+		# between them that downstream leads to, and those that lead to
+		# upstream, and swap the two groups (Pearce-Kelly)
+		orderKey = self._orderKey
+		loKey = orderKey[downstream]
+		hiKey = orderKey[upstream]
+
+		forward = {downstream:True}
+		stack   = [downstream]
+		while (stack != []):
+			node = stack.pop()
+			nodeKey = orderKey[node]
+			for consumer in self._consumers[node]:
+				consumerKey = orderKey[consumer]
+				if (consumerKey <= nodeKey): continue   # (feedback)
+				if (consumer == upstream):
+					# the new connection closes a cycle, so it becomes a
+					# feedback connection and the order stays as it is
+					return True
+				if (consumerKey < hiKey) and (consumer not in forward):
+					forward[consumer] = True
+					stack += [consumer]
+
+		backward = {upstream:True}
+		stack    = [upstream]
+		while (stack != []):
+			node = stack.pop()
+			nodeKey = orderKey[node]
+			for dep in self._orderDeps[node]:
+				depKey = orderKey[dep]
+				if (depKey >= nodeKey): continue        # (feedback)
+				if (depKey > loKey) and (dep not in backward):
+					backward[dep] = True
+					stack += [dep]
+
+		byKey    = lambda node: orderKey[node]
+		moved    = sorted(backward,key=byKey) + sorted(forward,key=byKey)
+		freeKeys = sorted([orderKey[node] for node in moved])
+		oldKey   = dict([(node,orderKey[node]) for node in moved])
+		for (ix,node) in enumerate(moved):
+			orderKey[node] = freeKeys[ix]
+
+		# make sure no connection (other than the new one) has changed its
+		# direction;  in particular a feedback connection turned into an
+		# ordinary one would change what the graph sounds like
+		for node in moved:
+			for dep in self._orderDeps[node]:
+				if (dep == upstream) and (node == downstream): continue
+				wasForward = (oldKey.get(dep,orderKey[dep]) < oldKey[node])
+				if (wasForward != (orderKey[dep] < orderKey[node])): return False
+			for consumer in self._consumers[node]:
+				if (node == upstream) and (consumer == downstream): continue
+				wasForward = (oldKey[node] < oldKey.get(consumer,orderKey[consumer]))
+				if (wasForward != (orderKey[node] < orderKey[consumer])): return False
+
+		keys = self._orderKeys
+		for node in moved:
+			self._updateOrder[bisect_left(keys,orderKey[node])] = node
+		return True
+
+	def prune_if_stranded(self,node):
+		# if node no longer leads to any sink, remove it (along with anything
+		# downstream of it, which is stranded as well)
+		if (self.is_anchor(node)): return
+		reached = {node:True}
+		stack   = [node]
+		while (stack != []):
+			for consumer in self._consumers[stack.pop()]:
+				if (consumer in reached): continue
+				if (self.is_anchor(consumer)): return
+				reached[consumer] = True
+				stack += [consumer]
+
+		keys = self._orderKeys
+		for node in reached:
+			ix = bisect_left(keys,self._orderKey[node])
+			del keys[ix]
+			del self._updateOrder[ix]
+			del self._orderKey[node]
+		for node in reached:
+			for dep in self._orderDeps[node]:
+				if (dep not in self._orderKey): continue
+				del self._consumers[dep][node]
+				self._strandChecks += [dep]
+			del self._orderDeps[node]
+			del self._consumers[node]
+
 	#-- pipline percolation --
 
 	def run_sample_pipe(self):
+		self._clock += 1
+		if (self.sinks == []): return
+		if (self._pipelineChange) or (self._updateOrder == None):
+			self.update_pipeline()
+		for node in self._updateOrder:
+			node.percolate()
+
+	def _run_sample_pipe_traced(self):
+		# same as run_sample_pipe, but with debug reporting;  this is installed
+		# in place of run_sample_pipe when any of its debug settings is active
 		self._clock += 1
 		if ("pipeline" in Shreduler.debug):
 			print >>stderr, "\n=== generating sample #%s ===" % self._clock
@@ -236,24 +786,107 @@ class Shreduler(object):
 			if ("pipeline" in Shreduler.debug):
 				print >>stderr, "(pipeline has no sinks, so no percolation)"
 			return
+		if (self._pipelineChange) or (self._updateOrder == None):
+			self.update_pipeline()
+		for node in self._updateOrder:
+			node.percolate()
+
+	def update_pipeline(self):
 		if (self._pipelineChange):
-			self._updateOrder    = None
+			if (self._updateOrder != None) and (self._touched != None):
+				if (not self.revise_update_order()):
+					self._updateOrder = None
+				elif ("pipeline" in Shreduler.debug):
+					print >>stderr, "revised update order: [%s]" % ",".join([str(node) for node in self._updateOrder])
+			else:
+				self._updateOrder = None
 			self._pipelineChange = False
+			self._touched        = []
+			self._touchedIds     = {}
 		if (self._updateOrder == None):
-			self._updateOrder = self.find_update_order()
+			self.rebuild_update_order()
 			if ("pipeline" in Shreduler.debug):
 				print >>stderr, "update order: [%s]" % ",".join([str(node) for node in self._updateOrder])
 
-		for node in self._updateOrder:
-			node.percolate()
 
+Shreduler.choose_tracing()
 
-# initialization
 
-console  = TextOut(name="console", channels=1)
-console2 = TextOut(name="console2",channels=2)
+class Event(object):
+	"""Something shreds can wait for.
+
+	A shred waits for an event by yielding it (or a list of events, perhaps
+	with a timeout;  see Shreduler).  signal() wakes the shred that has been
+	waiting longest, and broadcast() wakes all of them;  each returns the
+	number of shreds woken.  The woken shreds run at the current time, and
+	get the event as the value of their yield.  Its value is then whatever
+	was passed to the signal() or broadcast() that woke them.
+
+	A latched event stays fired once it has been broadcast, so a shred that
+	waits for it later doesn't wait at all (e.g. Shreduler.finished()).
+	Events can be fired by shreds, or between runs (e.g. by a handler of a
+	RealtimeDriver).
+	"""
 
-zook = Shreduler(sinks=[console,console2],samplingRate=44100)
+	def __init__(self,latched=False,name=None):
+		if (name == None): name = "event"
+		self.name      = name
+		self.latched   = latched
+		self.fired     = False
+		self.value     = None
+		self._waiters  = deque()   # (shreduler,shredId,token,function,name)
+		self._compactAt = 16
+
+	def __str__(self):
+		return self.name
+
+	def waiting(self):
+		return len([waiter for waiter in self._waiters if (waiter[0]._live.get(waiter[1]) == waiter[2])])
+
+	def signal(self,value=None):
+		self.value = value
+		waiters = self._waiters
+		while (len(waiters) > 0):
+			waiter = waiters.popleft()
+			if (waiter[0].wake_shred(waiter,self,value)): return 1
+		return 0
+
+	def broadcast(self,value=None):
+		self.value = value
+		if (self.latched): self.fired = True
+		(waiters,self._waiters) = (self._waiters,deque())
+		woken = 0
+		for waiter in waiters:
+			if (waiter[0].wake_shred(waiter,self,value)): woken += 1
+		return woken
+
+	def add_waiter(self,waiter):
+		# shreds that timed out (or were woken by another event) leave stale
+		# entries behind, so now and then we clear them out
+		waiters = self._waiters
+		if (len(waiters) >= self._compactAt):
+			self._waiters = waiters = deque([w for w in waiters if (w[0]._live.get(w[1]) == w[2])])
+			self._compactAt = max(16,2*len(waiters))
+		waiters.append(waiter)
+
+
+# initialization
+#
+# The console sinks become sinks of the current shreduler only when something
+# is connected to them (see TextOut's lazySink), so zook starts with no sinks,
+# and a program that builds its own Shreduler (and passes it to
+# UGen.set_shreduler) gets the consoles there rather than in zook.  Importing
+# this module is kept cheap, since batch jobs may start thousands of short
+# render processes;  modules that aren't needed by every program (threading,
+# random) are imported where they are used.
+
+console  = TextOut(name="console", channels=1,lazySink=True)
+console2 = TextOut(name="console2",channels=2,lazySink=True)
+
+# setting PAZOOKLE_DRAFT in the environment renders any program at a draft
+# rate, e.g. PAZOOKLE_DRAFT=4 renders at a quarter of the full rate
+
+zook = Shreduler(samplingRate=44100,draft=os.environ.get("PAZOOKLE_DRAFT") or None)
 now  = zook.now
 UGen.set_shreduler(zook)
 
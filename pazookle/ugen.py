@@ -22,10 +22,14 @@ __version__   = "0.01"
 __author__    = "Bob Harris (zackobelsch@gmail.com)"
 __copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
 
-from sys      import stderr
-from math     import ceil,pi,sin,cos
-from util     import clip_value
-from constant import sqrt2,halfSqrt2,twoPi,quarterPi
+from sys         import stderr
+from math        import ceil,pi,sin,cos
+from array       import array
+from collections import deque
+from types       import NoneType
+from weakref     import WeakValueDictionary
+from util        import clip_value,install_variant
+from constant    import sqrt2,halfSqrt2,twoPi,quarterPi
 
 
 class UGenError(Exception):
@@ -79,7 +83,14 @@ class UGen(object):
 		stifle ids:    don't show id numbers in ugen names
 	"""
 
-	id                = 0
+	__slots__ = ("id","name","_feeds","_driven","_drives",
+	             "ignoreInputlessSink","inChannels","outChannels",
+	             "_defaultInSample","_feedsNeeded","_inFrame","_inFrame2",
+	             "_zeroFrame","_drivable","_bias","_biasLast","_gain",
+	             "_gainLast","_tick2","last","last2","__weakref__")
+
+	lastId            = 0      # (most recent instance id assigned)
+	instances         = WeakValueDictionary()  # maps id to instance
 	debug             = {}
 	shreduler         = None
 	samplingRate      = 0.0
@@ -93,15 +104,21 @@ class UGen(object):
 	defaultSustain    = 0.5
 	defaultRelease    = None
 	defaultFilterFreq = 1000.0
+	maxFilterFreq     = None   # (set from sampling rate)
 	defaultFilterQ    = 1.0
 	defaultFilterPole = 0.9
 	defaultFilterZero = -0.9
 	bufferChunks      = 1024
+	renderChunks      = 256    # (most samples a ugen should render at once)
+	tracedMethods     = []     # (class,methodName,debugNames), see trace_when()
+	rateGroup         = None   # (the RateGroup whose inner graph is ticking)
+	_transient        = ()     # attributes rebuilt by _refresh(), see serialize.py
 
 	@staticmethod
 	def set_debug(debugNames):
 		if (type(debugNames) not in (list,tuple)): debugNames = [debugNames]
 		for debugName in debugNames: UGen.debug[debugName] = True
+		UGen.choose_tracing()
 
 	@staticmethod
 	def unset_debug(debugNames):
@@ -109,6 +126,22 @@ class UGen(object):
 		for debugName in debugNames:
 			try: del UGen.debug[debugName]
 			except KeyError: pass
+		UGen.choose_tracing()
+
+	@staticmethod
+	def trace_when(cls,methodName,debugNames):
+		# methods that run for every sample are written without any debug
+		# checks;  the traced twin (see install_variant) takes their place
+		# only while one of debugNames is set
+		UGen.tracedMethods += [(cls,methodName,debugNames)]
+		traced = [name for name in debugNames if (name in UGen.debug)] != []
+		install_variant(cls,methodName,traced)
+
+	@staticmethod
+	def choose_tracing():
+		for (cls,methodName,debugNames) in UGen.tracedMethods:
+			traced = [name for name in debugNames if (name in UGen.debug)] != []
+			install_variant(cls,methodName,traced)
 
 	@staticmethod
 	def set_shreduler(shreduler):
@@ -126,10 +159,21 @@ class UGen(object):
 		UGen.defaultAttack    = 0.100 * samplingRate
 		UGen.defaultDecay     = 0.100 * samplingRate
 		UGen.defaultRelease   = 0.100 * samplingRate
+		UGen.maxFilterFreq    = 0.450 * samplingRate
+
+	@staticmethod
+	def pipeline_change(node=None):
+		# node is the ugen whose dependencies() have changed;  a subclass that
+		# overrides dependencies() must report changes to them here
+		if (UGen.shreduler != None): UGen.shreduler.pipeline_change(node)
 
 	@staticmethod
-	def pipeline_change():
-		if (UGen.shreduler != None): UGen.shreduler.pipeline_change()
+	def quiet_samples():
+		# inside a RateGroup the shreduler's horizon is in the wrong units,
+		# so we play it safe
+		if (UGen.shreduler == None): return 1
+		if (UGen.rateGroup != None): return 1
+		return UGen.shreduler.quiet_samples()
 
 	@staticmethod
 	def add_sink(sink):
@@ -143,8 +187,9 @@ class UGen(object):
 
 	def __init__(self,inChannels=1,outChannels=None,name=None,
 	             bias=None,gain=None):
-		UGen.id += 1
-		self.id = UGen.id
+		UGen.lastId += 1
+		self.id = UGen.lastId
+		UGen.instances[self.id] = self
 		if (name == None): name = "%s.%s" % (self.__class__.__name__,self.id)
 		self.name = name
 		if ("constructors" in UGen.debug): print >>stderr, "UGen.__init__(%s) id=%d" % (name,self.id)
@@ -179,7 +224,8 @@ class UGen(object):
 			else:                 outChannels = inChannels
 		self.outChannels = outChannels
 
-		self._feedsNeeded = 1
+		self._set_feeds_needed(1)
+		self._tick2 = 0.0
 
 		self._drivable = ["bias","gain"]
 		self._bias = self._biasLast = 0.0  # overwritten by self.bias = bias
@@ -216,6 +262,31 @@ class UGen(object):
 			s += ["drives[%s.%s]" % (upstream,controlName)]
 		return " ".join(s)
 
+	#-- serialization and cloning --
+
+	def _refresh(self):
+		# called after the ugen is loaded from a saved graph (see serialize.py)
+		# or cloned, to rebuild the attributes named in _transient
+		pass
+
+	@staticmethod
+	def clone_subgraph(nodes,shareInputs=True):
+		"""Duplicate a set of ugens, along with the connections among them.
+
+		The set is extended to include every ugen that a member owns (drivers
+		of its controls, and any ugen held in one of its attributes, such as
+		a UGraph's inlet and outlet).  Each ugen is copied without calling its
+		constructor, with its parameters and state as they are now.  Feeds,
+		drivers and other references within the set are remapped to the
+		copies.  Feeds from ugens outside the set are kept if shareInputs is
+		true (the copies listen to the same inputs) and dropped otherwise.
+
+		Returns a dict mapping each original ugen to its copy.  The copies
+		aren't connected to anything downstream, so they aren't in the
+		pipeline until they are connected (e.g. to a sink).
+		"""
+		return clone_subgraph(nodes,shareInputs)
+
 	#-- connection syntax --
 
 	def __rshift__(self,downstream):
@@ -320,7 +391,9 @@ class UGen(object):
 			driver = downstream._driven[controlName]
 			oldNumFeeds = len(driver._feeds)
 			driver._feeds = [feed for feed in driver._feeds if (feed[0] != upstream)]
-			if (len(driver._feeds) != oldNumFeeds): connectionsCut = True
+			if (len(driver._feeds) != oldNumFeeds):
+				connectionsCut = True
+				UGen.pipeline_change(driver)
 			if (driver._feeds == []):
 				downstream._undrive(controlName)
 
@@ -328,7 +401,7 @@ class UGen(object):
 			msg = "cannot disconnect %s from %s, there were no connections" % (self,downstream)
 			raise UGenError(msg)
 
- 		UGen.pipeline_change()
+ 		UGen.pipeline_change(downstream)
 		return downstream
 
 	#-- add and remove connections --
@@ -365,7 +438,7 @@ class UGen(object):
 					print >>stderr, "add_feed(%s from (%s,%s))" % (downstream,feed[0],feed[1])
 			downstream._feeds += [feed]
 
- 		UGen.pipeline_change()
+ 		UGen.pipeline_change(downstream)
  
 	def _drive(self,controlName):
 		# returns the driver for this control, creating it if not already driven
@@ -377,16 +450,16 @@ class UGen(object):
 		driver = PassThru(name=self.name+"~"+controlName,channels=1)
 		self._driven[controlName] = driver
 		controlAttrib = "_" + controlName
-		if ("drivables" in UGen.debug): oldControlVal = self.__dict__[controlAttrib]
-		self.__dict__[controlAttrib] = driver
+		if ("drivables" in UGen.debug): oldControlVal = getattr(self,controlAttrib)
+		setattr(self,controlAttrib,driver)
 		driver._drives = (self,controlName)
 		if ("drivables" in UGen.debug):
 			print >>stderr, "%s._drive(\"%s\") -> (new) %s"       % (self,controlName,driver)
 			print >>stderr, "  %s._driven[\"%s\"]   = %s"         % (self,controlName,self._driven[controlName])
-			print >>stderr, "  %s.__dict__[\"%s\"] = %s (was %s)" % (self,controlAttrib,self.__dict__[controlAttrib],oldControlVal)
+			print >>stderr, "  %s.%s = %s (was %s)"            % (self,controlAttrib,getattr(self,controlAttrib),oldControlVal)
 			print >>stderr, "  %s._drives      = (%s,\"%s\")"     % (driver,self,controlName)
 
- 		UGen.pipeline_change()
+ 		UGen.pipeline_change(self)
 		return driver
 
 	def _undrive(self,controlName):
@@ -396,12 +469,21 @@ class UGen(object):
 		del self._driven[controlName]
 		controlAttrib     = "_" + controlName
 		controlAttribLast = "_" + controlName + "Last"
-		self.__dict__[controlAttrib] = self.__dict__[controlAttribLast]
- 		UGen.pipeline_change()
+		setattr(self,controlAttrib,getattr(self,controlAttribLast))
+ 		UGen.pipeline_change(self)
 
 	def dependencies(self):
 		return [feed[0] for feed in self._feeds] + self._driven.values()
 
+	def _set_feeds_needed(self,feedsNeeded):
+		self._feedsNeeded = feedsNeeded
+		if (feedsNeeded == 1):
+			self._inFrame = self._inFrame2 = self._zeroFrame = None
+		else:
+			self._inFrame   = [0.0] * feedsNeeded
+			self._inFrame2  = [0.0] * feedsNeeded
+			self._zeroFrame = [0.0] * feedsNeeded
+
 	#-- left/right connections --
 
 	@property
@@ -459,7 +541,9 @@ class UGen(object):
 			self._bias += val
 		else:
 			# val is a scalar
-			if (isinstance(self._bias,UGen)): del self._driven["bias"]
+			if (isinstance(self._bias,UGen)):
+				del self._driven["bias"]
+				UGen.pipeline_change(self)
 			self._bias = self._biasLast = float(val)
 
 	#-- drivable gain, no side effects --
@@ -481,15 +565,19 @@ class UGen(object):
 			self._gain += val
 		else:
 			# val is a scalar
-			if (isinstance(self._gain,UGen)): del self._driven["gain"]
+			if (isinstance(self._gain,UGen)):
+				del self._driven["gain"]
+				UGen.pipeline_change(self)
 			self._gain = self._gainLast = float(val)
 
 	#-- tick handling --
 
 	def percolate(self):
+		# nota bene: when more than one feed is needed (e.g. for Mixer), the
+		#            .. input samples are collected into lists allocated once,
+		#            .. by _set_feeds_needed(), and reused for every sample
 		feedsNeeded = self._feedsNeeded
-		inSample  = [0.0] * feedsNeeded
-		inSample2 = [0.0] * feedsNeeded
+		inSample = inSample2 = None
 
 		# no inputs
 		if (self.inChannels == 0):
@@ -497,8 +585,15 @@ class UGen(object):
 
 		# one input channel
 		elif (self.inChannels == 1) and (self._feeds == []):
-			self.process_tick(self._defaultInSample)
+			inSample = self._defaultInSample
+			self.process_tick(inSample)
 		elif (self.inChannels == 1):
+			if (feedsNeeded == 1):
+				inSample = 0.0
+			else:
+				inSample = self._inFrame
+				inSample[:] = self._zeroFrame
+
 			for (ix,feed) in enumerate(self._feeds):
 				if (len(feed) == 1): (feed,channel) = (feed[0],"")
 				else:                (feed,channel) =  feed
@@ -513,18 +608,28 @@ class UGen(object):
 				else: # average the two feed outputs as our input
 					sample = (feed.last + feed.last2) * halfSqrt2
 
-				if (ix < feedsNeeded-1):
-					inSample[ix] =  sample
+				if (feedsNeeded == 1):
+					inSample     += sample
+				elif (ix < feedsNeeded-1):
+					inSample[ix]  = sample
 				else:
 					inSample[-1] += sample
 
-			if (feedsNeeded == 1): inSample = inSample[0]
 			self.process_tick(inSample)
 
 		# two input channels
 		elif (self.inChannels == 2) and (self._feeds == []):
-			self.process_tick(self._defaultInSample,self._defaultInSample)
+			inSample = inSample2 = self._defaultInSample
+			self.process_tick(inSample,inSample2)
 		else: #  (self.inChannels == 2):
+			if (feedsNeeded == 1):
+				inSample = inSample2 = 0.0
+			else:
+				inSample  = self._inFrame
+				inSample2 = self._inFrame2
+				inSample [:] = self._zeroFrame
+				inSample2[:] = self._zeroFrame
+
 			for (ix,feed) in enumerate(self._feeds):
 				if (len(feed) == 1): (feed,channel) = (feed[0],"")
 				else:                (feed,channel) =  feed
@@ -553,21 +658,18 @@ class UGen(object):
 					sample  *= scale
 					sample2 *= scale
 
-				if (ix < feedsNeeded-1):
-					inSample [ix] =  sample
-					inSample2[ix] =  sample2
+				if (feedsNeeded == 1):
+					inSample      += sample
+					inSample2     += sample2
+				elif (ix < feedsNeeded-1):
+					inSample [ix]  = sample
+					inSample2[ix]  = sample2
 				else:
 					inSample [-1] += sample
 					inSample2[-1] += sample2
 
-			if (feedsNeeded == 1):
-				inSample  = inSample [0]
-				inSample2 = inSample2[0]
 			self.process_tick(inSample,inSample2)
 
-		if ("pipeline" in UGen.debug):
-			self.report_percolation(self,inSample,inSample2)
-
 
 	def report_percolation(self,node,inSample,inSample2):
 		if (type(inSample)  == list): inSample  = "[%s]" % ",".join([str(x) for x in inSample])
@@ -591,6 +693,31 @@ class UGen(object):
 
 	def process_tick(self,sample=None,sample2=None):
 		# update any drivables that have an update function
+		for controlName in self._driven:
+			updateAttrib = "_" + controlName + "_update"
+			if (not hasattr(self,updateAttrib)): continue
+			updater = self.__getattribute__(updateAttrib)
+			updater(self._driven[controlName].last)
+
+		# feed the input sample(s) through the tick function;  a stereo tick
+		# returns the left sample and leaves the right one in self._tick2 (a
+		# tick can also return a (left,right) tuple, but that costs a tuple)
+		if   (sample  == None): outSample = self.tick()
+		elif (sample2 == None): outSample = self.tick(sample)
+		else:                   outSample = self.tick(sample,sample2)
+
+		# modify the output sample(s) with bias and gain, and save as .last
+		if (self.outChannels == 1):
+			self.last = self.bias + self.gain * outSample
+		else:
+			if (type(outSample) == tuple): (outSample,outSample2) = outSample
+			else:                           outSample2            = self._tick2
+			self.last  = self.bias + self.gain * outSample
+			self.last2 = self.bias + self.gain * outSample2
+
+	def _process_tick_traced(self,sample=None,sample2=None):
+		# same as process_tick, but with debug reporting;  this is installed
+		# in place of process_tick when any of its debug settings is active
 		for controlName in self._driven:
 			updateAttrib = "_" + controlName + "_update"
 			if (not hasattr(self,updateAttrib)): continue
@@ -600,34 +727,32 @@ class UGen(object):
 				print >>stderr, "  updating %s._%s from %s (%s)" % (self,controlName,driver,driver.last)
 			updater(driver.last)
 
-		# feed the input sample(s) through the tick function
-		outSample2 = None
-		if (sample == None):
-			if (self.outChannels == 2): (outSample,outSample2) = self.tick()
-			else:                        outSample             = self.tick()
-		elif (sample2 == None):
-			if (self.outChannels == 2): (outSample,outSample2) = self.tick(sample)
-			else:                        outSample             = self.tick(sample)
-		else: # (sample2 != None):
-			if (self.outChannels == 1):  outSample             = self.tick(sample,sample2)
-			else:                       (outSample,outSample2) = self.tick(sample,sample2)
+		if   (sample  == None): outSample = self.tick()
+		elif (sample2 == None): outSample = self.tick(sample)
+		else:                   outSample = self.tick(sample,sample2)
 
-		# modify the output sample(s) with bias and gain, and save as .last
-		if (outSample2 == None):
+		if (self.outChannels == 1):
 			self.last = self.bias + self.gain * outSample
 			if ("ticks" in UGen.debug):
 				print >>stderr, "  process_tick(%s): mono update: %s" \
 				              % (self,self.last)
-		else: # (outSample2 != None):
+		else:
+			if (type(outSample) == tuple): (outSample,outSample2) = outSample
+			else:                           outSample2            = self._tick2
 			self.last  = self.bias + self.gain * outSample
 			self.last2 = self.bias + self.gain * outSample2
 			if ("ticks" in UGen.debug):
 				print >>stderr, "  process_tick(%s): stereo update: (%s,%s)" \
 				              % (self,self.last,self.last2)
 
+		if ("pipeline" in UGen.debug):
+			self.report_percolation(self,sample,sample2)
+
 	def tick(self,sample,sample2=None):
-		if (sample2 == None): return sample
-		else:                 return (sample,sample2)
+		if (sample2 != None): self._tick2 = sample2
+		return sample
+
+UGen.trace_when(UGen,"process_tick",["drivables","ticks","pipeline"])
 
 
 class UChannel(object):
@@ -708,12 +833,33 @@ class UGraph(UGen):
 	self.outlet can be a single ugen or a list of ugens.  If the subclass has
 	no outputs it need not define an inlet.
 	"""
+
+	__slots__ = ("inlet","outlet")
 	# $$$ need to test/handle the notion of drivable controls for a UGraph
 
 	def __init__(self,name=None):
 		super(UGraph,self).__init__(name=name)
 		if ("constructors" in UGen.debug): print >>stderr, "UGraph.__init__(%s)" % name
 
+	def clone(self,shareInputs=True):
+		# returns a copy of this graph and all the ugens it's made of, i.e.
+		# everything its outlet depends on, back to its inlet;  see
+		# UGen.clone_subgraph()
+		inlet   = getattr(self,"inlet",None)
+		members = {self:True}
+		pending = [self]
+		outlet  = getattr(self,"outlet",None)
+		if   (outlet == None):               pass
+		elif (type(outlet) in [list,tuple]): pending += outlet
+		else:                                pending += [outlet]
+		while (pending != []):
+			node = pending.pop()
+			members[node] = True
+			if (node == inlet): continue
+			for upstream in node.dependencies():
+				if (upstream not in members): pending += [upstream]
+		return clone_subgraph(members.keys(),shareInputs)[self]
+
 
 class PassThru(UGen):
 	"""Parent class for pass-thru ugens.
@@ -730,6 +876,8 @@ class PassThru(UGen):
 	side effects, such as TextOut and WavOut.
 	"""
 
+	__slots__ = ()
+
 	def __init__(self,channels=1,name=None,
 		         bias=0.0,gain=1.0):
 		super(PassThru,self).__init__(inChannels=channels,outChannels=channels,name=name,
@@ -752,6 +900,8 @@ class Mixer(PassThru):
 	are more than two feeds all but the first are summed to form the wet feed.
 	"""
 
+	__slots__ = ("_dry","_dryLast","_wet","_wetLast")
+
 	def __init__(self,channels=1,name=None,
 		         bias=0.0,gain=1.0,dry=None,wet=None):
 		super(Mixer,self).__init__(channels=channels,name=name,
@@ -762,7 +912,7 @@ class Mixer(PassThru):
 			    % (self.inChannels,self.outChannels,self)
 			raise UGenError(msg)
 
-		self._feedsNeeded = 2
+		self._set_feeds_needed(2)
 
 		self._drivable += ["dry","wet"]
 		self._dry = self._dryLast = 0.0  # overwritten by self.dry = dry
@@ -791,7 +941,9 @@ class Mixer(PassThru):
 			self._dry += val
 		else:
 			# val is a scalar
-			if (isinstance(self._dry,UGen)): del self._driven["dry"]
+			if (isinstance(self._dry,UGen)):
+				del self._driven["dry"]
+				UGen.pipeline_change(self)
 			self._dry = self._dryLast = float(val)
 
 	#-- drivable wet, no side effects --
@@ -813,7 +965,9 @@ class Mixer(PassThru):
 			self._wet += val
 		else:
 			# val is a scalar
-			if (isinstance(self._wet,UGen)): del self._driven["wet"]
+			if (isinstance(self._wet,UGen)):
+				del self._driven["wet"]
+				UGen.pipeline_change(self)
 			self._wet = self._wetLast = float(val)
 
 	#-- tick handling --
@@ -822,8 +976,9 @@ class Mixer(PassThru):
 		if (samples2 == None):
 			return  self.dry*samples [0] + self.wet*samples [1]
 		else:
-			return (self.dry*samples [0] + self.wet*samples [1],
-			        self.dry*samples2[0] + self.wet*samples2[1])
+			(dry,wet) = (self.dry,self.wet)
+			self._tick2 = dry*samples2[0] + wet*samples2[1]
+			return        dry*samples [0] + wet*samples [1]
 
 
 class Pan(UGen):
@@ -833,6 +988,8 @@ class Pan(UGen):
 	-1 will place the output on the left channel, +1 will place it on the right
 	channel.
 	"""
+
+	__slots__ = ("_pan","_panLast","_panLeft","_panRight")
 	# $$$ check whether sin/cos formulation is "correct"
 	# $$$ allow caller to set the functions that map pan pos to a L/R pair
 
@@ -872,7 +1029,9 @@ class Pan(UGen):
 			self._pan += val
 		else:
 			# val is a scalar
-			if (isinstance(self._pan,UGen)): del self._driven["pan"]
+			if (isinstance(self._pan,UGen)):
+				del self._driven["pan"]
+				UGen.pipeline_change(self)
 			self._pan_update(val)
 
 	def _pan_update(self,val):
@@ -888,4 +1047,154 @@ class Pan(UGen):
 	#-- tick handling --
 
 	def tick(self,sample):
-		return (sample*self._panLeft,sample*self._panRight)
+		self._tick2 = sample*self._panRight
+		return        sample*self._panLeft
+
+
+#-- attributes --
+
+def attribute_names(node):
+	# the names of all of an object's attributes, slots first
+	names = []
+	for cls in reversed(node.__class__.__mro__):
+		slots = cls.__dict__.get("__slots__",())
+		if (type(slots) == str): slots = (slots,)
+		names += [name for name in slots if (name not in ("__dict__","__weakref__"))]
+	if (hasattr(node,"__dict__")): names += sorted(node.__dict__)
+	return names
+
+
+def transient_names(cls):
+	# the attributes a class rebuilds in _refresh() (see UGen._transient)
+	names = {}
+	for c in cls.__mro__:
+		for name in c.__dict__.get("_transient",()): names[name] = True
+	return names
+
+
+#-- cloning --
+#
+# Cloning copies attribute values one level deep for containers (lists,
+# tuples, dicts, deques, arrays) and for helper objects with slots;  other
+# values (numbers, strings, functions, files) are shared with the original.
+# References to ugens in the set become references to their copies.  A
+# reference to an outside ugen is kept, or, when inputs aren't shared,
+# dropped (a list element or a dict entry is removed, a tuple containing it,
+# such as a feed, is dropped in turn, and a plain attribute becomes None).
+
+ownerAttributes = {"_feeds":True, "_drives":True}  # (references that aren't owned)
+plainTypes      = (NoneType,bool,int,long,float,str,unicode)
+cloneLayouts    = {}    # maps class to the names of the attributes we copy
+dropped         = object()
+
+
+def clone_layout(node):
+	cls = node.__class__
+	if (cls in cloneLayouts): return cloneLayouts[cls]
+	transient = transient_names(cls)
+	names = [name for name in attribute_names(node)
+	              if (name != "id") and (name not in transient)]
+	if (not hasattr(node,"__dict__")): cloneLayouts[cls] = names
+	return names
+
+
+def clone_subgraph(nodes,shareInputs=True):
+	# find the full set of ugens to copy
+	members = {}
+	pending = list(nodes)
+	while (pending != []):
+		node = pending.pop()
+		if (node in members): continue
+		members[node] = True
+		for name in clone_layout(node):
+			if (name in ownerAttributes): continue
+			value = getattr(node,name,None)
+			if (type(value) in plainTypes): continue
+			pending += owned_ugens(value)
+
+	# create the copies first, so references can be remapped as the
+	# attributes are copied
+
+	copies = {}
+	for node in members:
+		cls = node.__class__
+		copies[node] = clone = cls.__new__(cls)
+		UGen.lastId += 1
+		clone.id = UGen.lastId
+		UGen.instances[clone.id] = clone
+
+	for (node,clone) in copies.items():
+		for name in clone_layout(node):
+			value = getattr(node,name,dropped)
+			if (type(value) not in plainTypes):
+				if (value is dropped): continue   # (never set)
+				value = clone_value(value,copies,shareInputs)
+				if (value is dropped): value = None
+			setattr(clone,name,value)
+
+	# ugens with default names are renamed after their new ids, as are the
+	# drivers of their controls
+
+	for (node,clone) in copies.items():
+		if (node.name == "%s.%s" % (node.__class__.__name__,node.id)):
+			clone.name = "%s.%s" % (node.__class__.__name__,clone.id)
+	for (node,clone) in copies.items():
+		if (node._drives == None): continue
+		(owner,controlName) = node._drives
+		if (node.name == owner.name + "~" + controlName) and (owner in copies):
+			clone.name = copies[owner].name + "~" + controlName
+
+	for clone in copies.values():
+		clone._refresh()
+		if ("constructors" in UGen.debug): print >>stderr, "cloned %s" % clone
+	return copies
+
+
+def owned_ugens(value):
+	if (isinstance(value,UGen)): return [value]
+	if (type(value) in (list,tuple)):
+		owned = []
+		for v in value: owned += owned_ugens(v)
+		return owned
+	if (type(value) == dict):
+		owned = []
+		for (k,v) in value.items(): owned += owned_ugens(k) + owned_ugens(v)
+		return owned
+	return []
+
+
+def clone_value(value,copies,shareInputs):
+	if (type(value) in plainTypes):
+		return value
+	if (isinstance(value,UGen)):
+		if (value in copies): return copies[value]
+		return value if (shareInputs) else dropped
+	if (type(value) == list):
+		items = [clone_value(v,copies,shareInputs) for v in value]
+		return [v for v in items if (v is not dropped)]
+	if (type(value) == tuple):
+		items = tuple([clone_value(v,copies,shareInputs) for v in value])
+		return dropped if (dropped in items) else items
+	if (type(value) == dict):
+		items = [(clone_value(k,copies,shareInputs),clone_value(v,copies,shareInputs))
+		         for (k,v) in value.items()]
+		return dict([(k,v) for (k,v) in items if (k is not dropped) and (v is not dropped)])
+	if (isinstance(value,array)):
+		return value[:]
+	if (isinstance(value,deque)):
+		return deque(value,value.maxlen)
+	if (hasattr(value,"getstate")) and (hasattr(value,"setstate")):
+		# (random number generators;  tested by their methods, so that ugen.py
+		# needn't import random)
+		prng = value.__class__()
+		prng.setstate(value.getstate())
+		return prng
+	if (hasattr(value,"__slots__")) and (not hasattr(value,"__dict__")):
+		# (helper objects such as a RateGroup's resamplers)
+		cls = value.__class__
+		obj = cls.__new__(cls)
+		for name in attribute_names(value):
+			if (hasattr(value,name)):
+				setattr(obj,name,clone_value(getattr(value,name),copies,shareInputs))
+		return obj
+	return value
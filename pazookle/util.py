@@ -39,3 +39,17 @@ def clip_value(sample,sampleMin,sampleMax=None):
 	if (sample >= sampleMax): return sampleMax
 	return sample
 
+
+
+def install_variant(cls,methodName,traced):
+	"""Install the fast or the traced variant of a method.
+
+	cls.<methodName> is, as written, the fast (debug-free) variant, and
+	cls._<methodName>_traced is its instrumented twin.  The fast variant is
+	remembered as cls._<methodName>_fast the first time we're called.
+	"""
+	fastName = "_%s_fast" % methodName
+	if (fastName not in cls.__dict__):
+		setattr(cls,fastName,cls.__dict__[methodName])
+	if (traced): setattr(cls,methodName,cls.__dict__["_%s_traced" % methodName])
+	else:        setattr(cls,methodName,cls.__dict__[fastName])
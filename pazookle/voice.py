@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+from sys  import stderr
+from ugen import UGen,UGenError,UGraph,PassThru
+
+
+class Voice(UGraph):
+	"""Parent class for voices managed by a VoicePool.
+
+	A subclass builds its sound chain in its constructor, sets self.outlet to
+	the end of that chain (as with any UGraph), and sets self.envelope to the
+	envelope that shapes the voice (an Envelope or ADSR).  It should also
+	override set_note() to tune its chain to a midi note.
+	"""
+
+	__slots__ = ("envelope","note")
+
+	def __init__(self,name=None):
+		super(Voice,self).__init__(name=name)
+		if ("constructors" in UGen.debug): print >>stderr, "Voice.__init__(%s)" % name
+		self.envelope = None
+		self.note     = None
+
+	def set_note(self,note):
+		pass
+
+	def note_on(self,note,velocity=None):
+		self.note = note
+		self.set_note(note)
+		self.envelope.key_on(velocity)
+
+	def note_off(self):
+		self.envelope.key_off()
+
+	def level(self):
+		# the envelope's current value
+		return self.envelope._current
+
+	def release_end(self):
+		# the time at which the voice's release will be complete
+		return self.envelope._endTime
+
+	def is_idle(self):
+		return (not self.envelope._active) and (self.envelope._current == 0)
+
+
+class VoicePool(UGraph):
+	"""A fixed set of voices, handed out to notes as they are played.
+
+	The pool is built from a factory, a function (or class) that is called
+	with no arguments and returns a new Voice.  All of the voices are built
+	when the pool is created, so playing a note never constructs any ugens.
+
+	note_on(note,velocity) assigns an idle voice to the note and starts it.
+	note_off(note) releases the voice playing that note.  Once its release is
+	complete the voice goes back to the pool.  If all of the voices are busy
+	when a note starts, one is stolen.  Voices that are already releasing are
+	stolen first;  beyond that the steal policy decides, either "oldest" (the
+	voice that started earliest) or "quietest" (the voice whose envelope is
+	lowest).
+
+	Idle voices are disconnected from the pool's output, so they are not part
+	of the pipeline and cost nothing per sample.  The pool relies on the
+	shreduler to return voices to the pool when their release completes;
+	without a shreduler, released voices are returned only when a new note
+	needs a voice.
+	"""
+
+	__slots__ = ("steal","voices","_bus","_idle","_active","_held",
+	             "_releasing","_tickets")
+
+	def __init__(self,factory,numVoices,channels=1,name=None,
+	             gain=1.0,steal=None):
+		super(VoicePool,self).__init__(name=name)
+		if ("constructors" in UGen.debug): print >>stderr, "VoicePool.__init__(%s)" % name
+
+		if (numVoices < 1):
+			msg = "numVoices=%s is not valid for %s" % (numVoices,self)
+			raise UGenError(msg)
+		if (steal == None): steal = "oldest"
+		if (steal not in ["oldest","quietest"]):
+			msg = "steal=\"%s\" is not valid for %s" % (steal,self)
+			raise UGenError(msg)
+
+		self.steal  = steal
+		self.outlet = self._bus = PassThru(channels=channels)
+		self.voices = [factory() for _ in xrange(numVoices)]
+
+		self._idle      = list(self.voices)  # idle voices, disconnected
+		self._active    = []                 # busy voices, oldest first
+		self._held      = {}                 # maps note to voices holding it
+		self._releasing = {}                 # maps releasing voice to True
+		self._tickets   = {}                 # maps voice to its current ticket
+		for voice in self.voices: self._tickets[voice] = 0
+
+		self.gain = gain
+
+	#-- setters and getters --
+
+	@property
+	def gain(self):
+		return self._gain
+
+	@gain.setter
+	def gain(self,gain):
+		self._gain = gain
+		if (hasattr(self,"_bus")):
+			self._bus.gain = gain
+
+	#-- notes --
+
+	def note_on(self,note,velocity=None):
+		voice = self._allocate()
+		self._active += [voice]
+		if (note not in self._held): self._held[note] =  [voice]
+		else:                        self._held[note] += [voice]
+		if ("voices" in UGen.debug):
+			print >>stderr, "%s.note_on(%s) -> %s" % (self,note,voice)
+		voice.note_on(note,velocity)
+		return voice
+
+	def note_off(self,note):
+		if (note not in self._held): return None
+		voice = self._held[note].pop(0)
+		if (self._held[note] == []): del self._held[note]
+		if ("voices" in UGen.debug):
+			print >>stderr, "%s.note_off(%s) -> %s" % (self,note,voice)
+		voice.note_off()
+		self._releasing[voice] = True
+
+		self._tickets[voice] += 1
+		if (UGen.shreduler != None):
+			shredName = "%s~reap" % self.name
+			UGen.shreduler.spork(self._reaper(voice,self._tickets[voice]),shredName)
+		return voice
+
+	def all_notes_off(self):
+		for note in list(self._held):
+			while (note in self._held):
+				self.note_off(note)
+
+	def busy_voices(self):
+		return len(self._active)
+
+	#-- voice management --
+
+	def _allocate(self):
+		if (self._idle == []):
+			# recover any voice that has gone quiet without being reaped
+			for voice in list(self._releasing):
+				if (voice.is_idle()): self._retire(voice)
+
+		if (self._idle != []):
+			voice = self._idle.pop(0)
+			for outlet in self._outlets(voice):
+				outlet >> self._bus
+			return voice
+
+		# steal a voice, preferably one that has already been released
+		candidates = [voice for voice in self._active if (voice in self._releasing)]
+		if (candidates == []): candidates = self._active
+		if (self.steal == "oldest"):
+			voice = candidates[0]
+		else: # (self.steal == "quietest"):
+			voice = min(candidates,key=lambda voice: abs(voice.level()))
+
+		if ("voices" in UGen.debug):
+			print >>stderr, "%s stealing %s" % (self,voice)
+		self._active.remove(voice)
+		self._forget(voice)
+		self._tickets[voice] += 1  # (cancels any pending reap)
+		return voice
+
+	def _retire(self,voice):
+		# return a voice to the idle list, and remove it from the pipeline
+		if ("voices" in UGen.debug):
+			print >>stderr, "%s retiring %s" % (self,voice)
+		self._active.remove(voice)
+		self._forget(voice)
+		self._tickets[voice] += 1  # (cancels any pending reap)
+		for outlet in self._outlets(voice):
+			outlet // self._bus
+		self._idle += [voice]
+
+	def _forget(self,voice):
+		if (voice in self._releasing): del self._releasing[voice]
+		note = voice.note
+		if (note in self._held) and (voice in self._held[note]):
+			self._held[note].remove(voice)
+			if (self._held[note] == []): del self._held[note]
+
+	def _outlets(self,voice):
+		outlet = getattr(voice,"outlet",None)
+		if   (outlet == None):               return [voice]
+		elif (type(outlet) in [list,tuple]): return outlet
+		else:                                return [outlet]
+
+	def _reaper(self,voice,ticket):
+		# shred to return a voice to the pool once its release is complete;
+		# if the voice has been retired or reassigned in the meantime its
+		# ticket will have changed, and we leave it alone
+		yield ("absolute",max(voice.release_end(),UGen.shreduler.now()))
+		if (self._tickets[voice] == ticket):
+			self._retire(voice)
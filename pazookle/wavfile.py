@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""
+	Pazookle Audio Programming Language
+	Copyright (C) 2013 Bob Harris.  All rights reserved.
+
+    This file is part of Pazookle.
+
+	Pazookle is free software: you can redistribute it and/or modify it under
+	the terms of the GNU General Public License as published by the Free
+	Software Foundation, either version 3 of the License, or (at your option)
+	any later version.
+
+	This program is distributed in the hope that it will be useful, but WITHOUT
+	ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or
+	FITNESS FOR A PARTICULAR PURPOSE.  See the GNU General Public License for
+	more details.
+
+	You should have received a copy of the GNU General Public License along
+	with this program.  If not, see <http://www.gnu.org/licenses/>.
+"""
+__version__   = "0.01"
+__author__    = "Bob Harris (zackobelsch@gmail.com)"
+__copyright__ = "(C) 2013 Bob Harris. GNU GPLv3."
+
+
+import sys
+from array  import array
+from struct import pack as struct_pack,unpack as struct_unpack
+
+
+class WavFileError(Exception):
+	def __init__(self,message):
+		Exception.__init__(self,message)
+
+
+#-- pcm conversion --
+#
+# Samples are floats, nominally -1..+1.  An integer format's samples are
+# scaled by its peak value, and clipped to +/-peak (so the most negative
+# integer is never written, and reads as -1 if found).  8-bit samples are
+# unsigned, offset by 128, as the .wav format has it.  24-bit samples are
+# handled as 32-bit integers, and converted three bytes at a time.  Float
+# samples are written as they are, not clipped.  Everything is converted a
+# list (or array) of samples at a time, never one sample at a time.
+#
+# All data is little-endian, as in .wav files.
+
+int32Code = "i" if (array("i").itemsize == 4) else "l"
+
+sampleFormats = {            # (typecode,bytes per sample,peak)
+	"int8":    ("b",1,127),
+	"int16":   ("h",2,32767),
+	"int24":   (int32Code,3,8388607),
+	"int32":   (int32Code,4,2147483647),
+	"float32": ("f",4,None),
+	"float64": ("d",8,None)}
+
+bigEndian = (sys.byteorder != "little")
+
+
+def sample_format(sampleWidth,isFloat=False):
+	# the name of the format with this many bytes per sample
+	for (name,(_,width,peak)) in sampleFormats.items():
+		if (width == sampleWidth) and ((peak == None) == isFloat): return name
+	kind = "float" if (isFloat) else "integer"
+	msg = "%d-byte %s samples are not supported" % (sampleWidth,kind)
+	raise WavFileError(msg)
+
+
+def encode_pcm(samples,sampleFormat):
+	"""Convert a sequence of samples to little-endian pcm data (a string)."""
+	(typecode,width,peak) = sampleFormats[sampleFormat]
+	if (peak == None):
+		data = array(typecode,samples)
+	else:
+		data = array(typecode,[(-peak if (v < -1.0) else peak if (v > 1.0) else int(peak*v))
+		                       for v in samples])
+	if (bigEndian): data.byteswap()
+	if (width == 1):
+		# (unsigned, so flip the sign bit)
+		return data.tostring().translate(flipSignBit)
+	if (width == 3):
+		# (drop the top byte of each 32-bit sample)
+		data = bytearray(data.tostring())
+		del data[3::4]
+		return str(data)
+	return data.tostring()
+
+
+def decode_pcm(data,sampleFormat):
+	"""Convert little-endian pcm data to an array of samples (doubles)."""
+	(typecode,width,peak) = sampleFormats[sampleFormat]
+	if (width == 1):
+		data = data.translate(flipSignBit)
+	elif (width == 3):
+		# (each sample becomes the top three bytes of a 32-bit sample, so it
+		# is 256 times too large;  scaling the peak the same way gives exactly
+		# the same quotient)
+		numSamples = len(data) // 3
+		wide = bytearray(4*numSamples)
+		wide[1::4] = data[0:3*numSamples:3]
+		wide[2::4] = data[1:3*numSamples:3]
+		wide[3::4] = data[2:3*numSamples:3]
+		data = str(wide)
+		peak *= 256
+	numBytes = len(data) - (len(data) % array(typecode).itemsize)
+	values = array(typecode)
+	values.fromstring(data[:numBytes])
+	if (bigEndian): values.byteswap()
+	if (peak == None): return array("d",values)
+	scale = float(peak)
+	return array("d",[(v/scale if (v > -peak) else -1.0) for v in values])
+
+
+flipSignBit = "".join([chr(b ^ 0x80) for b in xrange(256)])
+
+
+#-- reading --
+
+formatPcm        = 0x0001
+formatFloat      = 0x0003
+formatExtensible = 0xFFFE
+subformatTail    = "\x00\x00\x00\x00\x10\x00\x80\x00\x00\xaa\x00\x38\x9b\x71"
+
+
+def read_wav(source):
+	"""Read a .wav file.
+
+	source is a filename or a file object.  Returns (channels,samplingRate,
+	sampleFormat,samples), where samples is an array of doubles, with the
+	channels interleaved.  Integer pcm of 8, 16, 24 or 32 bits and 32 or 64
+	bit floats are supported, in plain or WAVE_FORMAT_EXTENSIBLE files.
+	"""
+	if (type(source) == str):
+		f = open(source,"rb")
+		name = source
+	else:
+		f = source
+		name = getattr(source,"name","wav file")
+	try:
+		header = f.read(12)
+		if (len(header) < 12) or (header[:4] != "RIFF") or (header[8:12] != "WAVE"):
+			msg = "\"%s\" is not a .wav file" % name
+			raise WavFileError(msg)
+
+		fmt  = None
+		data = None
+		while (data == None):
+			chunkHeader = f.read(8)
+			if (len(chunkHeader) < 8): break
+			(chunkId,chunkSize) = struct_unpack("<4sL",chunkHeader)
+			if (chunkId == "fmt "):
+				fmt = f.read(chunkSize)
+			elif (chunkId == "data"):
+				if (fmt == None):
+					msg = "\"%s\" has its samples before its format" % name
+					raise WavFileError(msg)
+				data = f.read(chunkSize)
+				break
+			else:
+				f.seek(chunkSize,1)
+			if (chunkSize & 1): f.seek(1,1)
+	finally:
+		if (type(source) == str): f.close()
+
+	if (fmt == None) or (data == None):
+		msg = "\"%s\" has no %s chunk" % (name,"fmt" if (fmt == None) else "data")
+		raise WavFileError(msg)
+
+	(formatTag,channels,samplingRate,_,blockAlign,bitsPerSample) \
+	  = struct_unpack("<HHLLHH",fmt[:16])
+	if (formatTag == formatExtensible) and (len(fmt) >= 40):
+		subformat = fmt[24:40]
+		if (subformat[2:] != subformatTail):
+			msg = "\"%s\" has an unsupported WAVE_FORMAT_EXTENSIBLE subformat" % name
+			raise WavFileError(msg)
+		(formatTag,) = struct_unpack("<H",subformat[:2])
+
+	if (formatTag not in [formatPcm,formatFloat]) or (bitsPerSample % 8 != 0) \
+	  or (channels < 1) or (blockAlign != channels*bitsPerSample/8):
+		msg = "\"%s\" has an unsupported format (tag=%04X, %d bits, %d channels)" \
+		    % (name,formatTag,bitsPerSample,channels)
+		raise WavFileError(msg)
+	try:
+		sampleFormat = sample_format(bitsPerSample/8,isFloat=(formatTag == formatFloat))
+	except WavFileError, ex:
+		raise WavFileError("for \"%s\", %s" % (name,ex))
+
+	# (a truncated file, e.g. from an interrupted render, is read up to its
+	# last complete frame)
+	data = data[:len(data) - (len(data) % blockAlign)]
+	return (channels,samplingRate,sampleFormat,decode_pcm(data,sampleFormat))
+
+
+#-- writing --
+
+class WavWriter(object):
+	"""Write a .wav file, a chunk of samples at a time.
+
+	f is a filename or a file object (which must be seekable).  sampleFormat
+	is one of the names in sampleFormats.  8 and 16-bit files with one or two
+	channels get the plain header (identical to what python's wave module
+	writes);  other files get a WAVE_FORMAT_EXTENSIBLE header (and float files
+	a fact chunk).  The header's sizes are brought up to date after every
+	write, so the file is valid even if it is never closed.
+	"""
+
+	def __init__(self,f,channels,samplingRate,sampleFormat="int16"):
+		if (sampleFormat not in sampleFormats):
+			msg = "sampleFormat=%s is not supported" % sampleFormat
+			raise WavFileError(msg)
+		if (type(f) == str):
+			f = open(f,"wb")
+			self._ownFile = True
+		else:
+			self._ownFile = False
+		self.file         = f
+		self.channels     = channels
+		self.samplingRate = samplingRate
+		self.sampleFormat = sampleFormat
+		(_,self.sampleWidth,peak) = sampleFormats[sampleFormat]
+		self.isFloat      = (peak == None)
+		self.dataBytes    = 0
+		self._write_header()
+
+	def _write_header(self):
+		blockAlign = self.channels * self.sampleWidth
+		byteRate   = self.samplingRate * blockAlign
+		bits       = 8 * self.sampleWidth
+		plain = (not self.isFloat) and (self.sampleWidth <= 2) and (self.channels <= 2)
+		if (plain):
+			fmt = struct_pack("<HHLLHH",formatPcm,self.channels,self.samplingRate,
+			                  byteRate,blockAlign,bits)
+		else:
+			if   (self.channels == 1): channelMask = 0x4   # (front center)
+			elif (self.channels == 2): channelMask = 0x3   # (front left, right)
+			else:                      channelMask = 0
+			formatTag = formatFloat if (self.isFloat) else formatPcm
+			fmt = struct_pack("<HHLLHHHHL",formatExtensible,self.channels,self.samplingRate,
+			                  byteRate,blockAlign,bits,22,bits,channelMask) \
+			    + struct_pack("<H",formatTag) + subformatTail
+		header = "fmt " + struct_pack("<L",len(fmt)) + fmt
+		if (self.isFloat):
+			self._factOffset = 12 + len(header) + 8
+			header += "fact" + struct_pack("<L",4) + struct_pack("<L",0)
+		else:
+			self._factOffset = None
+		self._dataOffset = 12 + len(header) + 4
+		header = "RIFF" + struct_pack("<L",4+len(header)+8) + "WAVE" \
+		       + header + "data" + struct_pack("<L",0)
+		self.file.write(header)
+		self._headerBytes = len(header)
+
+	def write_samples(self,samples):
+		self.write_data(encode_pcm(samples,self.sampleFormat))
+
+	def write_data(self,data):
+		# data is already encoded
+		self.file.write(data)
+		self.dataBytes += len(data)
+		self._patch_header()
+
+	def _patch_header(self,pad=0):
+		f = self.file
+		f.seek(4)
+		f.write(struct_pack("<L",self._headerBytes-8+self.dataBytes+pad))
+		if (self._factOffset != None):
+			f.seek(self._factOffset)
+			f.write(struct_pack("<L",self.dataBytes // (self.channels*self.sampleWidth)))
+		f.seek(self._dataOffset)
+		f.write(struct_pack("<L",self.dataBytes))
+		f.seek(0,2)
+
+	def flush(self):
+		if (self.file != None): self.file.flush()
+
+	def close(self):
+		if (self.file == None): return
+		if (self.dataBytes & 1):
+			# (riff chunks are padded to an even size)
+			self.file.write("\x00")
+			self._patch_header(pad=1)
+		if (self._ownFile): self.file.close()
+		else:               self.file.flush()
+		self.file = None
+
+
+def write_wav(f,channels,samplingRate,samples,sampleFormat="int16"):
+	"""Write a .wav file all at once;  samples are interleaved."""
+	writer = WavWriter(f,channels,samplingRate,sampleFormat)
+	writer.write_samples(samples)
+	writer.close()
@@ -3,9 +3,35 @@
 # or  http://docs.python.org/2/library/test.html
 
 import unittest
+import os.path
+import gc
+import random
+import time
+import wave
+import struct
+import ast
 from StringIO          import StringIO
-from pazookle.ugen     import UGen,Mixer,Pan
+from tempfile          import mkdtemp
+from shutil            import rmtree
+from pazookle.ugen     import UGen,UGenError,UGraph,Mixer,Pan,PassThru
 from pazookle.generate import Periodic
+from pazookle.filter   import LowPass
+from pazookle.buffer   import Clip,Echo,MultiTapDelay,freeze,unfreeze
+from pazookle.rate     import RateGroup
+from pazookle.generate import SinOsc,SawOsc,TriOsc,Noise
+from pazookle.envelope import ADSR
+from pazookle.voice    import Voice,VoicePool
+from pazookle.output   import WavOut,TextOut,RawOut,BinaryOut,AsyncWriter
+from pazookle.wavfile  import read_wav,write_wav
+from pazookle.cache    import RenderCache
+from pazookle.checkpoint import Checkpointer,CheckpointError
+from pazookle.serialize import dumps,loads,SerializeError
+from pazookle.shred    import Shreduler,ShredulerError,Event,zook,console
+from pazookle.context  import Context
+from pazookle.realtime import RealtimeDriver
+from pazookle.midi     import MidiFile,MidiPlayer,MidiError
+from pazookle.midi     import midi_to_freq,midi_to_freqs,build_scale,Tuning,equalCents,justCents
+from struct            import pack as struct_pack
 
 class TestUGen(unittest.TestCase):
 
@@ -894,6 +920,27 @@ c in[(a,>L),(b,>R)]
 		self.assertEqual(self.transcript([a,b,c]),expected)
 
 
+	def test_trace_switching(self):
+		# debug settings swap the traced variants in and out
+		UGen.set_debug("ticks")
+		self.assertEqual(UGen.__dict__["process_tick"],UGen.__dict__["_process_tick_traced"])
+		self.assertEqual(Periodic.__dict__["tick"],Periodic.__dict__["_tick_traced"])
+		UGen.unset_debug("ticks")
+		self.assertEqual(UGen.__dict__["process_tick"],UGen.__dict__["_process_tick_fast"])
+		self.assertEqual(Periodic.__dict__["tick"],Periodic.__dict__["_tick_fast"])
+
+
+	def test_compact_layout(self):
+		# built-in ugens keep their attributes in slots, not in a __dict__
+		a = UGen(name="a")
+		b = Mixer(name="b")
+		c = Pan(name="c")
+		d = a >> b["dry"]
+
+		for x in [a,b,c,d]:
+			self.assertFalse(hasattr(x,"__dict__"))
+
+
 	def transcript(self,elements):
 		f = StringIO()
 		print >>f
@@ -902,4 +949,1275 @@ c in[(a,>L),(b,>R)]
 		return f.getvalue()
 
 
+class ShredulerTestCase(unittest.TestCase):
+	# 	each test gets a fresh shreduler (from new_shreduler()), and the old
+	#	.. one, with its sampling rate, is restored afterward
+
+	def setUp(self):
+		UGen.set_debug("stifle ids")
+		self.oldShreduler = UGen.shreduler
+		self.shreduler = self.new_shreduler()
+		UGen.set_shreduler(self.shreduler)
+
+	def tearDown(self):
+		UGen.set_shreduler(self.oldShreduler)
+
+	def new_shreduler(self):
+		return Shreduler()
+
+
+class TestUpdateOrder(ShredulerTestCase):
+
+	def test_added_subgraph(self):
+		# 	a >> b >> out, then c >> d >> b
+		a   = PassThru(name="a")
+		b   = PassThru(name="b")
+		c   = PassThru(name="c")
+		d   = PassThru(name="d")
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+
+		a >> b >> out
+		self.assertEqual(self.order(),"a b out")
+		c >> d >> b
+		self.assertEqual(self.order(),"a c d b out")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def test_reordered_connect(self):
+		# 	a >> out, b >> out, then b >> a     b has to move ahead of a
+		a   = PassThru(name="a")
+		b   = PassThru(name="b")
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+
+		a >> out
+		b >> out
+		self.assertEqual(self.order(),"a b out")
+		b >> a
+		self.assertEqual(self.order(),"b a out")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def test_cycle_connect(self):
+		# 	a >> b >> out, then b >> a    a hears b one tick late
+		a   = PassThru(name="a")
+		b   = PassThru(name="b")
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+
+		a >> b >> out
+		self.assertEqual(self.order(),"a b out")
+		b >> a
+		self.assertEqual(self.order(),"a b out")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def test_driver_connect(self):
+		# 	a >> out, then b >> a["gain"]
+		a   = PassThru(name="a")
+		b   = PassThru(name="b")
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+
+		a >> out
+		self.assertEqual(self.order(),"a out")
+		b >> a["gain"]
+		self.assertEqual(self.order(),"b a~gain a out")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def test_stranded_disconnect(self):
+		# 	a >> b >> out, c >> out, then b // out
+		a   = PassThru(name="a")
+		b   = PassThru(name="b")
+		c   = PassThru(name="c")
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+
+		a >> b >> out
+		c >> out
+		self.assertEqual(self.order(),"a b c out")
+		b // out
+		self.assertEqual(self.order(),"c out")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def test_sink_removal(self):
+		# 	a >> out1, a >> out2, then out1 stops being a sink
+		a    = PassThru(name="a")
+		out1 = PassThru(name="out1")
+		out2 = PassThru(name="out2")
+		self.shreduler.add_sink(out1)
+		self.shreduler.add_sink(out2)
+
+		a >> out1
+		a >> out2
+		self.assertEqual(self.order(),"a out1 out2")
+		self.shreduler.remove_sink(out1)
+		self.assertEqual(self.order(),"a out2")
+		self.assertEqual(self.order(),self.full_order())
+
+
+	def order(self):
+		self.shreduler.run_sample_pipe()
+		return " ".join([str(node) for node in self.shreduler._updateOrder])
+
+	def full_order(self):
+		return " ".join([str(node) for node in self.shreduler.find_update_order()])
+
+
+
+class TestDraft(ShredulerTestCase):
+
+	def new_shreduler(self):
+		return Shreduler(draft=4)
+
+
+	def test_draft_rate(self):
+		self.assertEqual(self.shreduler.samplingRate,11025)
+		self.assertEqual(self.shreduler.sec,11025.0)
+		self.assertEqual(UGen.samplingRate,11025)
+		self.shreduler.set_draft(1)
+		self.assertEqual(self.shreduler.samplingRate,44100)
+		self.assertEqual(UGen.samplingRate,44100)
+
+
+	def test_draft_after_start(self):
+		self.shreduler.run_sample_pipe()
+		self.assertRaises(ShredulerError,self.shreduler.set_draft,2)
+
+
+	def test_filter_limit(self):
+		# 	a filter set above the draft nyquist rate is held at the limit
+		high  = LowPass(freq=8000)
+		limit = LowPass(freq=UGen.maxFilterFreq)
+		self.assertEqual(high.freq,8000)
+		self.assertEqual((high._b1,high._b2,high._a0),(limit._b1,limit._b2,limit._a0))
+
+
+	def test_clip_resample(self):
+		clip = Clip([0.0,1.0,2.0,3.0,4.0,5.0,6.0,7.0])
+		clip._resample(2*UGen.samplingRate)
+		self.assertEqual(list(clip._buffer[:len(clip)]),[0.5,2.5,4.5,6.5])
+		clip._resample(UGen.samplingRate/2.0)
+		self.assertEqual(list(clip._buffer[:len(clip)]),[0.5,1.5,2.5,3.5,4.5,5.5,6.5,6.5])
+
+
+
+class TestRateGroup(ShredulerTestCase):
+
+	def test_slow_group(self):
+		# 	src >> g.output inside a slow group, then g >> out
+		group = RateGroup(down=4,inChannels=0,name="g")
+		with group:
+			self.assertEqual(UGen.samplingRate,11025)
+			src = PassThru(name="src",bias=1.0)
+			src >> group.output
+		self.assertEqual(UGen.samplingRate,44100)
+		out = PassThru(name="out")
+		self.shreduler.add_sink(out)
+		group >> out
+
+		self.run_samples(100)
+		self.assertEqual(self.order(),"g out")
+		self.assertEqual(" ".join([str(node) for node in group.inner_order()]),"src g.output")
+		self.assertAlmostEqual(group.last,1.0,places=3)
+
+
+	def test_fast_group(self):
+		# 	src >> g >> out, with g.input >> g.output inside a fast group
+		src   = PassThru(name="src",bias=0.5)
+		group = RateGroup(up=3,name="g")
+		out   = PassThru(name="out")
+		self.shreduler.add_sink(out)
+		src >> group >> out
+		group.input >> group.output
+
+		self.run_samples(100)
+		self.assertEqual(self.order(),"src g out")
+		self.assertAlmostEqual(group.last,0.5,places=3)
+
+
+	def run_samples(self,numSamples):
+		for _ in xrange(numSamples): self.shreduler.run_sample_pipe()
+
+	def order(self):
+		return " ".join([str(node) for node in self.shreduler._updateOrder])
+
+
+
+class TestFreeze(ShredulerTestCase):
+
+	def test_freeze(self):
+		# 	osc >> pad >> out, twinned by osc2 >> pad2 >> out;  pad is frozen
+		#	.. and its clip should track pad2
+		osc  = SinOsc(name="osc",freq=1000,gain=1)
+		pad  = PassThru(name="pad",gain=0.5)
+		osc2 = SinOsc(name="osc2",freq=1000,gain=1)
+		pad2 = PassThru(name="pad2",gain=0.5)
+		out  = PassThru(name="out")
+		self.shreduler.add_sink(out)
+		osc  >> pad  >> out
+		osc2 >> pad2 >> out
+
+		self.run_samples(10)
+		clip = freeze(pad,100)
+		self.assertEqual(self.shreduler.clock(),10)
+		self.assertEqual(self.order(),"osc2 pad2 pad~frozen out")
+		self.assertEqual(clip.last,pad2.last)
+		for _ in xrange(99):
+			self.shreduler.run_sample_pipe()
+			self.assertEqual(clip.last,pad2.last)
+
+		self.assertEqual(unfreeze(clip),pad)
+		self.assertEqual(self.order(),"osc2 pad2 osc pad out")
+
+
+	def run_samples(self,numSamples):
+		for _ in xrange(numSamples): self.shreduler.run_sample_pipe()
+
+	def order(self):
+		self.shreduler.run_sample_pipe()
+		return " ".join([str(node) for node in self.shreduler._updateOrder])
+
+
+class TestMultiTapDelay(ShredulerTestCase):
+
+	def test_driven_pan_mix_only(self):
+		# 	a driven pan follows its driver even when the tap only feeds
+		#	.. the mix (and so is never percolated itself)
+		f     = StringIO()
+		out   = TextOut(filename=f,channels=2,lazySink=True)
+		delay = MultiTapDelay(maxDelay=4,outChannels=2)
+		tap   = delay.add_tap(1,mix=True)
+		panner = PassThru(bias=-1.0)
+		panner >> tap["pan"]
+		PassThru(bias=1.0) >> delay >> out
+		def shred():
+			for pan in [1.0,-1.0,1.0]:
+				yield 2
+				panner.bias = pan
+			yield 2
+		self.shreduler.spork(shred())
+		self.shreduler.run()
+		self.assertTrue(isinstance(tap._pan,UGen))
+		lines = [line.split("\t")[1:] for line in f.getvalue().splitlines()]
+		sides = [(round(float(left),6),round(float(right),6)) for (left,right) in lines]
+		self.assertEqual(sides[2:],[(0.0,1.0),(0.0,1.0),(1.0,0.0),(1.0,0.0),
+		                            (0.0,1.0),(0.0,1.0)])
+
+
+class SineVoice(Voice):
+
+	def __init__(self,name=None):
+		super(SineVoice,self).__init__(name=name)
+		self.osc      = SinOsc(gain=1)
+		self.envelope = ADSR(adsr=(10.0,10.0,0.5,100.0))
+		self.osc >> self.envelope
+		self.outlet = self.envelope
+
+	def set_note(self,note):
+		self.osc.freq = midi_to_freq(note)
+
+
+class TestVoicePool(ShredulerTestCase):
+
+	def test_reap(self):
+		# 	a released voice goes back to the pool once its release is
+		#	.. complete, and is disconnected from the pipeline
+		zook = self.shreduler
+		pool = VoicePool(SineVoice,2)
+		out  = PassThru()
+		pool >> out
+		zook.add_sink(out)
+		def player():
+			pool.note_on(60)
+			pool.note_on(64)
+			yield 50
+			pool.note_off(60)
+			yield 20
+			self.assertEqual(pool.busy_voices(),2)
+			yield 200
+			self.assertEqual(pool.busy_voices(),1)
+			self.assertEqual(len(pool._idle),1)
+			self.assertEqual(pool._bus._feeds,[(pool._active[0].outlet,)])
+		zook.spork(player())
+		zook.run()
+
+
+	def test_steal_oldest(self):
+		# 	with every voice busy the oldest is stolen, unless one has
+		#	.. been released, in which case that one is
+		zook = self.shreduler
+		pool = VoicePool(SineVoice,2,steal="oldest")
+		pool >> PassThru()
+		def player():
+			first  = pool.note_on(60)
+			yield 5
+			second = pool.note_on(62)
+			yield 5
+			self.assertIs(pool.note_on(64),first)
+			yield 5
+			pool.note_off(64)
+			self.assertIs(pool.note_on(65),first)
+			self.assertEqual(sorted(pool._held),[62,65])
+			self.assertEqual(pool.busy_voices(),2)
+		zook.spork(player())
+		zook.run()
+
+
+	def test_steal_quietest(self):
+		# 	with every voice busy, the one whose envelope is lowest is
+		#	.. stolen
+		zook = self.shreduler
+		pool = VoicePool(SineVoice,2,steal="quietest")
+		out  = PassThru()
+		pool >> out
+		zook.add_sink(out)
+		def player():
+			first  = pool.note_on(60)
+			yield 30
+			second = pool.note_on(62)
+			yield 2
+			self.assertLess(second.level(),first.level())
+			self.assertIs(pool.note_on(64),second)
+			self.assertEqual(sorted(pool._held),[60,64])
+		zook.spork(player())
+		zook.run()
+
+
+	def test_reuse_before_reap(self):
+		# 	a voice that goes quiet is reused by a note that starts before
+		#	.. its reaper runs;  the reaper must then leave it alone
+		zook = self.shreduler
+		pool = VoicePool(SineVoice,1)
+		out  = PassThru()
+		pool >> out
+		zook.add_sink(out)
+		def player():
+			voice = pool.note_on(60)
+			yield 50
+			pool.note_off(60)
+			yield 100
+			self.assertIs(pool.note_on(62),voice)
+			yield 1
+			self.assertEqual(pool.busy_voices(),1)
+			self.assertEqual(pool._idle,[])
+			self.assertEqual(pool._held,{62:[voice]})
+		zook.spork(player())
+		zook.run()
+
+
+class TestRawOut(ShredulerTestCase):
+
+	def test_int16(self):
+		# 	samples are scaled and clipped as in WavOut, and written in
+		#	.. chunks
+		f   = StringIO()
+		out = RawOut(f,chunkFrames=2)
+		for sample in [0.0,0.5,-0.5,2.0,-2.0]: out.tick(sample)
+		self.assertEqual(f.getvalue(),struct_pack("<4h",0,16383,-16383,32767))
+		out.close()
+		self.assertEqual(f.getvalue(),struct_pack("<5h",0,16383,-16383,32767,-32767))
+		self.assertEqual(out.stats()["chunks"],3)
+		self.assertEqual(out.stats()["bytes"],10)
+
+
+	def test_formats(self):
+		# 	24-bit samples are three bytes each;  stereo is interleaved;
+		#	.. float samples are not clipped
+		f   = StringIO()
+		out = RawOut(f,sampleFormat="int24",channels=2)
+		out.tick(1.0,-1.0)
+		out.close()
+		self.assertEqual(f.getvalue(),"\xff\xff\x7f\x01\x00\x80")
+
+		f   = StringIO()
+		out = RawOut(f,sampleFormat="float32")
+		out.tick(1.5)
+		out.close()
+		self.assertEqual(f.getvalue(),struct_pack("<f",1.5))
+		self.assertRaises(UGenError,RawOut,StringIO(),sampleFormat="int12")
+
+
+	def test_threaded(self):
+		# 	a writer thread produces the same bytes
+		samples = [0.001*ix for ix in xrange(-500,500)]
+		streams = []
+		for threaded in [False,True]:
+			f   = StringIO()
+			out = RawOut(f,sampleFormat="int32",chunkFrames=64,threaded=threaded,queueChunks=2)
+			for sample in samples: out.tick(sample)
+			out.close()
+			self.assertEqual(out.stats()["chunks"],16)
+			streams += [f.getvalue()]
+		self.assertEqual(len(streams[0]),4*len(samples))
+		self.assertEqual(streams[0],streams[1])
+
+
+	def test_writer_error(self):
+		# 	a failure in the writer thread is reported to the renderer
+		f   = StringIO()
+		out = RawOut(f,chunkFrames=1,threaded=True)
+		f.close()
+		out.tick(0.5)
+		self.assertRaises(UGenError,out.close)
+
+
+class TestTextOut(ShredulerTestCase):
+
+	def test_order(self):
+		# 	lines are written in batches, but stay in order with what
+		#	.. shreds write to the same file
+		f   = StringIO()
+		out = TextOut(filename=f,name="out")
+		self.shreduler.add_sink(out)
+		PassThru(bias=0.5) >> out
+		def shred():
+			for mark in ["a","b","c"]:
+				yield 2
+				f.write("%s\n" % mark)
+		self.shreduler.spork(shred())
+		self.shreduler.run()
+		self.assertEqual(f.getvalue(),"1\t0.5\n2\t0.5\na\n"
+		                            + "3\t0.5\n4\t0.5\nb\n"
+		                            + "5\t0.5\n6\t0.5\nc\n")
+
+
+	def test_lazy_sink(self):
+		# 	a lazySink TextOut (like the consoles) joins the current
+		#	.. shreduler's sinks only when something is connected to it
+		f   = StringIO()
+		out = TextOut(filename=f,lazySink=True)
+		self.assertEqual(self.shreduler.sinks,[])
+		PassThru(bias=0.25) >> out
+		self.assertEqual(self.shreduler.sinks,[out])
+		def shred(): yield 2
+		self.shreduler.spork(shred())
+		self.shreduler.run()
+		self.assertEqual(f.getvalue(),"1\t0.25\n2\t0.25\n")
+		self.assertTrue(console not in zook.sinks)
+
+
+	def test_stereo(self):
+		# 	the third column is the second channel
+		f   = StringIO()
+		out = TextOut(filename=f,channels=2,chunkFrames=2)
+		for (s1,s2) in [(0.25,-0.25),(0.5,-0.5),(1,2)]: out.tick(s1,s2)
+		self.assertEqual(f.getvalue(),"1\t0.25\t-0.25\n2\t0.5\t-0.5\n")
+		out.flush()
+		self.assertEqual(f.getvalue(),"1\t0.25\t-0.25\n2\t0.5\t-0.5\n3\t1\t2\n")
+
+
+	def test_binary(self):
+		# 	raw doubles, or a .npy file whose header tracks its length
+		f   = StringIO()
+		out = BinaryOut(f,channels=2)
+		out.tick(0.25,-1.5)
+		out.close()
+		self.assertEqual(f.getvalue(),struct_pack("<2d",0.25,-1.5))
+
+		f   = StringIO()
+		out = BinaryOut(f,npy=True,sampleFormat="float32",chunkFrames=2)
+		for sample in [1.0,2.0,3.0]: out.tick(sample)
+		self.assertEqual(self.npy_header(f.getvalue())["shape"],(2,))
+		out.flush()
+		data = f.getvalue()
+		header = self.npy_header(data)
+		self.assertEqual((header["descr"],header["shape"]),("<f4",(3,)))
+		self.assertEqual(len(data) % 64,12)
+		self.assertEqual(data[128:],struct_pack("<3f",1.0,2.0,3.0))
+		self.assertRaises(UGenError,BinaryOut,None,npy=True)
+
+
+	def npy_header(self,data):
+		self.assertEqual(data[:8],"\x93NUMPY\x01\x00")
+		(headerLen,) = struct.unpack("<H",data[8:10])
+		self.assertEqual(10+headerLen,128)
+		return ast.literal_eval(data[10:10+headerLen])
+
+
+class TestAsyncWriter(ShredulerTestCase):
+
+	def setUp(self):
+		super(TestAsyncWriter,self).setUp()
+		self.directory = mkdtemp()
+
+	def tearDown(self):
+		super(TestAsyncWriter,self).tearDown()
+		rmtree(self.directory)
+
+
+	def test_wav_and_text(self):
+		# 	threaded WavOut and TextOut write the same as unthreaded
+		outputs = []
+		for threaded in [False,True]:
+			self.shreduler.reset()
+			filename = os.path.join(self.directory,"%s.wav" % threaded)
+			wav  = WavOut(filename=filename,channels=2,threaded=threaded,chunkFrames=100)
+			text = TextOut(filename=StringIO(),threaded=threaded,chunkFrames=100)
+			self.shreduler.add_sink(text)
+			osc  = SinOsc(freq=440,gain=1.2)
+			osc >> Pan() >> wav
+			osc >> text
+			for _ in xrange(1050): self.shreduler.run_sample_pipe()
+			text.flush()
+			textValue = text.file.getvalue()
+			wav.close()
+			f = open(filename,"rb")
+			outputs += [(f.read(),textValue)]
+			f.close()
+		self.assertEqual(outputs[0],outputs[1])
+		self.assertEqual(len(outputs[0][1].splitlines()),1050)
+
+
+	def test_back_pressure(self):
+		# 	a slow writer makes put() wait once the queue is full;  flush()
+		#	.. waits for all the chunks
+		written = []
+		def slow_write(chunk):
+			time.sleep(0.01)
+			written.append(chunk)
+		writer = AsyncWriter("slow",slow_write,maxChunks=1)
+		for ix in xrange(5): writer.put(ix)
+		writer.flush()
+		self.assertEqual(written,[0,1,2,3,4])
+		self.assertEqual(writer.blocked >= 1,True)
+		writer.close()
+
+
+	def test_error(self):
+		# 	a write error is reported by the next put(), and stops the
+		#	.. shreduler's run when it comes from a sink
+		def bad_write(chunk): raise IOError("disk full")
+		writer = AsyncWriter("bad",bad_write)
+		writer.put(1)
+		self.assertRaises(UGenError,writer.flush)
+		writer.close()
+
+		wav = WavOut(filename=os.path.join(self.directory,"bad.wav"),
+		             threaded=True,chunkFrames=10)
+		SinOsc(gain=1) >> wav
+		wav.wavFile.file.close()
+		def shred(): yield 100
+		self.shreduler.spork(shred())
+		self.assertRaises(UGenError,self.shreduler.run)
+
+
+class TestWavFile(ShredulerTestCase):
+
+	def setUp(self):
+		super(TestWavFile,self).setUp()
+		self.directory = mkdtemp()
+
+	def tearDown(self):
+		super(TestWavFile,self).tearDown()
+		rmtree(self.directory)
+
+
+	def test_round_trip(self):
+		# 	every format reads back what was written, to its resolution
+		samples = [0.0,0.5,-0.5,1.0,-1.0,0.123456789,-0.987654321,0.25]
+		for (sampleFormat,places) in [("int8",1),("int16",4),("int24",6),
+		                              ("int32",9),("float32",7),("float64",15)]:
+			f = StringIO()
+			write_wav(f,2,44100,samples,sampleFormat)
+			f.seek(0)
+			(channels,samplingRate,readFormat,readSamples) = read_wav(f)
+			self.assertEqual((channels,samplingRate,readFormat),(2,44100,sampleFormat))
+			self.assertEqual(len(readSamples),len(samples))
+			for (expected,actual) in zip(samples,readSamples):
+				self.assertAlmostEqual(actual,expected,places=places)
+
+
+	def test_headers(self):
+		# 	16-bit files are just as python's wave module writes them;
+		#	.. 24-bit and float files are WAVE_FORMAT_EXTENSIBLE;  8-bit
+		#	.. samples are unsigned
+		f = StringIO()
+		write_wav(f,1,44100,[0.5,-0.5,2.0])
+		expected = StringIO()
+		waveFile = wave.open(expected,"wb")
+		waveFile.setparams((1,2,44100,3,"NONE","not compressed"))
+		waveFile.writeframes(struct_pack("<3h",16383,-16383,32767))
+		self.assertEqual(f.getvalue(),expected.getvalue())
+
+		for sampleFormat in ["int24","float32"]:
+			f = StringIO()
+			write_wav(f,1,48000,[0.5],sampleFormat)
+			(formatTag,) = struct.unpack("<H",f.getvalue()[20:22])
+			self.assertEqual(formatTag,0xFFFE)
+
+		f = StringIO()
+		write_wav(f,1,44100,[0.0,1.0,-1.0],"int8")
+		self.assertEqual(f.getvalue()[-4:],"\x80\xff\x01\x00")
+
+
+	def test_wav_out_and_clip(self):
+		# 	a 24-bit stereo WavOut, read back by a Clip
+		filename = os.path.join(self.directory,"out24.wav")
+		out = WavOut(filename=filename,channels=2,sampleWidth=3)
+		osc = SinOsc(freq=440,gain=0.8)
+		osc >> Pan() >> out
+		left = []
+		for _ in xrange(500):
+			self.shreduler.run_sample_pipe()
+			left += [out.last]
+		out.close()
+		clip = Clip(filename)
+		self.assertEqual(clip.outChannels,2)
+		self.assertEqual(len(clip),500)
+		for (ix,expected) in enumerate(left):
+			self.assertAlmostEqual(clip._buffer[ix],expected,places=6)
+		self.assertRaises(UGenError,WavOut,filename=filename,sampleWidth=5)
+
+
+class TestRenderCache(ShredulerTestCase):
+
+	def setUp(self):
+		super(TestRenderCache,self).setUp()
+		self.directory = mkdtemp()
+		self.filename  = os.path.join(self.directory,"render.wav")
+		self.cache     = RenderCache(os.path.join(self.directory,"cache"))
+
+	def tearDown(self):
+		super(TestRenderCache,self).tearDown()
+		rmtree(self.directory)
+
+
+	def test_cache_hit(self):
+		self.assertEqual(self.cache.render(self.program(440)),False)
+		rendered = self.read_output()
+		self.assertEqual(self.cache.render(self.program(440)),True)
+		self.assertEqual(self.read_output(),rendered)
+
+
+	def test_schedule_change(self):
+		# 	the same graph, but a change comes at a different time
+		self.assertEqual(self.cache.render(self.program(440)),False)
+		self.assertEqual(self.cache.render(self.program(440,changeAt=30)),False)
+		self.assertEqual(self.cache.render(self.program(550)),False)
+		self.assertEqual(self.cache.render(self.program(440,changeAt=30)),True)
+
+
+	def test_eviction(self):
+		self.cache.maxBytes = 1
+		self.assertEqual(self.cache.render(self.program(440)),False)
+		self.assertEqual(self.cache.render(self.program(550)),False)
+		self.assertEqual(self.cache.render(self.program(550)),True)
+		self.assertEqual(self.cache.render(self.program(440)),False)
+
+
+	def program(self,freq,changeAt=20):
+		shreduler = self.shreduler
+		filename  = self.filename
+		def shred():
+			output = WavOut(filename=filename)
+			osc = SinOsc(freq=freq,gain=0.5)
+			osc >> output
+			yield changeAt
+			osc.freq = 2*freq
+			yield 50
+			output.close()
+		return lambda: shreduler.spork(shred())
+
+	def read_output(self):
+		f = open(self.filename,"rb")
+		data = f.read()
+		f.close()
+		return data
+
+
+class TestSerialize(ShredulerTestCase):
+
+	def test_round_trip(self):
+		# 	a loaded copy of a graph (feeds with channel routing, driven
+		#	.. controls, a UGraph, a running envelope) tracks the original
+		out = self.build_graph()
+		self.run_samples(50)
+		(copy,)  = loads(dumps([out]))
+		(copy2,) = loads(dumps([out],binary=True))
+		self.assertEqual(copy.name,"out")
+		self.assertNotEqual(copy.id,out.id)
+		self.assertEqual(copy in self.shreduler.sinks,True)
+		for _ in xrange(500):
+			self.shreduler.run_sample_pipe()
+			self.assertEqual((copy.last,copy.last2),(out.last,out.last2))
+			self.assertEqual((copy2.last,copy2.last2),(out.last,out.last2))
+
+
+	def test_unsavable(self):
+		# 	a TextOut writing to a file object can't be saved
+		out = TextOut(filename=StringIO(),name="out")
+		SinOsc(name="osc") >> out
+		self.assertRaises(SerializeError,dumps,[out])
+
+
+	def build_graph(self):
+		lfo   = SinOsc(name="lfo",freq=3,gain=50,bias=440)
+		osc   = TriOsc(name="osc",duty=0.3)
+		lfo >> osc["freq"]
+		envy  = ADSR(name="envy",adsr=(20.0,100.0,0.5,100.0))
+		echo  = Echo(name="echo",delay=37,mix=0.3)
+		pan   = Pan(name="pan",pan=-0.25)
+		noise = Noise(name="noise",gain=0.1,seed=7)
+		out   = PassThru(name="out",channels=2)
+		osc >> envy >> echo >> pan >> out
+		noise >> out["right"]
+		self.shreduler.add_sink(out)
+		envy.key_on(0.8)
+		return out
+
+	def run_samples(self,numSamples):
+		for _ in xrange(numSamples): self.shreduler.run_sample_pipe()
+
+
+class TestClone(ShredulerTestCase):
+
+	def test_clone_graph(self):
+		# 	clones of a voice, played the same way, sound the same as the
+		#	.. original, and share none of its ugens
+		out   = PassThru(name="out")
+		self.shreduler.add_sink(out)
+		voice = TwoSawVoice()
+		voice >> out
+		clones = [voice.clone() for _ in xrange(3)]
+		for clone in clones:
+			clone >> out
+			self.assertEqual(set(clone.members()) & set(voice.members()),set())
+		for v in [voice] + clones: v.envy.key_on(0.7)
+		for _ in xrange(300):
+			self.shreduler.run_sample_pipe()
+			for clone in clones:
+				self.assertEqual(clone.outlet.last,voice.outlet.last)
+		self.assertNotEqual(voice.outlet.last,0.0)
+
+
+	def test_shared_inputs(self):
+		# 	src >> echo;  a clone of echo listens to src only if inputs
+		#	.. are shared
+		src  = SinOsc(name="src")
+		echo = Echo(name="echo",delay=10)
+		src >> echo
+		shared  = echo.clone()
+		private = echo.clone(shareInputs=False)
+		self.assertEqual(src in shared._mixer.dependencies(),True)
+		self.assertEqual(src in private._mixer.dependencies(),False)
+		self.assertEqual(shared._echo in shared._mixer.dependencies(),True)
+		self.assertEqual(echo._echo in shared._mixer.dependencies(),False)
+
+
+class TwoSawVoice(UGraph):
+
+	def __init__(self):
+		super(TwoSawVoice,self).__init__(name="voice")
+		lfo  = SinOsc(name="lfo",freq=5,gain=3,bias=220)
+		saw1 = SawOsc(name="saw1",gain=0.5)
+		saw2 = SawOsc(name="saw2",gain=0.5,freq=221)
+		filt = LowPass(name="filt",freq=800)
+		self.envy = ADSR(name="envy",adsr=(20.0,50.0,0.5,50.0))
+		lfo >> saw1["freq"]
+		saw1 >> filt
+		saw2 >> filt >> self.envy
+		self.outlet = self.envy
+
+	def members(self):
+		# (everything the outlet depends on)
+		members = {}
+		pending = [self.outlet]
+		while (pending != []):
+			node = pending.pop()
+			members[node] = True
+			pending += [n for n in node.dependencies() if (n not in members)]
+		return members.keys()
+
+
+class TestCheckpoint(ShredulerTestCase):
+
+	def setUp(self):
+		super(TestCheckpoint,self).setUp()
+		self.directory = mkdtemp()
+		self.filename  = os.path.join(self.directory,"render.wav")
+		self.checkName = os.path.join(self.directory,"render.checkpoint")
+
+	def tearDown(self):
+		super(TestCheckpoint,self).tearDown()
+		rmtree(self.directory)
+
+
+	def test_resume(self):
+		# 	a render interrupted after a checkpoint, then resumed, gives
+		# 	the same .wav file as one that runs straight through
+		self.check_resume(threaded=False)
+
+
+	def test_resume_threaded(self):
+		# 	.. also when the .wav file is written by a writer thread
+		self.check_resume(threaded=True)
+
+
+	def test_resume_envelope(self):
+		# 	.. also when an envelope segment spans a checkpoint (the
+		#	.. envelope's interpolator is rebuilt from its restored state)
+		self.check_resume(threaded=False,program=self.envelope_program)
+
+
+	def test_raw_out(self):
+		# 	a raw stream can't be cut back to a checkpoint, so a render
+		#	.. that writes to one is refused rather than resumed silently
+		#	.. without it
+		rawName = os.path.join(self.directory,"render.raw")
+		self.fresh_process()
+		shreduler = self.shreduler
+		def shred():
+			output = RawOut(stream=rawName)
+			SinOsc(gain=0.5) >> output
+			yield 3000
+			output.close()
+		def program():
+			shreduler.spork(shred())
+		checkpointer = Checkpointer(self.checkName,500)
+		self.assertRaises(CheckpointError,checkpointer.render,program)
+		self.assertEqual(os.path.exists(self.checkName),False)
+
+
+	def check_resume(self,threaded,program=None):
+		if (program == None): program = self.program
+		self.fresh_process()
+		program(abortAt=None)()
+		self.shreduler.run()
+		expected = self.read_output()
+
+		self.fresh_process()
+		checkpointer = Checkpointer(self.checkName,500)
+		self.assertRaises(Abort,checkpointer.render,program(abortAt=1700,threaded=threaded))
+		self.assertEqual(os.path.exists(self.checkName),True)
+
+		self.fresh_process()
+		checkpointer = Checkpointer(self.checkName,500)
+		self.assertEqual(checkpointer.render(program(abortAt=None,threaded=threaded)),True)
+		self.assertEqual(os.path.exists(self.checkName),False)
+		self.assertEqual(self.read_output(),expected)
+
+
+	def fresh_process(self):
+		# 	as far as ugen ids and random numbers are concerned
+		gc.collect()
+		UGen.lastId = 0
+		random.seed(1)
+		self.shreduler = Shreduler()
+		UGen.set_shreduler(self.shreduler)
+
+	def program(self,abortAt,threaded=False):
+		shreduler = self.shreduler
+		filename  = self.filename
+		def shred():
+			output = WavOut(filename=filename,threaded=threaded,chunkFrames=128)
+			osc = SinOsc(gain=0.5)
+			osc >> LowPass(freq=1000) >> output
+			for _ in xrange(10):
+				osc.freq = random.uniform(200,800)
+				yield 300
+			output.close()
+		def aborter():
+			yield 1700
+			if (abortAt != None): raise Abort
+		def program():
+			shreduler.spork(shred())
+			shreduler.spork(aborter())
+		return program
+
+	def envelope_program(self,abortAt,threaded=False):
+		shreduler = self.shreduler
+		filename  = self.filename
+		def shred():
+			output = WavOut(filename=filename,threaded=threaded,chunkFrames=128)
+			envy = ADSR(adsr=(200.0,200.0,0.5,2000.0))
+			SinOsc(freq=440,gain=1) >> envy >> output
+			envy.key_on()
+			yield 1000
+			envy.key_off()
+			yield 3000
+			output.close()
+		def aborter():
+			yield 1700
+			if (abortAt != None): raise Abort
+		def program():
+			shreduler.spork(shred())
+			shreduler.spork(aborter())
+		return program
+
+	def read_output(self):
+		f = open(self.filename,"rb")
+		data = f.read()
+		f.close()
+		return data
+
+
+class TestMidi(ShredulerTestCase):
+
+	def test_read_file(self):
+		# 	two tracks, a tempo change, running status, and a note on with
+		#	.. velocity zero (a note off)
+		midiFile = MidiFile(StringIO(self.score()))
+		self.assertEqual(midiFile.format,1)
+		self.assertEqual(midiFile.numTracks,2)
+		self.assertEqual(midiFile.events,
+		                 [(0.0, "note on", 0,60,100),
+		                  (0.0, "control", 1,7, 90),
+		                  (0.5, "note off",0,60,0),
+		                  (0.5, "note on", 0,64,80),
+		                  (0.75,"note off",0,64,64),
+		                  (1.0, "note on", 1,48,127),
+		                  (1.25,"pitch bend",1,-8192,None),
+		                  (1.5, "note off",1,48,0)])
+		self.assertEqual(midiFile.duration,1.5)
+
+
+	def test_not_midi(self):
+		self.assertRaises(MidiError,MidiFile,StringIO("RIFF....WAVE"))
+
+
+	def test_play(self):
+		# 	notes go to the channel's instrument, at the right sample
+		#	.. times;  other events go to the handler
+		zook = self.shreduler
+		lead = FakeInstrument(zook)
+		bass = FakeInstrument(zook)
+		other = []
+		def handler(kind,channel,data1,data2):
+			other.append((zook.now(),kind,channel,data1))
+		player = MidiPlayer(MidiFile(StringIO(self.score())),
+		                    instruments={0:lead,None:bass},handler=handler)
+		def starter():
+			yield 100
+			zook.spork(player.play())
+		zook.spork(starter())
+		zook.run()
+		sec = zook.sec
+		self.assertEqual(lead.log,[(100,"on",60,100/127.0),
+		                           (100+0.5*sec,"off",60,None),
+		                           (100+0.5*sec,"on",64,80/127.0),
+		                           (100+0.75*sec,"off",64,None)])
+		self.assertEqual(bass.log,[(100+1.0*sec,"on",48,1.0),
+		                           (100+1.5*sec,"off",48,None)])
+		self.assertEqual(other,[(100,"control",1,7),
+		                        (100+1.25*sec,"pitch bend",1,-8192)])
+
+
+	def test_note_table(self):
+		# 	table lookups agree with the formula, for whole and fractional
+		#	.. notes, one at a time or a sequence at once
+		self.assertAlmostEqual(midi_to_freq(69),440.0,places=9)
+		self.assertAlmostEqual(midi_to_freq(81),880.0,places=9)
+		notes = [0,60,60.5,127,130]
+		self.assertEqual(list(midi_to_freqs(notes)),[midi_to_freq(n) for n in notes])
+
+
+	def test_tuning(self):
+		# 	equal temperament matches midi_to_freq;  just intonation in D
+		#	.. has a pure fifth above D, and still has A at 440
+		equal = Tuning(equalCents)
+		for n in [0,33,60,60.25,69,127,140]:
+			self.assertAlmostEqual(equal.freq(n)/midi_to_freq(n),1.0,places=12)
+		just = Tuning(justCents,tonic=62)
+		self.assertAlmostEqual(just.freq(69),440.0,places=9)
+		self.assertAlmostEqual(just.freq(69)/just.freq(62),1.5,places=12)
+		self.assertAlmostEqual(just.freq(74)/just.freq(62),2.0,places=12)
+		self.assertEqual(list(just.freqs([62,69])),[just.freq(62),just.freq(69)])
+		self.assertRaises(ValueError,Tuning,[100.0,200.0])
+
+
+	def test_scale_memo(self):
+		# 	repeated scales are equal, but each caller gets its own list
+		a = build_scale("ii",60,(2,5))
+		self.assertEqual(a,[None,None,63,65,67,69])
+		a[2] = 0
+		self.assertEqual(build_scale("dorian",60,(2,5)),[None,None,63,65,67,69])
+		self.assertEqual(build_scale("ii",60,(2,5)),[None,None,63,65,67,69])
+		self.assertRaises(ValueError,build_scale,"bogus",60,3)
+
+
+	def score(self):
+		# track 0: tempo 120 bpm, then 240 bpm at tick 480;  note 60 for a
+		# quarter, note 64 (running status) for a quarter at the new tempo
+		# track 1: volume control, then note 48 at tick 1440, with a pitch
+		# bend in between;  480 ticks per quarter note
+		def track(body):
+			return "MTrk" + struct_pack(">L",len(body)) + body
+		track0 = "\x00\xFF\x51\x03\x07\xA1\x20" \
+		       + "\x00\x90\x3C\x64" \
+		       + "\x83\x60\xFF\x51\x03\x03\xD0\x90" \
+		       + "\x00\x90\x3C\x00" \
+		       + "\x00\x40\x50" \
+		       + "\x83\x60\x80\x40\x40" \
+		       + "\x00\xFF\x2F\x00"
+		track1 = "\x00\xB1\x07\x5A" \
+		       + "\x8B\x20\x91\x30\x7F" \
+		       + "\x83\x60\xE1\x00\x00" \
+		       + "\x83\x60\x91\x30\x00" \
+		       + "\x00\xFF\x2F\x00"
+		header = "MThd" + struct_pack(">LHHH",6,1,2,480)
+		return header + track(track0) + track(track1)
+
+
+class TestContext(ShredulerTestCase):
+
+	def test_session(self):
+		# 	ugens created in a context get its ids and sampling rate, and
+		#	.. everything is put back when the context is left
+		lastId = UGen.lastId
+		context = Context(samplingRate=22050)
+		with context:
+			self.assertTrue(UGen.shreduler is context.shreduler)
+			self.assertEqual(UGen.samplingRate,22050)
+			self.assertEqual(UGen.debug,{})
+			osc = SinOsc()
+			self.assertEqual(osc.id,1)
+			self.assertTrue(UGen.instances[1] is osc)
+		self.assertTrue(UGen.shreduler is self.shreduler)
+		self.assertEqual(UGen.samplingRate,44100)
+		self.assertEqual(UGen.lastId,lastId)
+		self.assertTrue("stifle ids" in UGen.debug)
+		with context:
+			self.assertEqual(SinOsc().id,2)
+
+
+	def test_interleaved(self):
+		# 	two contexts running by turns render the same as each alone
+		(alone,_) = self.render(Context())
+		(first,second) = (Context(),Context())
+		(f1,program1) = self.program()
+		(f2,program2) = self.program()
+		first.run(program1,activations=0)
+		second.run(program2,activations=0)
+		for steps in range(1,12):
+			first.run(activations=steps)
+			second.run(activations=steps)
+		self.assertEqual(f1.getvalue(),alone)
+		self.assertEqual(f2.getvalue(),alone)
+
+
+	def test_threads(self):
+		# 	contexts rendering in several threads don't interfere
+		from threading import Thread
+		(alone,_) = self.render(Context())
+		results = [None] * 4
+		def worker(ix):
+			results[ix] = self.render(Context())
+		threads = [Thread(target=worker,args=(ix,)) for ix in range(4)]
+		for thread in threads: thread.start()
+		for thread in threads: thread.join()
+		for (text,firstId) in results:
+			self.assertEqual(text,alone)
+			self.assertEqual(firstId,1)
+		self.assertTrue(UGen.shreduler is self.shreduler)
+
+
+	def program(self,ids=None):
+		f = StringIO()
+		def program():
+			shreduler = UGen.shreduler
+			osc = SinOsc(freq=shreduler.samplingRate/8.0,gain=1)
+			osc >> TextOut(filename=f,lazySink=True)
+			def shred():
+				for ix in range(10): yield 3
+			shreduler.spork(shred())
+			if (ids != None): ids.append(osc.id)
+		return (f,program)
+
+	def render(self,context):
+		ids = []
+		(f,program) = self.program(ids)
+		context.run(program)
+		return (f.getvalue(),ids[0])
+
+
+class TestRealtime(ShredulerTestCase):
+
+	def new_shreduler(self):
+		return Shreduler(samplingRate=8000)
+
+
+	def test_run_until(self):
+		# 	run_until generates samples up to a clock, with or without shreds
+		f   = StringIO()
+		out = TextOut(filename=f,lazySink=True)
+		PassThru(bias=0.5) >> out
+		log = []
+		def shred():
+			yield 2.5
+			log.append(self.shreduler.clock())
+		self.shreduler.spork(shred())
+		self.shreduler.run_until(2)
+		self.assertEqual((self.shreduler.clock(),log),(2,[]))
+		self.shreduler.run_until(4)
+		self.assertEqual((self.shreduler.clock(),log),(4,[2]))
+		self.assertEqual(f.getvalue(),"1\t0.5\n2\t0.5\n3\t0.5\n4\t0.5\n")
+
+
+	def test_driver(self):
+		# 	the driver keeps pace with the wall clock, and messages (posted
+		#	.. or sent to its socket) start shreds in sample time
+		from threading import Timer
+		import socket
+		driver = RealtimeDriver(lookAhead=0.05,blockFrames=200)
+		out = TextOut(filename=StringIO(),lazySink=True)
+		PassThru(bias=0.5) >> out
+		heard = []
+		def poke(what):
+			heard.append((what,self.shreduler.clock()))
+			yield 10
+			heard.append(("later",self.shreduler.clock()))
+		sock = driver.listen(("127.0.0.1",0),poke)
+		sender = socket.socket(socket.AF_INET,socket.SOCK_DGRAM)
+		timers = [Timer(0.05,driver.post,(poke,"posted")),
+		          Timer(0.10,sender.sendto,("sent",sock.getsockname()))]
+		for timer in timers: timer.start()
+		startTime = time.time()
+		driver.run(duration=0.3)
+		elapsed = time.time() - startTime
+		for timer in timers: timer.join()
+		sender.close()
+		driver.close()
+
+		self.assertEqual(self.shreduler.clock(),2400)
+		self.assertTrue(0.2 <= elapsed < 0.6)
+		self.assertEqual([what for (what,_) in heard],["posted","later","sent","later"])
+		self.assertEqual(heard[1][1],heard[0][1]+10)
+		for (what,clock) in heard[::2]: self.assertEqual(clock % 200,0)
+		stats = driver.stats()
+		self.assertEqual(stats["blocks"],12)
+		self.assertEqual(stats["messages"],2)
+		self.assertTrue(stats["maxLatency"] < 0.05 + 0.025 + 0.05)
+
+
+class TestEvents(ShredulerTestCase):
+
+	def test_signal_and_broadcast(self):
+		# 	signal wakes the longest waiting shred, broadcast wakes the rest,
+		#	.. and each learns which event woke it
+		zook = self.shreduler
+		(ev,other) = (Event(name="ev"),Event(name="other"))
+		log = []
+		def waiter(name):
+			fired = yield [other,ev]
+			log.append((name,zook.now(),str(fired),fired.value))
+		def firer():
+			yield 10
+			self.assertEqual(ev.waiting(),3)
+			self.assertEqual(ev.signal("first"),1)
+			yield 10
+			self.assertEqual(ev.broadcast("rest"),2)
+			self.assertEqual(ev.signal(),0)
+		for name in ["a","b","c"]: zook.spork(waiter(name))
+		zook.spork(firer())
+		zook.run()
+		self.assertEqual(log,[("a",10,"ev","first"),("b",20,"ev","rest"),("c",20,"ev","rest")])
+		# 	(each waiter ran twice and the firer three times;  the waiters
+		#	.. weren't polled)
+		self.assertEqual(zook.activations,9)
+
+
+	def test_timeout(self):
+		# 	a timeout wakes the shred with None;  a timeout cancelled by an
+		#	.. event neither wakes the shred nor prolongs the run
+		zook = self.shreduler
+		ev  = Event()
+		log = []
+		def waiter():
+			fired = yield [ev,5]
+			log.append((zook.now(),fired))
+			fired = yield (ev,("absolute",100))
+			log.append((zook.now(),fired))
+		def firer():
+			yield 7
+			ev.broadcast()
+		zook.spork(waiter())
+		zook.spork(firer())
+		zook.run()
+		self.assertEqual(log,[(5,None),(7,ev)])
+		self.assertEqual(zook.clock(),7)
+		self.assertEqual(zook.pending_shreds(),0)
+
+
+	def test_join(self):
+		# 	a shred can wait for the shreds it sporks, whether or not they
+		#	.. have already finished
+		zook = self.shreduler
+		log  = []
+		def child(duration):
+			yield duration
+		def parent():
+			children = [zook.spork(child(d)) for d in [30,10,20]]
+			yield 15
+			for shredId in children:
+				yield zook.finished(shredId)
+				log.append((shredId,zook.now()))
+		zook.spork(parent())
+		zook.run()
+		self.assertEqual([when for (_,when) in log],[30,30,30])
+
+
+	def test_spin_on_finished(self):
+		# 	waiting again and again for an event that has already fired
+		#	.. never lets time advance, so it is caught like yield 0 is
+		zook = self.shreduler
+		def child():
+			yield 10
+		def parent():
+			childId = zook.spork(child())
+			yield 20
+			while (True):
+				yield zook.finished(childId)
+		zook.spork(parent())
+		self.assertRaises(ShredulerError,zook.run)
+		self.assertEqual(zook.clock(),20)
+
+
+	def test_fired_events_in_a_row(self):
+		# 	waiting for different latched events that have already fired,
+		#	.. one after another, is not a spin (even if they share a name)
+		zook = self.shreduler
+		a = Event(latched=True)
+		b = Event(latched=True)
+		log = []
+		def shred():
+			a.broadcast()
+			b.broadcast()
+			log.append((yield a))
+			log.append((yield b))
+		zook.spork(shred())
+		zook.run()
+		self.assertEqual(log,[a,b])
+
+
+	def test_bad_yield(self):
+		# 	a wait needs at least one event, and at most one time
+		zook = self.shreduler
+		def shred(waitFor):
+			yield waitFor
+		for waitFor in [[],[5],[Event(),5,6],[Event(),"x"]]:
+			zook.reset()
+			zook.spork(shred(waitFor))
+			self.assertRaises(ShredulerError,zook.run)
+
+
+class FakeInstrument(object):
+
+	def __init__(self,shreduler):
+		self.shreduler = shreduler
+		self.log       = []
+
+	def note_on(self,note,velocity):
+		self.log.append((self.shreduler.now(),"on",note,velocity))
+
+	def note_off(self,note):
+		self.log.append((self.shreduler.now(),"off",note,None))
+
+
+class Abort(Exception): pass
+
+
 if __name__ == "__main__": unittest.main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from random            import seed as random_seed,uniform as urandom
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen,PassThru
+from pazookle.generate import SawOsc,SinOsc
+from pazookle.envelope import ADSR
+from pazookle.filter   import LowPass
+from pazookle.buffer   import Freeverb,freeze,unfreeze
+from pazookle.output   import WavOut
+from pazookle.midi     import midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>       random number generator seed
+  --gain=<value>        set the gain
+  --nofreeze            render the pad live, rather than freezing it
+  --loop=<seconds>      freeze only this much of the pad, and loop it
+  --unfreeze=<seconds>  time at which to unfreeze the pad
+  --quarter=<seconds>   length of a quarter note
+  --duration=<seconds>  length of the test""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,doFreeze,loopTime,unfreezeTime,quarterNote
+
+	# parse the command line
+
+	gain         = 0.5
+	doFreeze     = True
+	loopTime     = None
+	unfreezeTime = None
+	quarterNote  = 0.25 * zook.sec
+	duration     = 4.0
+	debug        = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg == "--nofreeze"):
+			doFreeze = False
+		elif (arg.startswith("L=")) or (arg.startswith("--loop=")):
+			loopTime = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("U=")) or (arg.startswith("--unfreeze=")):
+			unfreezeTime = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("Q=")) or (arg.startswith("--quarter=")):
+			quarterNote = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(freeze_test(duration*zook.sec))
+	zook.run()
+
+
+def freeze_test(duration):
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=2)
+	master = PassThru(channels=2,gain=gain)
+	master >> output
+
+	# create a static pad, a chord of detuned saws through a filter and a
+	# reverb;  this is the expensive part, so we freeze it
+
+	pad = PassThru(gain=0.5)
+	for note in [48,55,60,64,67]:
+		for detune in [-0.08,0.08]:
+			SawOsc(freq=midi_to_freq(note+detune),gain=0.1) >> pad
+	reverb = Freeverb(roomSize=0.8,mix=0.4)
+	pad >> LowPass(freq=1200,Q=1) >> reverb >> master
+
+	if (doFreeze):
+		if (loopTime == None): frozen = freeze(reverb,duration+zook.sec)
+		else:                  frozen = freeze(reverb,loopTime,loop=True)
+		print >>stderr, "froze %s into %s" % (reverb,frozen)
+		if (unfreezeTime != None):
+			zook.spork(unfreezer(frozen,unfreezeTime))
+
+	# play a melody over the pad, live
+
+	voice = SinOsc(gain=1)
+	envy  = ADSR(adsr=(5*zook.msec,50*zook.msec,0.3,50*zook.msec))
+	voice >> envy >> master
+
+	startTime = now()
+	while (now() < startTime + duration):
+		noteStart = now()
+		voice.freq = midi_to_freq(int(urandom(72,84)))
+		envy.key_on(urandom(0.5,1.0))
+		yield ("absolute", noteStart + (quarterNote*0.5))
+		envy.key_off()
+		yield ("absolute", noteStart + quarterNote)
+
+	output.close()
+
+
+def unfreezer(frozen,unfreezeTime):
+	yield unfreezeTime
+	node = unfreeze(frozen)
+	print >>stderr, "unfroze %s" % node
+
+
+if __name__ == "__main__": main()
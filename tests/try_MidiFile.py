@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from struct            import pack as struct_pack
+from StringIO          import StringIO
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen
+from pazookle.generate import SawOsc
+from pazookle.envelope import ADSR
+from pazookle.filter   import LowPass
+from pazookle.voice    import Voice,VoicePool
+from pazookle.output   import WavOut
+from pazookle.midi     import MidiFile,MidiPlayer,midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --file=<filename>     standard midi file to play (by default, a short
+                        built-in score)
+  --voices=<number>     number of voices
+  --gain=<value>        set the gain
+  --speed=<factor>      playback speed (2 plays twice as fast)""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global midiFilename,numVoices,gain,speed
+
+	# parse the command line
+
+	midiFilename = None
+	numVoices    = 8
+	gain         = 0.8
+	speed        = 1.0
+	debug        = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("F=")) or (arg.startswith("--file=")):
+			midiFilename = argVal
+		elif (arg.startswith("V=")) or (arg.startswith("--voices=")):
+			numVoices = int(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("S=")) or (arg.startswith("--speed=")):
+			speed = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(midi_test())
+	zook.run()
+
+
+class SawVoice(Voice):
+
+	def __init__(self,name=None):
+		super(SawVoice,self).__init__(name=name)
+		self.osc      = SawOsc(gain=1)
+		self.envelope = ADSR(adsr=(5*zook.msec,80*zook.msec,0.5,200*zook.msec))
+		self.filter   = LowPass(freq=2000,Q=2)
+		self.osc >> self.envelope >> self.filter
+		self.outlet = self.filter
+
+	def set_note(self,note):
+		self.osc.freq = midi_to_freq(note)
+
+
+def midi_test():
+	if (midiFilename == None): midiFile = MidiFile(StringIO(demo_score()))
+	else:                      midiFile = MidiFile(midiFilename)
+	print >>stderr, "%d events, %.3f seconds" % (len(midiFile.events),midiFile.duration)
+
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=1)
+
+	pool = VoicePool(SawVoice,numVoices,gain=gain/numVoices)
+	pool >> output
+
+	# all channels play through the same pool;  the player is a single shred,
+	# however many notes the file has
+
+	def handler(kind,channel,data1,data2):
+		print "T=%.3f %s channel=%d %s" % (now()/zook.sec,kind,channel,data1)
+
+	player = MidiPlayer(midiFile,instruments={None:pool},handler=handler,speed=speed)
+	zook.spork(player.play())
+	yield (midiFile.duration/speed)*zook.sec + 300*zook.msec
+
+	output.close()
+
+
+def demo_score():
+	# a type 1 file with a melody and a bass line, 480 ticks per quarter note
+	# at 140 bpm
+
+	def track(events):
+		body = ""
+		for (delta,message) in events:
+			body += vlq(delta) + message
+		body += "\x00\xFF\x2F\x00"
+		return "MTrk" + struct_pack(">L",len(body)) + body
+
+	def note(delta,channel,key,duration,velocity=100):
+		return [(delta,    struct_pack("BBB",0x90|channel,key,velocity)),
+		        (duration, struct_pack("BBB",0x80|channel,key,0))]
+
+	tempo  = 60000000 // 140
+	melody = [(0,"\xFF\x51\x03" + struct_pack(">L",tempo)[1:])]
+	for key in [72,74,76,77,79,77,76,74,72,76,79,84]:
+		melody += note(0,0,key,240)
+	bass = []
+	for key in [48,53,55,48]:
+		bass += note(0,1,key,720,80)
+	bass += [(0,"\xB1\x07\x64")]
+
+	header = "MThd" + struct_pack(">LHHH",6,1,2,480)
+	return header + track(melody) + track(bass)
+
+
+def vlq(value):
+	s = chr(value & 0x7F)
+	value >>= 7
+	while (value > 0):
+		s = chr(0x80 | (value & 0x7F)) + s
+		value >>= 7
+	return s
+
+
+if __name__ == "__main__": main()
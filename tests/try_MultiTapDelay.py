@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from random            import seed as random_seed,uniform as urandom
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen
+from pazookle.generate import TriOsc,SinOsc
+from pazookle.envelope import ADSR
+from pazookle.buffer   import MultiTapDelay
+from pazookle.output   import WavOut
+from pazookle.midi     import midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>       random number generator seed
+  --gain=<value>        set the gain
+  --taps=<number>       number of taps
+  --spacing=<msec>      time between taps
+  --decay=<value>       gain ratio from one tap to the next
+  --wobble=<value>      amount of lfo wobble on the last tap's delay (msec)
+  --quarter=<seconds>   length of a quarter note
+  --duration=<seconds>  length of the test""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,numTaps,spacing,decay,wobble,quarterNote
+
+	# parse the command line
+
+	gain        = 0.5
+	numTaps     = 8
+	spacing     = 60 * zook.msec
+	decay       = 0.7
+	wobble      = 0.0
+	quarterNote = 0.6 * zook.sec
+	duration    = 3.0
+	debug       = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("N=")) or (arg.startswith("--taps=")):
+			numTaps = int(argVal)
+		elif (arg.startswith("S=")) or (arg.startswith("--spacing=")):
+			spacing = float_or_fraction(argVal) * zook.msec
+		elif (arg.startswith("D=")) or (arg.startswith("--decay=")):
+			decay = float_or_fraction(argVal)
+		elif (arg.startswith("W=")) or (arg.startswith("--wobble=")):
+			wobble = float_or_fraction(argVal) * zook.msec
+		elif (arg.startswith("Q=")) or (arg.startswith("--quarter=")):
+			quarterNote = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(multitap_test(duration*zook.sec))
+	zook.run()
+
+
+def multitap_test(duration):
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=2)
+
+	# create sound chain;  the taps alternate from left to right, each a
+	# little quieter than the one before it
+
+	voice = TriOsc(gain=gain)
+	envy  = ADSR(adsr=(10*zook.msec,100*zook.msec,0.2,100*zook.msec))
+	taps  = MultiTapDelay(maxDelay=numTaps*spacing)
+
+	tapGain = 1.0
+	for ix in xrange(numTaps):
+		if (ix % 2 == 0): pan = -0.8
+		else:             pan =  0.8
+		tap = taps.add_tap((ix+1)*spacing,gain=tapGain,pan=pan)
+		tapGain *= decay
+
+	# the last tap is pulled out of the mix and sent, by itself, to the
+	# center;  optionally its delay wobbles
+
+	tap.mix = False
+	tap.pan = 0.0
+	tap >> output
+	if (wobble != 0):
+		lfo = SinOsc(freq=0.5,gain=wobble,bias=numTaps*spacing)
+		lfo >> tap["delay"]
+
+	voice >> envy >> taps >> output
+	envy >> output
+
+	if ("transcripts" in debug):
+		print >>stderr
+		print >>stderr, "=== transcripts ==="
+		print >>stderr, taps.transcript (extra=["class"])
+		for tap in taps.taps:
+			print >>stderr, tap.transcript (extra=["class"])
+		print >>stderr, output.transcript (extra=["class"])
+
+	# play random notes
+
+	startTime = now()
+	while (now() < startTime + duration):
+		noteStart = now()
+		voice.freq = midi_to_freq(urandom(50,80))
+		envy.key_on(urandom(0.5,1.0))
+		yield ("absolute", noteStart + (quarterNote*0.2))
+		envy.key_off()
+		yield ("absolute", noteStart + quarterNote)
+
+	output.close()
+
+
+if __name__ == "__main__": main()
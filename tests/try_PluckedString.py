@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from random            import seed as random_seed,uniform as urandom,choice as random_choice
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen,PassThru
+from pazookle.generate import PluckedString
+from pazookle.output   import WavOut
+from pazookle.midi     import build_scale,midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>        random number generator seed
+  --gain=<value>         set the gain
+  --strings=<number>     number of strings
+  --brightness=<value>   set the brightness of the strings (0..1)
+  --damping=<value>      set the damping of the strings (0..1)
+  --pluck=<msec>         set the time from one pluck to the next
+  --duration=<seconds>   length of the test""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,numStrings,brightness,damping,pluckTime
+
+	# parse the command line
+
+	gain       = 0.5
+	numStrings = 6
+	brightness = None
+	damping    = None
+	pluckTime  = 150 * zook.msec
+	duration   = 5.0
+	debug      = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("N=")) or (arg.startswith("--strings=")):
+			numStrings = int(argVal)
+		elif (arg.startswith("B=")) or (arg.startswith("--brightness=")):
+			brightness = float_or_fraction(argVal)
+		elif (arg.startswith("D=")) or (arg.startswith("--damping=")):
+			damping = float_or_fraction(argVal)
+		elif (arg.startswith("Q=")) or (arg.startswith("--pluck=")):
+			pluckTime = float_or_fraction(argVal) * zook.msec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(pluck_test(duration*zook.sec))
+	zook.run()
+
+
+def pluck_test(duration):
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=1)
+
+	# create a bank of strings, all feeding a master gain
+
+	master  = PassThru(gain=gain/numStrings)
+	strings = []
+	for ix in xrange(numStrings):
+		string = PluckedString(gain=1,brightness=brightness,damping=damping)
+		string >> master
+		strings += [string]
+	master >> output
+
+	# pluck random strings at random notes from a scale
+
+	scale = build_scale("dorian",40,15)
+
+	startTime = now()
+	while (now() < startTime + duration):
+		string = random_choice(strings)
+		string.freq = freq = midi_to_freq(random_choice(scale))
+		print "T=%.3f freq=%.1f" % (now()/zook.sec,freq)
+		string.pluck(urandom(0.6,1.0))
+		yield pluckTime
+
+	output.close()
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from math              import tanh
+from random            import seed as random_seed,uniform as urandom
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen,PassThru
+from pazookle.generate import SawOsc,SinOsc,TriOsc
+from pazookle.envelope import ADSR
+from pazookle.rate     import RateGroup
+from pazookle.output   import WavOut
+from pazookle.midi     import midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>       random number generator seed
+  --gain=<value>        set the gain
+  --slow=<factor>       rate reduction for the modulation network
+  --fast=<factor>       oversampling for the waveshaper (1 means none)
+  --drive=<value>       waveshaper drive
+  --quarter=<seconds>   length of a quarter note
+  --duration=<seconds>  length of the test""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,slowFactor,fastFactor,drive,quarterNote
+
+	# parse the command line
+
+	gain        = 0.5
+	slowFactor  = 32
+	fastFactor  = 4
+	drive       = 8.0
+	quarterNote = 0.5 * zook.sec
+	duration    = 3.0
+	debug       = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("S=")) or (arg.startswith("--slow=")):
+			slowFactor = int(argVal)
+		elif (arg.startswith("F=")) or (arg.startswith("--fast=")):
+			fastFactor = int(argVal)
+		elif (arg.startswith("D=")) or (arg.startswith("--drive=")):
+			drive = float_or_fraction(argVal)
+		elif (arg.startswith("Q=")) or (arg.startswith("--quarter=")):
+			quarterNote = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(rate_test(duration*zook.sec))
+	zook.run()
+
+
+class Waveshaper(UGen):
+
+	__slots__ = ("drive",)
+
+	def __init__(self,drive=1.0,name=None):
+		super(Waveshaper,self).__init__(inChannels=1,outChannels=1,name=name,
+		                                bias=0.0,gain=1.0)
+		self.drive = drive
+
+	def tick(self,sample):
+		return tanh(self.drive*sample)
+
+
+def rate_test(duration):
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=1)
+
+	# create a modulation network at a reduced rate;  a slow sine wobbles
+	# the depth of a faster triangle, giving a vibrato that comes and goes;
+	# the group's bias will carry the note's frequency
+
+	modulator = RateGroup(down=slowFactor,inChannels=0)
+	with modulator:
+		vibrato = TriOsc(freq=5.5,gain=0)
+		depth   = SinOsc(freq=0.4,gain=4,bias=4)
+		depth >> vibrato["gain"]
+		vibrato >> modulator.output
+
+	# create the voice, and a waveshaper oversampled by fastFactor
+
+	voice = SawOsc(gain=1)
+	envy  = ADSR(adsr=(10*zook.msec,100*zook.msec,0.6,100*zook.msec))
+
+	if (fastFactor > 1):
+		shaper = RateGroup(up=fastFactor)
+		with shaper:
+			shaper.input >> Waveshaper(drive=drive) >> shaper.output
+	else:
+		shaper = Waveshaper(drive=drive)
+
+	master = PassThru(gain=gain)
+	voice >> envy >> shaper >> master >> output
+	modulator >> voice["freq"]
+
+	# play random notes
+
+	startTime = now()
+	while (now() < startTime + duration):
+		noteStart = now()
+		freq = midi_to_freq(int(urandom(40,60)))
+		modulator.bias = freq
+		print "T=%.3f freq=%.1f" % (now()/zook.sec,freq)
+		envy.key_on(urandom(0.5,1.0))
+		yield ("absolute", noteStart + (quarterNote*0.7))
+		envy.key_off()
+		yield ("absolute", noteStart + quarterNote)
+
+	output.close()
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from random            import seed as random_seed,uniform as urandom
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen
+from pazookle.generate import SawOsc
+from pazookle.envelope import ADSR
+from pazookle.filter   import LowPass
+from pazookle.output   import RawOut
+from pazookle.midi     import midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>       random number generator seed
+  --gain=<value>        set the gain
+  --format=<format>     int16, int24, int32 or float32
+  --stdout              write to stdout (otherwise to %s.raw), e.g.
+                          %s --stdout | aplay -f S16_LE -r 44100
+  --threaded            write from a background thread
+  --chunk=<frames>      frames per chunk
+  --quarter=<seconds>   length of a quarter note
+  --duration=<seconds>  length of the test""" \
+  % (programName,programName,programName)
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,sampleFormat,toStdout,threaded,chunkFrames,quarterNote
+
+	# parse the command line
+
+	gain         = 0.5
+	sampleFormat = "int16"
+	toStdout     = False
+	threaded     = False
+	chunkFrames  = 4096
+	quarterNote  = 0.25 * zook.sec
+	duration     = 3.0
+	debug        = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("--format=")):
+			sampleFormat = argVal
+		elif (arg == "--stdout"):
+			toStdout = True
+		elif (arg == "--threaded"):
+			threaded = True
+		elif (arg.startswith("--chunk=")):
+			chunkFrames = int(argVal)
+		elif (arg.startswith("Q=")) or (arg.startswith("--quarter=")):
+			quarterNote = float_or_fraction(argVal) * zook.sec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(raw_test(duration*zook.sec))
+	zook.run()
+
+
+def raw_test(duration):
+	if (toStdout):
+		stream = None
+		print >>stderr, "writing %s audio output to stdout" % sampleFormat
+	else:
+		stream = programName + ".raw"
+		print >>stderr, "writing %s audio output to %s" % (sampleFormat,stream)
+	output = RawOut(stream,sampleFormat=sampleFormat,
+	                chunkFrames=chunkFrames,threaded=threaded)
+
+	voice = SawOsc(gain=gain)
+	envy  = ADSR(adsr=(5*zook.msec,60*zook.msec,0.4,80*zook.msec))
+	voice >> envy >> LowPass(freq=1500,Q=2) >> output
+
+	# play random notes
+
+	startTime = now()
+	while (now() < startTime + duration):
+		noteStart = now()
+		voice.freq = midi_to_freq(int(urandom(48,72)))
+		envy.key_on(urandom(0.5,1.0))
+		yield ("absolute", noteStart + (quarterNote*0.6))
+		envy.key_off()
+		yield ("absolute", noteStart + quarterNote)
+
+	output.close()
+	stats = output.stats()
+	print >>stderr, "%d chunks, %d bytes, blocked %d times (%.3f sec), %d underruns" \
+	              % (stats["chunks"],stats["bytes"],stats["blocked"],
+	                 stats["blockedTime"],stats["underruns"])
+
+
+if __name__ == "__main__": main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen
+from pazookle.generate import SawOsc
+from pazookle.envelope import ADSR
+from pazookle.filter   import LowPass
+from pazookle.output   import RawOut
+from pazookle.realtime import RealtimeDriver
+from pazookle.midi     import midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --port=<number>       udp port to listen on for notes (default 9123);  each
+                        datagram is a midi note number, e.g.
+                          echo -n 64 | nc -u -w0 localhost 9123
+  --gain=<value>        set the gain
+  --lookahead=<seconds> how far the render keeps ahead of the wall clock
+  --block=<frames>      frames per block
+  --duration=<seconds>  length of the run (by default, until interrupted)
+
+Raw 16-bit audio is written to stdout, e.g.
+  %s | aplay -f S16_LE -r 44100""" \
+  % (programName,programName)
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global port,gain
+
+	# parse the command line
+
+	port        = 9123
+	gain        = 0.5
+	lookAhead   = 0.1
+	blockFrames = 256
+	duration    = None
+	debug       = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--port=")):
+			port = int(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("--lookahead=")):
+			lookAhead = float_or_fraction(argVal)
+		elif (arg.startswith("--block=")):
+			blockFrames = int(argVal)
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	realtime_test(lookAhead,blockFrames,duration)
+
+
+def realtime_test(lookAhead,blockFrames,duration):
+	output = RawOut(chunkFrames=blockFrames)
+
+	voice = SawOsc(gain=gain)
+	envy  = ADSR(adsr=(5*zook.msec,60*zook.msec,0.4,80*zook.msec))
+	voice >> envy >> LowPass(freq=1500,Q=2) >> output
+
+	# each note that arrives starts a shred that plays it
+
+	def play_note(data):
+		try:
+			note = int(data.strip())
+		except ValueError:
+			print >>stderr, "ignoring \"%s\"" % data.strip()
+			return
+		voice.freq = midi_to_freq(note)
+		envy.key_on(0.8)
+		yield 200*zook.msec
+		envy.key_off()
+
+	driver = RealtimeDriver(lookAhead=lookAhead,blockFrames=blockFrames)
+	driver.listen(("127.0.0.1",port),play_note)
+	print >>stderr, "listening for notes on udp port %d" % port
+
+	try:
+		driver.run(duration)
+	except KeyboardInterrupt:
+		pass
+	driver.close()
+	output.close()
+
+	stats = driver.stats()
+	print >>stderr, "%d blocks, %d underruns, %d messages, latency %.3f mean %.3f max" \
+	              % (stats["blocks"],stats["underruns"],stats["messages"],
+	                 stats["meanLatency"],stats["maxLatency"])
+
+
+if __name__ == "__main__": main()
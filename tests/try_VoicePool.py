@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import os.path
+programName = os.path.splitext(os.path.basename(__file__))[0]
+
+from sys               import argv,stdin,stderr,exit
+from random            import seed as random_seed,uniform as urandom,choice as random_choice
+from pazookle.shred    import zook,now,Shreduler
+from pazookle.ugen     import UGen
+from pazookle.generate import SawOsc
+from pazookle.envelope import ADSR
+from pazookle.filter   import LowPass
+from pazookle.voice    import Voice,VoicePool
+from pazookle.output   import WavOut
+from pazookle.midi     import build_scale,midi_to_freq
+from pazookle.parse    import float_or_fraction
+
+
+def usage(s=None):
+	message = """
+usage: %s [options]
+  --seed=<string>       random number generator seed
+  --gain=<value>        set the gain
+  --voices=<number>     number of voices in the pool
+  --steal=<policy>      voice stealing policy (oldest or quietest)
+  --note=<msec>         time from one note to the next
+  --hold=<msec>         time each note is held
+  --duration=<seconds>  length of the test""" \
+  % programName
+
+	if (s == None): exit (message)
+	else:           exit ("%s\n%s" % (s,message))
+
+
+def main():
+	global debug
+	global gain,numVoices,steal,noteTime,holdTime
+
+	# parse the command line
+
+	gain      = 0.5
+	numVoices = 4
+	steal     = "oldest"
+	noteTime  = 120 * zook.msec
+	holdTime  = 400 * zook.msec
+	duration  = 4.0
+	debug     = []
+
+	for arg in argv[1:]:
+		if ("=" in arg):
+			argVal = arg.split("=",1)[1]
+
+		if (arg.startswith("--seed=")):
+			random_seed(argVal)
+		elif (arg.startswith("G=")) or (arg.startswith("--gain=")):
+			gain = float_or_fraction(argVal)
+		elif (arg.startswith("N=")) or (arg.startswith("--voices=")):
+			numVoices = int(argVal)
+		elif (arg.startswith("--steal=")):
+			steal = argVal
+		elif (arg.startswith("Q=")) or (arg.startswith("--note=")):
+			noteTime = float_or_fraction(argVal) * zook.msec
+		elif (arg.startswith("H=")) or (arg.startswith("--hold=")):
+			holdTime = float_or_fraction(argVal) * zook.msec
+		elif (arg.startswith("T=")) or (arg.startswith("--dur=")) or (arg.startswith("--duration=")):
+			duration = float_or_fraction(argVal)
+		elif (arg == "--help"):
+			usage()
+		elif (arg.startswith("--debug=")):
+			debug += argVal.split(",")
+		elif (arg.startswith("--")):
+			usage("unrecognized option: %s" % arg)
+		else:
+			usage("unrecognized option: %s" % arg)
+
+	# run the test
+
+	UGen.set_debug(debug)
+	Shreduler.set_debug(debug)
+
+	zook.spork(pool_test(duration*zook.sec))
+	zook.run()
+
+
+class SawVoice(Voice):
+
+	def __init__(self,name=None):
+		super(SawVoice,self).__init__(name=name)
+		self.osc      = SawOsc(gain=1)
+		self.envelope = ADSR(adsr=(5*zook.msec,80*zook.msec,0.5,300*zook.msec))
+		self.filter   = LowPass(freq=2000,Q=2)
+		self.osc >> self.envelope >> self.filter
+		self.outlet = self.filter
+
+	def set_note(self,note):
+		self.osc.freq = midi_to_freq(note)
+
+
+def pool_test(duration):
+	filename = programName + ".wav"
+	print >>stderr, "writing audio output to %s" % filename
+	output = WavOut(filename=filename,channels=1)
+
+	pool = VoicePool(SawVoice,numVoices,steal=steal,gain=gain/numVoices)
+	pool >> output
+
+	# play overlapping notes from a scale, more of them than there are voices
+
+	zook.spork(note_player(pool,duration))
+	yield duration + holdTime + 400*zook.msec
+	output.close()
+
+
+def note_player(pool,duration):
+	scale = build_scale("dorian",48,15)
+
+	startTime = now()
+	while (now() < startTime + duration):
+		note = random_choice(scale)
+		pool.note_on(note,urandom(0.6,1.0))
+		print "T=%.3f note=%d busy=%d" % (now()/zook.sec,note,pool.busy_voices())
+		zook.spork(note_release(pool,note))
+		yield noteTime
+
+
+def note_release(pool,note):
+	yield holdTime
+	pool.note_off(note)
+
+
+if __name__ == "__main__": main()